@@ -0,0 +1,63 @@
+"""Compares creating posts one request at a time with `POST /posts/bulk`.
+
+Runs the application in-process against a throwaway database, e.g.:
+
+    python benchmarks/bulk_posts.py --posts 1000
+"""
+import argparse
+import asyncio
+import os
+import time
+
+os.environ["ASTER_DATABASE_NAME"] = "aster-benchmark"
+
+# ruff: noqa: E402
+
+from aster.api import create_app
+from aster.database import drop_database, init_database
+from aster.posts.constants import MAX_BULK_SIZE
+from httpx import AsyncClient
+
+
+async def login(client: AsyncClient, username: str) -> None:
+    credentials = {"username": username, "password": "password"}
+    await client.post("/users/register", json=credentials)
+    res = await client.post("/login", data=credentials)
+    client.headers["Authorization"] = f"Bearer {res.json()['access_token']}"
+
+
+async def run(posts: int) -> None:
+    async with AsyncClient(app=create_app(), base_url="http://benchmark") as client:
+        await login(client, "one_by_one")
+        start = time.perf_counter()
+        for i in range(posts):
+            res = await client.post("/posts", json={"content": f"Post {i}"})
+            res.raise_for_status()
+        one_by_one = time.perf_counter() - start
+
+        await login(client, "bulk")
+        start = time.perf_counter()
+        for offset in range(0, posts, MAX_BULK_SIZE):
+            end = min(posts, offset + MAX_BULK_SIZE)
+            batch = [{"content": f"Post {i}"} for i in range(offset, end)]
+            res = await client.post("/posts/bulk", json=batch)
+            res.raise_for_status()
+        bulk = time.perf_counter() - start
+
+    print(f"one by one: {posts / one_by_one:>10.0f} posts/s")
+    print(f"bulk:       {posts / bulk:>10.0f} posts/s ({one_by_one / bulk:.1f}x)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--posts", type=int, default=1000)
+    args = parser.parse_args()
+    init_database()
+    try:
+        asyncio.run(run(args.posts))
+    finally:
+        drop_database()
+
+
+if __name__ == "__main__":
+    main()
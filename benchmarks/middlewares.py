@@ -0,0 +1,64 @@
+"""Measures the per-request overhead of the observability middleware.
+
+Calls a no-op ASGI application through `ObservabilityMiddleware`, with and without
+the access log, with the logs rendered to /dev/null, e.g.:
+
+    python benchmarks/middlewares.py --requests 100000
+"""
+import argparse
+import asyncio
+import time
+from typing import Any
+
+import structlog
+from aster.logging import default_structlog_processors, default_structlog_wrapper_class
+from aster.middlewares import ObservabilityMiddleware
+
+SCOPE = {"type": "http", "method": "GET", "path": "/", "headers": []}
+
+
+async def app(scope: Any, receive: Any, send: Any) -> None:
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+async def receive() -> Any:
+    return {"type": "http.request", "body": b"", "more_body": False}
+
+
+async def send(message: Any) -> None:
+    pass
+
+
+async def measure(middleware: Any, requests: int) -> float:
+    start = time.perf_counter()
+    for _ in range(requests):
+        await middleware(dict(SCOPE), receive, send)
+    return (time.perf_counter() - start) / requests
+
+
+async def run(requests: int) -> None:
+    with open("/dev/null", "wb") as output:
+        structlog.configure(
+            processors=default_structlog_processors(),
+            wrapper_class=default_structlog_wrapper_class(),
+            logger_factory=structlog.BytesLoggerFactory(output),
+        )
+        logger = structlog.get_logger()
+        middleware = ObservabilityMiddleware(app, logger=logger)
+        quiet = ObservabilityMiddleware(app, logger=logger, access_log=False)
+        baseline = await measure(app, requests)
+        await measure(middleware, requests // 10)
+        logged = await measure(middleware, requests) - baseline
+        await measure(quiet, requests // 10)
+        unlogged = await measure(quiet, requests) - baseline
+
+    print(f"access log:    {logged * 1e6:>8.2f} µs/request")
+    print(f"no access log: {unlogged * 1e6:>8.2f} µs/request")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=100_000)
+    args = parser.parse_args()
+    asyncio.run(run(args.requests))
@@ -0,0 +1,90 @@
+"""Compares serializing a page of posts from ORM instances and from column records.
+
+Runs the services against a throwaway database, and reports the throughput and the
+peak memory allocated per post, e.g.:
+
+    python benchmarks/read_path.py --limit 100 --iterations 200
+"""
+import argparse
+import asyncio
+import os
+import time
+import tracemalloc
+from collections.abc import Awaitable, Callable
+
+os.environ["ASTER_DATABASE_NAME"] = "aster-benchmark"
+
+# ruff: noqa: E402
+
+from aster.auth.schemas import UserCreate
+from aster.auth.services import create_user
+from aster.database import drop_database, init_database, session_factory
+from aster.posts import services
+from aster.posts.schemas import ListPostView, PostCreate
+from aster.schemas import dump_page
+
+USERNAME = "reader"
+
+
+async def orm_page(limit: int) -> bytes:
+    async with session_factory() as session:
+        posts = await services.list_posts(session, username=USERNAME, limit=limit)
+        return ListPostView.model_validate(
+            {"items": posts, "next_cursor": None}
+        ).model_dump_json().encode()
+
+
+async def records_page(limit: int) -> bytes:
+    async with session_factory() as session:
+        posts = await services.list_post_records(session, username=USERNAME, limit=limit)
+        return dump_page(posts, None)
+
+
+async def measure(
+    page: Callable[[int], Awaitable[bytes]], limit: int, iterations: int
+) -> tuple[float, float]:
+    await page(limit)
+    start = time.perf_counter()
+    for _ in range(iterations):
+        await page(limit)
+    throughput = limit * iterations / (time.perf_counter() - start)
+    tracemalloc.start()
+    await page(limit)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return throughput, peak / limit
+
+
+async def run(limit: int, iterations: int) -> None:
+    async with session_factory() as session:
+        user = await create_user(session, data_in=UserCreate(username=USERNAME, password="pwd"))
+        await services.create_posts(
+            session, data_in=[PostCreate(content=f"Post {i}") for i in range(limit)], user=user
+        )
+        await session.commit()
+
+    assert await orm_page(limit) == await records_page(limit)
+    orm = await measure(orm_page, limit, iterations)
+    records = await measure(records_page, limit, iterations)
+
+    print(f"orm:     {orm[0]:>10.0f} posts/s {orm[1]:>8.0f} B/post")
+    print(
+        f"records: {records[0]:>10.0f} posts/s {records[1]:>8.0f} B/post"
+        f" ({records[0] / orm[0]:.1f}x)"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+    init_database()
+    try:
+        asyncio.run(run(args.limit, args.iterations))
+    finally:
+        drop_database()
+
+
+if __name__ == "__main__":
+    main()
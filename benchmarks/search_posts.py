@@ -0,0 +1,171 @@
+"""Measures the latency of the post search on a seeded corpus.
+
+Seeds a throwaway database with posts made of words drawn from a skewed vocabulary,
+so that the queries range from terms matching most posts to rare ones, and reports
+the latency percentiles of each query with the number of posts it matches, e.g.:
+
+    python benchmarks/search_posts.py --posts 2000000 --iterations 50
+
+With 500k posts, the rare `w9000` (93 matches) is found in 4.9ms at p50 and the phrase
+`"w3 w4"` (276 matches) in 15.5ms, against 149ms and 183ms when the newest posts were
+walked before reading the index. The common `w0` takes 28ms against 15ms.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+os.environ["ASTER_DATABASE_NAME"] = "aster-benchmark"
+
+# ruff: noqa: E402
+
+from aster.database import drop_database, init_database, session_factory
+from aster.posts import services
+from aster.posts.constants import SEARCH_CONFIG
+from sqlalchemy import text
+
+VOCABULARY_SIZE = 10_000
+WORDS_PER_POST = 8
+BLOCKED_USERS = 50
+
+# Word `wN` is drawn with a probability decreasing with N
+QUERIES = ("w0", "w1 w2", "w40", '"w3 w4"', "w7 -w0", "w2000 or w3000", "w9000")
+
+
+async def seed(posts: int, users: int) -> tuple[int, str]:
+    async with session_factory() as session:
+        await session.execute(
+            text(
+                """
+                INSERT INTO user_ (username, password, is_active, created_at, updated_at)
+                SELECT 'user' || g, '', true, now(), now() FROM generate_series(1, :users) g
+                """
+            ),
+            {"users": users},
+        )
+        first_uid = (await session.execute(text("SELECT min(id) FROM user_"))).scalar_one()
+        # The index is built once, after the rows are inserted
+        await session.execute(text("DROP INDEX post_search_vector_idx"))
+        await session.execute(
+            text(
+                """
+                INSERT INTO post (content, created_at, updated_at, uid)
+                SELECT
+                    (
+                        SELECT string_agg(
+                            'w' || floor(power(random(), 4) * :vocabulary)::int, ' '
+                        )
+                        FROM generate_series(1, :words) WHERE g > 0
+                    ),
+                    now() - make_interval(secs => :posts - g),
+                    now() - make_interval(secs => :posts - g),
+                    :first_uid + g % :users
+                FROM generate_series(1, :posts) g
+                """
+            ),
+            {
+                "vocabulary": VOCABULARY_SIZE,
+                "words": WORDS_PER_POST,
+                "posts": posts,
+                "first_uid": first_uid,
+                "users": users,
+            },
+        )
+        await session.execute(
+            text("CREATE INDEX post_search_vector_idx ON post USING gin (search_vector)")
+        )
+        await session.execute(
+            text(
+                """
+                INSERT INTO user_block (uid, uid_blocked)
+                SELECT :first_uid, :first_uid + g FROM generate_series(1, :blocked) g
+                """
+            ),
+            {"first_uid": first_uid, "blocked": BLOCKED_USERS},
+        )
+        await session.commit()
+    async with session_factory() as session:
+        await session.connection(execution_options={"isolation_level": "AUTOCOMMIT"})
+        await session.execute(text("VACUUM ANALYZE post"))
+    return first_uid, "user2"
+
+
+async def count_matches(query: str) -> int:
+    async with session_factory() as session:
+        res = await session.execute(
+            text(
+                "SELECT count(*) FROM post"
+                " WHERE search_vector @@ websearch_to_tsquery(CAST(:config AS regconfig), :query)"
+            ),
+            {"config": SEARCH_CONFIG, "query": query},
+        )
+        return res.scalar_one()
+
+
+async def measure(
+    iterations: int,
+    limit: int,
+    query: str,
+    username: str | None = None,
+    viewer_id: int | None = None,
+) -> list[float]:
+    """Times the first page, and the next one as a client following the cursor would."""
+    timings = []
+    async with session_factory() as session:
+        for i in range(iterations + 1):
+            after = None
+            for _ in range(2):
+                start = time.perf_counter()
+                results = await services.search_posts(
+                    session,
+                    query=query,
+                    limit=limit + 1,
+                    after=after,
+                    username=username,
+                    viewer_id=viewer_id,
+                )
+                if i:
+                    timings.append((time.perf_counter() - start) * 1000)
+                if len(results) <= limit:
+                    break
+                rank, post = results[limit - 1]
+                after = (rank, post.id)
+    return timings
+
+
+async def run(posts: int, users: int, iterations: int, limit: int) -> None:
+    start = time.perf_counter()
+    viewer_id, username = await seed(posts, users)
+    print(f"seeded {posts} posts in {time.perf_counter() - start:.0f}s")
+    print(f"{'query':<16} {'filter':<8} {'matches':>9} {'p50':>8} {'p95':>8} {'max':>8}")
+    for query in QUERIES:
+        matches = await count_matches(query)
+        for label, timings in (
+            ("", await measure(iterations, limit, query)),
+            ("viewer", await measure(iterations, limit, query, viewer_id=viewer_id)),
+            ("author", await measure(iterations, limit, query, username=username)),
+        ):
+            p50, p95 = statistics.median(timings), statistics.quantiles(timings, n=20)[-1]
+            print(
+                f"{query:<16} {label:<8} {matches:>9} {p50:>6.1f}ms {p95:>6.1f}ms"
+                f" {max(timings):>6.1f}ms"
+            )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--posts", type=int, default=2_000_000)
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--limit", type=int, default=10)
+    args = parser.parse_args()
+    init_database()
+    try:
+        asyncio.run(run(args.posts, args.users, args.iterations, args.limit))
+    finally:
+        drop_database()
+
+
+if __name__ == "__main__":
+    main()
@@ -2,57 +2,114 @@ from collections.abc import AsyncIterator
 from contextlib import asynccontextmanager
 from typing import TypedDict
 
+from arq import ArqRedis, create_pool
 from fastapi import APIRouter, FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 from prometheus_fastapi_instrumentator import Instrumentator
-from strawberry.fastapi import GraphQLRouter
 
 from aster.auth.api import login_router, user_router, users_router
-from aster.cache import RedisCache
+from aster.auth.blocks import BlockGraph
+from aster.auth.cache import TokenCache
+from aster.auth.dependencies import get_token_subject
+from aster.auth.hashing import close_password_hasher
+from aster.auth.stats import UserStatsBuffer
+from aster.cache import RedisCache, create_cache
+from aster.compression import close_response_compressor
 from aster.config import get_settings
-from aster.graph import schema
-from aster.logging import StructLoggingConfig
-from aster.middlewares import (
-    CorrelationIDMiddleware,
-    LoggingMiddleware,
-    TimingMiddleware,
-)
-from aster.posts.api import posts_router
+from aster.database import SessionHook, UserIdentifier
+from aster.graph import get_context, schema
+from aster.graph_cache import AsterGraphQLRouter
+from aster.logging import BufferedBytesLoggerFactory, StructLoggingConfig, get_log_buffer
+from aster.middlewares import ObservabilityMiddleware
+from aster.posts.api import posts_router, timeline_router
+from aster.ratelimit import RateLimiter
 from aster.routes import AsterRoute
+from aster.worker import get_redis_settings
 
 
 class State(TypedDict):
     cache: RedisCache | None
+    queue: ArqRedis | None
+    token_cache: TokenCache | None
+    rate_limiter: RateLimiter | None
+    block_graph: BlockGraph
+    session_hooks: list[SessionHook]
+    identify_user: UserIdentifier
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI) -> AsyncIterator[State]:
-    cache = (
-        RedisCache(str(get_settings().redis_url)) if get_settings().redis_url else None
+    settings = get_settings()
+    cache = create_cache()
+    token_cache = (
+        TokenCache(settings.auth_token_cache_max_entries, cache, settings.auth_token_cache_ttl)
+        if settings.auth_token_cache_enabled
+        else None
+    )
+    rate_limiter = (
+        RateLimiter(cache, settings.rate_limit_local_max_entries, get_token_subject)
+        if settings.rate_limit_enabled
+        else None
+    )
+    block_graph = BlockGraph(
+        cache.redis if cache else None,
+        settings.block_graph_local_max_entries if settings.block_graph_local_enabled else 0,
+        settings.block_graph_local_ttl,
+        settings.block_graph_expiration,
+    )
+    if cache and settings.block_graph_local_enabled:
+        block_graph.track_invalidations(cache)
+    if cache:
+        await cache.start()
+    queue = await create_pool(get_redis_settings()) if settings.redis_url else None
+    session_hooks: list[SessionHook] = []
+    if cache:
+        session_hooks.append(UserStatsBuffer(cache.redis))
+    if token_cache:
+        session_hooks.append(token_cache)
+    yield State(
+        cache=cache,
+        queue=queue,
+        token_cache=token_cache,
+        rate_limiter=rate_limiter,
+        block_graph=block_graph,
+        session_hooks=session_hooks,
+        identify_user=get_token_subject,
     )
-    yield State(cache=cache)
     if cache:
         await cache.close()
+    if queue:
+        await queue.close()
+    close_response_compressor()
+    close_password_hasher()
 
 
 def create_app() -> FastAPI:
-    logger = StructLoggingConfig().configure()()
+    settings = get_settings()
+    logging_config = StructLoggingConfig()
+    if settings.log_buffer_enabled:
+        logging_config.logger_factory = BufferedBytesLoggerFactory(get_log_buffer())
+    logger = logging_config.configure()()
     logger.info("Launching aster")
 
-    app = FastAPI(title="Aster")
+    app = FastAPI(title="Aster", lifespan=lifespan)
     app.router.route_class = AsterRoute
     app.add_middleware(
         CORSMiddleware,
-        allow_origins=get_settings().cors_origin,
+        allow_origins=settings.cors_origin,
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
     )
-    app.add_middleware(TimingMiddleware)
-    app.add_middleware(CorrelationIDMiddleware)
-    app.add_middleware(LoggingMiddleware, logger=logger)
+    app.add_middleware(
+        ObservabilityMiddleware,
+        logger=logger,
+        correlation_id_header=settings.log_request_id_header,
+        timing=settings.log_timing_enabled,
+        access_log=settings.log_access_enabled,
+    )
 
-    graphql_app: APIRouter = GraphQLRouter(schema)
+    graphql_app: APIRouter = AsterGraphQLRouter(schema, context_getter=get_context)
 
     async def healthcheck() -> Response:
         return Response("Hello world!")
@@ -62,6 +119,7 @@ def create_app() -> FastAPI:
     app.include_router(user_router)
     app.include_router(users_router)
     app.include_router(posts_router)
+    app.include_router(timeline_router)
     app.include_router(graphql_app, prefix="/graphql", include_in_schema=False)
 
     Instrumentator().instrument(app).expose(app, include_in_schema=False)
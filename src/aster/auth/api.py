@@ -1,9 +1,20 @@
-from aster.database import InjectSession
+from typing import Annotated
+
+from aster.cache import InjectCache, cache_response
+from aster.database import InjectReadSession, InjectSession
+from aster.pagination import decode_cursor, paginate
+from aster.posts.tasks import backfill_timeline
+from aster.ratelimit import rate_limit
 from aster.responses import AsterResponse
 from aster.routes import AsterRoute
-from fastapi import APIRouter, Depends, status
+from aster.schemas import dump_page
+from aster.streaming import InjectStreamFormat, streaming_response
+from aster.worker import InjectQueue
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
 
 from . import dependencies, schemas, services
+from .blocks import InjectBlockGraph
+from .constants import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, USER_CACHE_TAG, USERS_CACHE_TAG
 
 login_router = APIRouter(prefix="/login", route_class=AsterRoute)
 
@@ -11,6 +22,7 @@ login_router = APIRouter(prefix="/login", route_class=AsterRoute)
 @login_router.post(
     "", response_model=schemas.TokenResponse, status_code=status.HTTP_200_OK
 )
+@rate_limit(10, 60)
 async def login(
     token: dependencies.InjectGeneratedToken,
 ) -> AsterResponse:
@@ -23,27 +35,52 @@ users_router = APIRouter(prefix="/users", route_class=AsterRoute)
 @users_router.post(
     "/register", response_model=schemas.UserView, status_code=status.HTTP_201_CREATED
 )
+@rate_limit(5, 60)
 async def register_user(
-    data_in: schemas.UserCreate, session: InjectSession
+    data_in: schemas.UserCreate, session: InjectSession, cache: InjectCache
 ) -> AsterResponse:
     user = await services.create_user(session, data_in=data_in)
     await session.commit()
+    if cache:
+        await cache.invalidate_tags(
+            USERS_CACHE_TAG, USER_CACHE_TAG.format(username=user.username)
+        )
     return AsterResponse(
         schemas.UserView.model_validate(user).model_dump_json(), status.HTTP_201_CREATED
     )
 
 
 @users_router.get("", response_model=schemas.ListUserView)
-async def list_users(session: InjectSession) -> AsterResponse:
-    users = await services.list_users(session)
-    return AsterResponse(schemas.ListUserView.model_validate(users).model_dump_json())
-
-
-@users_router.get("/{username}", response_model=schemas.UserView)
+@cache_response(expiration=30, tags=[USERS_CACHE_TAG])
+async def list_users(
+    session: InjectReadSession,
+    stream_format: InjectStreamFormat,
+    limit: Annotated[int, Query(ge=1, le=MAX_PAGE_SIZE)] = DEFAULT_PAGE_SIZE,
+    cursor: str | None = None,
+) -> Response:
+    after = decode_cursor(cursor, schemas.UserCursor)[0] if cursor else None
+    if stream_format:
+        return streaming_response(
+            lambda session: services.stream_users(session, after=after),
+            schemas.UserView,
+            stream_format,
+            session.bind,
+        )
+    users = await services.list_user_records(session, limit=limit + 1, after=after)
+    page, next_cursor = paginate(users, limit, lambda user: (user.id,))
+    return AsterResponse(dump_page(page, next_cursor))
+
+
+@users_router.get("/{username}", response_model=schemas.UserProfileView)
+@cache_response(expiration=60, tags=[USER_CACHE_TAG])
 async def get_user(
     user: dependencies.InjectUser,
 ) -> AsterResponse:
-    return AsterResponse(schemas.UserView.model_validate(user).model_dump_json())
+    last_modified = max(user.updated_at, user.stats.updated_at) if user.stats else user.updated_at
+    return AsterResponse(
+        schemas.UserProfileView.model_validate(user).model_dump_json(),
+        last_modified=last_modified,
+    )
 
 
 user_router = APIRouter(
@@ -53,11 +90,13 @@ user_router = APIRouter(
 )
 
 
-@user_router.get("", response_model=schemas.UserView)
+@user_router.get("", response_model=schemas.AuthenticatedUserView)
 async def get_authenticated_user(
     user: dependencies.InjectAuthenticatedUser,
 ) -> AsterResponse:
-    return AsterResponse(schemas.UserView.model_validate(user).model_dump_json())
+    # Users authenticated from the token cache are built without their stats
+    await user.awaitable_attrs.stats
+    return AsterResponse(schemas.AuthenticatedUserView.model_validate(user).model_dump_json())
 
 
 @user_router.patch("")
@@ -73,24 +112,36 @@ async def update_password_for_authenticated_user() -> AsterResponse:
 user_block_router = APIRouter(prefix="/blocks", route_class=AsterRoute)
 
 
-@user_block_router.get("", response_model=schemas.ListUserView)
+@user_block_router.get("", response_model=schemas.ListBlockedUserView)
 async def list_users_blocked_by_authenticated_user(
     user: dependencies.InjectAuthenticatedUser,
-    session: InjectSession,
+    session: InjectReadSession,
+    block_graph: InjectBlockGraph,
 ) -> AsterResponse:
-    users = await services.list_users_blocked_by_user(session, username=user.username)
-    return AsterResponse(schemas.ListUserView.model_validate(users).model_dump_json())
+    if block_graph:
+        blocks = await block_graph.get_blocks(user.id)
+        users = await services.get_users_by_ids(session, user_ids=list(blocks.blocked))
+    else:
+        users = await services.list_users_blocked_by_user(session, username=user.username)
+    return AsterResponse(schemas.ListBlockedUserView.model_validate(users).model_dump_json())
 
 
 @user_block_router.get("/{username}")
 async def check_user_blocked_by_authenticated_user(
     username: str,
     user: dependencies.InjectAuthenticatedUser,
-    session: InjectSession,
+    session: InjectReadSession,
+    block_graph: InjectBlockGraph,
 ) -> AsterResponse:
-    is_blocked = await services.check_if_user_blocked_by_user(
-        session, username=user.username, username_block=username
-    )
+    if block_graph:
+        user_blocked = await services.get_user_by_username(session, username=username)
+        is_blocked = user_blocked is not None and await block_graph.is_blocked(
+            user.id, user_blocked.id
+        )
+    else:
+        is_blocked = await services.check_if_user_blocked_by_user(
+            session, username=user.username, username_block=username
+        )
     status_code = (
         status.HTTP_204_NO_CONTENT if is_blocked else status.HTTP_404_NOT_FOUND
     )
@@ -102,9 +153,12 @@ async def block_user(
     username: str,
     user: dependencies.InjectAuthenticatedUser,
     session: InjectSession,
+    block_graph: InjectBlockGraph,
 ) -> AsterResponse:
-    await services.block_user(session, user=user, username_to_block=username)
+    blocked_id = await services.block_user(session, user=user, username_to_block=username)
     await session.commit()
+    if block_graph:
+        await block_graph.add_block(user.id, blocked_id)
     return AsterResponse(status_code=status.HTTP_204_NO_CONTENT)
 
 
@@ -113,10 +167,44 @@ async def unblock_user(
     username: str,
     user: dependencies.InjectAuthenticatedUser,
     session: InjectSession,
+    block_graph: InjectBlockGraph,
+) -> AsterResponse:
+    unblocked_id = await services.unblock_user(session, user=user, username_to_unblock=username)
+    await session.commit()
+    if block_graph:
+        await block_graph.remove_block(user.id, unblocked_id)
+    return AsterResponse(status_code=status.HTTP_204_NO_CONTENT)
+
+
+user_follow_router = APIRouter(prefix="/follows", route_class=AsterRoute)
+
+
+@user_follow_router.put("/{username}", status_code=status.HTTP_204_NO_CONTENT)
+async def follow_user(
+    user_to_follow: dependencies.InjectUser,
+    user: dependencies.InjectAuthenticatedUser,
+    session: InjectSession,
+    queue: InjectQueue,
+) -> AsterResponse:
+    if user_to_follow.id == user.id:
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, "Users cannot follow themselves")
+    await services.follow_user(session, user=user, user_to_follow=user_to_follow)
+    await session.commit()
+    if queue:
+        await backfill_timeline.enqueue(queue, user.id, user_to_follow.id)
+    return AsterResponse(status_code=status.HTTP_204_NO_CONTENT)
+
+
+@user_follow_router.delete("/{username}", status_code=status.HTTP_204_NO_CONTENT)
+async def unfollow_user(
+    user_to_unfollow: dependencies.InjectUser,
+    user: dependencies.InjectAuthenticatedUser,
+    session: InjectSession,
 ) -> AsterResponse:
-    await services.unblock_user(session, user=user, username_to_unblock=username)
+    await services.unfollow_user(session, user=user, user_to_unfollow=user_to_unfollow)
     await session.commit()
     return AsterResponse(status_code=status.HTTP_204_NO_CONTENT)
 
 
 user_router.include_router(user_block_router)
+user_router.include_router(user_follow_router)
@@ -0,0 +1,227 @@
+import time
+from collections import OrderedDict
+from collections.abc import Iterable, Sequence
+from dataclasses import dataclass
+from typing import Annotated
+
+from aster.cache import RedisCache
+from aster.database import session_factory
+from fastapi import Depends, Request
+from prometheus_client import Counter
+from redis.asyncio import Redis
+
+from .services import list_blocks_of_user
+
+BLOCKS_KEY_PREFIX = "blocks:"
+BLOCKED_KEY = BLOCKS_KEY_PREFIX + "{user_id}:blocked"
+BLOCKED_BY_KEY = BLOCKS_KEY_PREFIX + "{user_id}:blocked_by"
+# Incremented on every change to the sets of a user
+VERSION_KEY = BLOCKS_KEY_PREFIX + "{user_id}:version"
+# Member of the sets loaded from the database, sets without it are partial
+LOADED_MEMBER = b"-"
+
+# Loads the sets of a user unless they changed since the version read before the blocks,
+# or were loaded meanwhile. Members of both sets follow the number of blocked members.
+LOAD_BLOCKS_SCRIPT = """
+if (redis.call("GET", KEYS[1]) or "") ~= ARGV[1] then
+    return 0
+end
+local blocked_count = tonumber(ARGV[4])
+local sets = {{KEYS[2], 5, 4 + blocked_count}, {KEYS[3], 5 + blocked_count, #ARGV}}
+for _, set in ipairs(sets) do
+    if redis.call("SISMEMBER", set[1], ARGV[3]) == 0 then
+        redis.call("DEL", set[1])
+        redis.call("SADD", set[1], ARGV[3])
+        for i = set[2], set[3] do
+            redis.call("SADD", set[1], ARGV[i])
+        end
+        redis.call("EXPIRE", set[1], ARGV[2])
+    end
+end
+return 1
+"""
+
+BLOCK_GRAPH_REQUESTS = Counter(
+    "aster_block_graph_requests_total", "Block graph lookups by tier and result", ["tier", "result"]
+)
+
+
+@dataclass(frozen=True, slots=True)
+class UserBlocks:
+    """Ids of the users blocked by a user, and of the users blocking them."""
+
+    blocked: frozenset[int]
+    blocked_by: frozenset[int]
+
+    @classmethod
+    def from_rows(cls, user_id: int, rows: Iterable[tuple[int, int]]) -> "UserBlocks":
+        blocked, blocked_by = set(), set()
+        for uid, uid_blocked in rows:
+            if uid == user_id:
+                blocked.add(uid_blocked)
+            if uid_blocked == user_id:
+                blocked_by.add(uid)
+        return cls(frozenset(blocked), frozenset(blocked_by))
+
+    def hides(self, user_id: int) -> bool:
+        """Whether the posts of the user are hidden, as blocked either way."""
+        return user_id in self.blocked or user_id in self.blocked_by
+
+
+def _parse_members(members: set[bytes]) -> frozenset[int] | None:
+    if LOADED_MEMBER not in members:
+        return None
+    return frozenset(int(member) for member in members if member != LOADED_MEMBER)
+
+
+class BlockGraph:
+    """Blocks of each user, kept in Redis sets and optionally in process.
+
+    Sets are loaded from the primary database on a miss and updated by `add_block` and
+    `remove_block`. A load racing with an update is not stored, the version of the sets
+    having changed since the blocks were read. Without Redis, blocks are read from the
+    primary database, or from the in-process tier when enabled.
+    """
+
+    def __init__(
+        self,
+        redis: Redis | None = None,
+        max_entries: int = 0,
+        ttl: float = 5.0,
+        expiration: int = 24 * 60 * 60,
+    ) -> None:
+        self.redis = redis
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.expiration = expiration
+        self.cache: RedisCache | None = None
+        self._entries: OrderedDict[int, tuple[float, UserBlocks]] = OrderedDict()
+
+    def track_invalidations(self, cache: RedisCache) -> None:
+        """Keeps the in-process tier coherent with the other instances, before `cache.start`."""
+        self.cache = cache
+        cache.add_invalidation_listener(self._on_invalidation)
+
+    async def get_blocks(self, user_id: int) -> UserBlocks:
+        entry = self._entries.get(user_id)
+        if entry is not None:
+            expires_at, blocks = entry
+            if expires_at > time.monotonic():
+                BLOCK_GRAPH_REQUESTS.labels("local", "hit").inc()
+                return blocks
+            del self._entries[user_id]
+        if self.redis is None:
+            return await self.rebuild(user_id)
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.smembers(BLOCKED_KEY.format(user_id=user_id))
+            pipe.smembers(BLOCKED_BY_KEY.format(user_id=user_id))
+            blocked, blocked_by = map(_parse_members, await pipe.execute())
+        if blocked is None or blocked_by is None:
+            BLOCK_GRAPH_REQUESTS.labels("redis", "miss").inc()
+            return await self.rebuild(user_id)
+        BLOCK_GRAPH_REQUESTS.labels("redis", "hit").inc()
+        blocks = UserBlocks(blocked, blocked_by)
+        self._set_local(user_id, blocks)
+        return blocks
+
+    async def is_blocked(self, user_id: int, blocked_id: int) -> bool:
+        return blocked_id in (await self.get_blocks(user_id)).blocked
+
+    async def filter_visible(self, viewer_id: int, author_ids: Iterable[int]) -> list[int]:
+        """Keeps the authors whose posts the viewer can see, in the order given.
+
+        Visibility is symmetric, so the followers who can see an author are found the
+        same way.
+        """
+        blocks = await self.get_blocks(viewer_id)
+        return [author_id for author_id in author_ids if not blocks.hides(author_id)]
+
+    async def rebuild(self, user_id: int) -> UserBlocks:
+        """Loads the blocks of a user from the primary database into Redis.
+
+        Replicas are never read, a lagging one would store stale sets until they expire.
+        Blocks changed during the load are returned without being stored.
+        """
+        version = None
+        if self.redis is not None:
+            version = await self.redis.get(VERSION_KEY.format(user_id=user_id))
+        async with session_factory() as session:
+            blocks = UserBlocks.from_rows(
+                user_id, await list_blocks_of_user(session, user_id=user_id)
+            )
+        if self.redis is None or await self.store(user_id, blocks, version):
+            self._set_local(user_id, blocks)
+        return blocks
+
+    async def store(self, user_id: int, blocks: UserBlocks, version: bytes | None) -> bool:
+        """Stores the sets of a user unless they changed since `version` was read."""
+        assert self.redis is not None
+        stored = await self.redis.register_script(LOAD_BLOCKS_SCRIPT)(
+            keys=[
+                VERSION_KEY.format(user_id=user_id),
+                BLOCKED_KEY.format(user_id=user_id),
+                BLOCKED_BY_KEY.format(user_id=user_id),
+            ],
+            args=[
+                version or b"",
+                self.expiration,
+                LOADED_MEMBER,
+                len(blocks.blocked),
+                *blocks.blocked,
+                *blocks.blocked_by,
+            ],
+        )
+        return bool(stored)
+
+    async def add_block(self, user_id: int, blocked_id: int) -> None:
+        await self._update(user_id, blocked_id, add=True)
+
+    async def remove_block(self, user_id: int, blocked_id: int) -> None:
+        await self._update(user_id, blocked_id, add=False)
+
+    async def _update(self, user_id: int, blocked_id: int, add: bool) -> None:
+        self._entries.pop(user_id, None)
+        self._entries.pop(blocked_id, None)
+        if self.redis is None:
+            return
+        keys = (BLOCKED_KEY.format(user_id=user_id), BLOCKED_BY_KEY.format(user_id=blocked_id))
+        async with self.redis.pipeline(transaction=True) as pipe:
+            for key, member in zip(keys, (blocked_id, user_id), strict=True):
+                if add:
+                    pipe.sadd(key, member)
+                else:
+                    pipe.srem(key, member)
+                # Sets created here are partial, they are loaded on the next read
+                pipe.expire(key, self.expiration, nx=True)
+            for version_key in (
+                VERSION_KEY.format(user_id=user_id),
+                VERSION_KEY.format(user_id=blocked_id),
+            ):
+                pipe.incr(version_key)
+                pipe.expire(version_key, self.expiration)
+            await pipe.execute()
+        if self.cache is not None:
+            await self.cache.evict(*keys)
+
+    def _set_local(self, user_id: int, blocks: UserBlocks) -> None:
+        if self.max_entries <= 0:
+            return
+        self._entries[user_id] = (time.monotonic() + self.ttl, blocks)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _on_invalidation(self, keys: Sequence[str] | None) -> None:
+        if keys is None:
+            self._entries.clear()
+            return
+        for key in keys:
+            if key.startswith(BLOCKS_KEY_PREFIX):
+                self._entries.pop(int(key.removeprefix(BLOCKS_KEY_PREFIX).split(":")[0]), None)
+
+
+def get_block_graph(request: Request) -> BlockGraph | None:
+    return getattr(request.state, "block_graph", None)
+
+
+InjectBlockGraph = Annotated[BlockGraph | None, Depends(get_block_graph)]
@@ -0,0 +1,205 @@
+import hashlib
+import time
+from collections import OrderedDict
+from collections.abc import Sequence
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from typing import Annotated
+
+import orjson
+from aster.cache import RedisCache
+from aster.models import User
+from fastapi import Depends, Request
+from sqlalchemy import event, inspect
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, UOWTransaction, make_transient_to_detached
+from sqlalchemy.orm.attributes import set_committed_value
+
+TOKEN_KEY_PREFIX = "auth:token:"
+USER_TOKENS_KEY = "auth:user:{user_id}:tokens"
+# Keys of `session.info` holding the users changed by the session, when tracked
+CHANGED_USERS_PENDING_KEY = "token_cache_changed_users_pending"
+CHANGED_USERS_COMMITTED_KEY = "token_cache_changed_users_committed"
+# Columns whose change makes the tokens of a user authenticate someone else, or no one
+IDENTITY_COLUMNS = ("username", "password", "is_active")
+
+
+@dataclass(frozen=True, slots=True)
+class UserSnapshot:
+    """Columns of an authenticated user needed by the endpoints."""
+
+    id: int
+    username: str
+    is_active: bool
+    created_at: datetime
+    updated_at: datetime
+
+    @classmethod
+    def from_user(cls, user: User) -> "UserSnapshot":
+        return cls(user.id, user.username, user.is_active, user.created_at, user.updated_at)
+
+    @classmethod
+    def loads(cls, value: bytes) -> "UserSnapshot":
+        data = orjson.loads(value)
+        return cls(
+            id=data["id"],
+            username=data["username"],
+            is_active=data["is_active"],
+            created_at=datetime.fromisoformat(data["created_at"]),
+            updated_at=datetime.fromisoformat(data["updated_at"]),
+        )
+
+    def dumps(self) -> bytes:
+        return orjson.dumps(self)
+
+    def to_user(self) -> User:
+        """Builds a detached user with only the snapshot columns loaded, without a query.
+
+        Its relationships are loaded through `awaitable_attrs` once added to a session.
+        """
+        user: User = inspect(User).class_manager.new_instance()
+        for name, value in asdict(self).items():
+            set_committed_value(user, name, value)
+        make_transient_to_detached(user)
+        return user
+
+
+def hash_token(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+class TokenCache:
+    """Bounded per-process cache of verified tokens, optionally shared through Redis.
+
+    Entries are keyed by the token hash and expire with the token, or after `ttl` seconds,
+    which bounds how long a change to the user goes unseen by the endpoints. The tokens
+    of the users whose identity, password or activation changes in a tracked session
+    are forgotten once it commits.
+    """
+
+    def __init__(
+        self, max_entries: int = 10_000, cache: RedisCache | None = None, ttl: int = 60
+    ) -> None:
+        self.max_entries = max_entries
+        self.cache = cache
+        self.ttl = ttl
+        self._entries: OrderedDict[str, tuple[float, UserSnapshot]] = OrderedDict()
+        if cache is not None:
+            cache.add_invalidation_listener(self._on_invalidation)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def get(self, token: str) -> UserSnapshot | None:
+        token_hash = hash_token(token)
+        entry = self._entries.get(token_hash)
+        if entry is not None:
+            expires_at, snapshot = entry
+            if expires_at > time.time():
+                self._entries.move_to_end(token_hash)
+                return snapshot
+            del self._entries[token_hash]
+        if self.cache is None:
+            return None
+        async with self.cache.redis.pipeline(transaction=False) as pipe:
+            pipe.get(TOKEN_KEY_PREFIX + token_hash)
+            pipe.ttl(TOKEN_KEY_PREFIX + token_hash)
+            value, expires_in = await pipe.execute()
+        if value is None:
+            return None
+        snapshot = UserSnapshot.loads(value)
+        self._set_local(token_hash, snapshot, time.time() + expires_in)
+        return snapshot
+
+    async def set(self, token: str, snapshot: UserSnapshot, expires_at: datetime) -> None:
+        token_hash = hash_token(token)
+        expires_at_ts = min(expires_at.timestamp(), time.time() + self.ttl)
+        self._set_local(token_hash, snapshot, expires_at_ts)
+        if self.cache is None:
+            return
+        expires_in = int(expires_at_ts - time.time())
+        if expires_in <= 0:
+            return
+        user_tokens_key = USER_TOKENS_KEY.format(user_id=snapshot.id)
+        async with self.cache.redis.pipeline(transaction=False) as pipe:
+            pipe.set(TOKEN_KEY_PREFIX + token_hash, snapshot.dumps(), ex=expires_in)
+            pipe.sadd(user_tokens_key, token_hash)
+            pipe.expire(user_tokens_key, expires_in, nx=True)
+            pipe.expire(user_tokens_key, expires_in, gt=True)
+            await pipe.execute()
+
+    def track(self, session: AsyncSession) -> None:
+        """Keeps the users changed by the session, to forget their tokens after its commits."""
+        session.info[CHANGED_USERS_PENDING_KEY] = set()
+        session.info[CHANGED_USERS_COMMITTED_KEY] = set()
+
+    async def push(self, session: AsyncSession) -> None:
+        """Forgets the tokens of the users changed by a tracked session since the last push."""
+        committed: set[int] | None = session.info.get(CHANGED_USERS_COMMITTED_KEY)
+        if committed:
+            user_ids = list(committed)
+            committed.clear()
+            for user_id in user_ids:
+                await self.invalidate_user(user_id)
+
+    async def invalidate_user(self, user_id: int) -> None:
+        """Forgets the tokens of a user, e.g. when deactivated or when the password changes."""
+        for token_hash in [h for h, (_, s) in self._entries.items() if s.id == user_id]:
+            del self._entries[token_hash]
+        if self.cache is None:
+            return
+        user_tokens_key = USER_TOKENS_KEY.format(user_id=user_id)
+        async with self.cache.redis.pipeline(transaction=True) as pipe:
+            pipe.smembers(user_tokens_key)
+            pipe.delete(user_tokens_key)
+            token_hashes, _ = await pipe.execute()
+        if token_hashes:
+            await self.cache.delete(*(TOKEN_KEY_PREFIX + h.decode() for h in token_hashes))
+
+    def _set_local(self, token_hash: str, snapshot: UserSnapshot, expires_at: float) -> None:
+        self._entries[token_hash] = (expires_at, snapshot)
+        self._entries.move_to_end(token_hash)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _on_invalidation(self, keys: Sequence[str] | None) -> None:
+        if keys is None:
+            self._entries.clear()
+            return
+        for key in keys:
+            if key.startswith(TOKEN_KEY_PREFIX):
+                self._entries.pop(key.removeprefix(TOKEN_KEY_PREFIX), None)
+
+
+@event.listens_for(Session, "before_flush")
+def track_changed_users(session: Session, flush_context: UOWTransaction, instances: object) -> None:
+    if (pending := session.info.get(CHANGED_USERS_PENDING_KEY)) is None:
+        return
+    for user in session.deleted:
+        if isinstance(user, User):
+            pending.add(user.id)
+    for user in session.dirty:
+        if isinstance(user, User) and any(
+            inspect(user).attrs[name].history.has_changes() for name in IDENTITY_COLUMNS
+        ):
+            pending.add(user.id)
+
+
+@event.listens_for(Session, "after_commit")
+def commit_changed_users(session: Session) -> None:
+    if (pending := session.info.get(CHANGED_USERS_PENDING_KEY)) is not None:
+        session.info[CHANGED_USERS_COMMITTED_KEY].update(pending)
+        pending.clear()
+
+
+@event.listens_for(Session, "after_rollback")
+def discard_changed_users(session: Session) -> None:
+    if (pending := session.info.get(CHANGED_USERS_PENDING_KEY)) is not None:
+        pending.clear()
+
+
+def get_token_cache(request: Request) -> TokenCache | None:
+    return getattr(request.state, "token_cache", None)
+
+
+InjectTokenCache = Annotated[TokenCache | None, Depends(get_token_cache)]
@@ -0,0 +1,10 @@
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+STREAM_CHUNK_SIZE = 1000
+
+USER_CACHE_TAG = "user:{username}"
+USERS_CACHE_TAG = "users"
+
+USER_STATS_COUNTERS = ("post_count", "follower_count", "following_count", "block_count")
+# Key of `session.info` holding the changes to the user stats, when buffered in Redis
+USER_STATS_PENDING_KEY = "user_stats_pending"
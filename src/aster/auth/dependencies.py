@@ -1,18 +1,23 @@
 from datetime import datetime, timedelta
 from typing import Annotated
 
-from aster.config import InjectSettings
+from aster.config import InjectSettings, get_settings
 from aster.database import InjectSession
 from aster.models import User
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from jose import JWTError, jwt
+from sqlalchemy import inspect
 
+from .cache import InjectTokenCache, UserSnapshot
+from .hashing import get_password_hasher
 from .schemas import JWTToken, TokenResponse
 from .services import get_user_by_username
-from .utils import verify_password
 
 InjectToken = Annotated[str, Depends(OAuth2PasswordBearer(tokenUrl="/login"))]
+InjectOptionalToken = Annotated[
+    str | None, Depends(OAuth2PasswordBearer(tokenUrl="/login", auto_error=False))
+]
 InjectFormOAuth2 = Annotated[OAuth2PasswordRequestForm, Depends()]
 
 
@@ -22,7 +27,7 @@ async def authenticate_user(
     user = await get_user_by_username(session, username=form.username)
     if not user:
         raise Exception
-    if not verify_password(form.password, user.password):
+    if not await get_password_hasher().verify(form.password, user.password):
         raise Exception
     token_data = JWTToken(
         sub=user.username,
@@ -49,9 +54,35 @@ async def get_valid_user_by_username(username: str, session: InjectSession) -> U
 InjectUser = Annotated[User, Depends(get_valid_user_by_username)]
 
 
+def get_token_subject(request: Request) -> str | None:
+    """Returns the user of a valid bearer token without a query, e.g. to identify a client
+    before the request is authenticated.
+    """
+    scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    config = get_settings()
+    try:
+        payload = jwt.decode(token, config.secret_key, algorithms=[config.algorithm])
+    except JWTError:
+        return None
+    subject = payload.get("sub")
+    return subject if isinstance(subject, str) and subject else None
+
+
 async def get_current_user(
-    token: InjectToken, session: InjectSession, config: InjectSettings
+    token: InjectToken,
+    session: InjectSession,
+    config: InjectSettings,
+    token_cache: InjectTokenCache,
 ) -> User:
+    snapshot = await token_cache.get(token) if token_cache is not None else None
+    if snapshot is not None:
+        identity_key = inspect(User).identity_key_from_primary_key((snapshot.id,))
+        if (cached_user := session.identity_map.get(identity_key)) is None:
+            cached_user = snapshot.to_user()
+            session.add(cached_user)
+        return cached_user
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -67,12 +98,29 @@ async def get_current_user(
     user: User | None = await get_user_by_username(session=session, username=decoded_token.sub)
     if user is None:
         raise credentials_exception
+    if token_cache is not None:
+        await token_cache.set(token, UserSnapshot.from_user(user), decoded_token.exp)
     return user
 
 
 InjectAuthenticatedUser = Annotated[User, Depends(get_current_user)]
 
 
+async def get_optional_user(
+    token: InjectOptionalToken,
+    session: InjectSession,
+    config: InjectSettings,
+    token_cache: InjectTokenCache,
+) -> User | None:
+    """Authenticates the user when a token is given, for endpoints open to anonymous users."""
+    if token is None:
+        return None
+    return await get_current_user(token, session, config, token_cache)
+
+
+InjectOptionalUser = Annotated[User | None, Depends(get_optional_user)]
+
+
 async def get_current_active_user(current_user: InjectAuthenticatedUser) -> User:
     if not current_user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
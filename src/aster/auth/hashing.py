@@ -0,0 +1,110 @@
+import asyncio
+import time
+from collections.abc import Callable
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache
+from typing import Any, TypeVar
+
+from aster.config import get_settings
+from passlib.context import CryptContext
+from prometheus_client import Histogram
+
+from .utils import pwd_context, verify_password
+
+T = TypeVar("T")
+
+PASSWORD_HASH_QUEUE_TIME = Histogram(
+    "aster_password_hash_queue_seconds",
+    "Time spent waiting for a password hashing slot",
+    ["operation"],
+)
+PASSWORD_HASH_TIME = Histogram(
+    "aster_password_hash_seconds", "Time spent hashing or verifying a password", ["operation"]
+)
+
+
+@lru_cache
+def get_crypt_context(rounds: int) -> CryptContext:
+    return pwd_context.copy(bcrypt__rounds=rounds)
+
+
+def hash_password(password: str, rounds: int) -> str:
+    hash: str = get_crypt_context(rounds).hash(password)
+    return hash
+
+
+class PasswordHasher:
+    """Hashes and verifies passwords in an executor, off the event loop.
+
+    At most `max_concurrency` operations run at once, the others wait for a slot.
+    """
+
+    def __init__(self, executor: Executor, max_concurrency: int, rounds: int = 12) -> None:
+        self.executor = executor
+        self.max_concurrency = max_concurrency
+        self.rounds = rounds
+        self._semaphore: asyncio.Semaphore | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    async def hash(self, password: str) -> str:
+        return await self._run("hash", hash_password, password, self.rounds)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._run("verify", verify_password, plain_password, hashed_password)
+
+    def close(self) -> None:
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    async def _run(self, operation: str, func: Callable[..., T], *args: Any) -> T:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._loop = loop
+        assert self._semaphore is not None
+        queued_at = time.perf_counter()
+        async with self._semaphore:
+            started_at = time.perf_counter()
+            PASSWORD_HASH_QUEUE_TIME.labels(operation).observe(started_at - queued_at)
+            try:
+                return await loop.run_in_executor(self.executor, func, *args)
+            finally:
+                PASSWORD_HASH_TIME.labels(operation).observe(time.perf_counter() - started_at)
+
+
+@lru_cache
+def get_password_hasher() -> PasswordHasher:
+    settings = get_settings()
+    executor: Executor = (
+        ProcessPoolExecutor(settings.password_hash_workers)
+        if settings.password_hash_executor == "process"
+        else ThreadPoolExecutor(settings.password_hash_workers, "password-hasher")
+    )
+    return PasswordHasher(
+        executor,
+        settings.password_hash_max_concurrency or settings.password_hash_workers,
+        settings.password_hash_rounds,
+    )
+
+
+def close_password_hasher() -> None:
+    """Shuts down the executor of the hasher, if created, e.g. when the application stops.
+
+    A new hasher is created on the next use.
+    """
+    if get_password_hasher.cache_info().currsize:
+        get_password_hasher().close()
+    get_password_hasher.cache_clear()
+
+
+def calibrate_rounds(target: float, min_rounds: int = 4, max_rounds: int = 31) -> dict[int, float]:
+    """Times a hash for each bcrypt cost factor until one exceeds the target duration."""
+    timings: dict[int, float] = {}
+    # The first hash loads the bcrypt backend
+    hash_password("calibration", min_rounds)
+    for rounds in range(min_rounds, max_rounds + 1):
+        start = time.perf_counter()
+        hash_password("calibration", rounds)
+        timings[rounds] = time.perf_counter() - start
+        if timings[rounds] > target:
+            break
+    return timings
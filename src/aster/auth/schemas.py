@@ -1,7 +1,9 @@
+from collections.abc import Mapping
+from dataclasses import dataclass
 from datetime import datetime, timezone
 
-from aster.schemas import ORJSONModel
-from pydantic import BaseModel, Field, RootModel, SecretStr
+from aster.schemas import ORJSONModel, Page
+from pydantic import BaseModel, Field, RootModel, SecretStr, TypeAdapter
 
 
 def _normalize_datetime(value: datetime) -> datetime:
@@ -25,7 +27,44 @@ class UserView(UserBase, from_attributes=True):
     updated_at: datetime
 
 
-ListUserView = RootModel[list[UserView]]
+class UserStatsView(ORJSONModel, from_attributes=True):
+    post_count: int
+    follower_count: int
+    following_count: int
+
+
+class UserProfileView(UserView):
+    stats: UserStatsView | None
+
+
+class AuthenticatedUserStatsView(UserStatsView):
+    block_count: int
+
+
+class AuthenticatedUserView(UserView):
+    stats: AuthenticatedUserStatsView | None
+
+
+ListUserView = Page[UserView]
+
+
+@dataclass(frozen=True, slots=True)
+class UserRecord:
+    """Columns of `UserView`, in its field order, serialized as is by orjson."""
+
+    username: str
+    id: int
+    created_at: datetime
+    updated_at: datetime
+
+
+ListBlockedUserView = RootModel[list[UserView]]
+
+UserKeyset = tuple[int]
+UserCursor: TypeAdapter[UserKeyset] = TypeAdapter(UserKeyset)  # type: ignore[arg-type]
+
+UserStatsDeltas = Mapping[tuple[int, str], int]
+"""Changes to the counters of users, by `(user_id, counter)`"""
 
 
 class TokenResponse(BaseModel):
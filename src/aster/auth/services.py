@@ -1,18 +1,28 @@
 from collections.abc import Sequence
+from datetime import datetime
+from typing import Any
 
-from aster.auth.utils import get_password_hash
-from aster.models import User, UserBlock
-from sqlalchemy import exists, select
-from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import aliased
+from aster.auth.hashing import get_password_hasher
+from aster.models import Post, User, UserBlock, UserFollow, UserStats
+from sqlalchemy import Select, delete, exists, func, literal, or_, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncScalarResult, AsyncSession
+from sqlalchemy.orm import aliased, joinedload
 
-from .schemas import UserCreate
+from .constants import (
+    DEFAULT_PAGE_SIZE,
+    STREAM_CHUNK_SIZE,
+    USER_STATS_COUNTERS,
+    USER_STATS_PENDING_KEY,
+)
+from .schemas import UserCreate, UserRecord, UserStatsDeltas
 
 
 async def create_user(session: AsyncSession, *, data_in: UserCreate) -> User:
     user = User(
         **data_in.model_dump(exclude={"password"}),
-        password=get_password_hash(data_in.password.get_secret_value()),
+        password=await get_password_hasher().hash(data_in.password.get_secret_value()),
+        stats=UserStats(),
     )
     session.add(user)
     await session.flush()
@@ -20,15 +30,52 @@ async def create_user(session: AsyncSession, *, data_in: UserCreate) -> User:
 
 
 async def get_user_by_username(session: AsyncSession, *, username: str) -> User | None:
-    result = await session.execute(select(User).where(User.username == username))
+    result = await session.execute(
+        select(User).options(joinedload(User.stats)).where(User.username == username)
+    )
     return result.scalar_one_or_none()
 
 
-async def list_users(session: AsyncSession) -> Sequence[User]:
-    result = await session.execute(select(User))
+async def get_users_by_ids(session: AsyncSession, *, user_ids: Sequence[int]) -> Sequence[User]:
+    result = await session.execute(select(User).where(User.id.in_(user_ids)))
+    return result.scalars().all()
+
+
+async def list_users(
+    session: AsyncSession, *, limit: int = DEFAULT_PAGE_SIZE, after: int | None = None
+) -> Sequence[User]:
+    """Lists the users ordered by id, after the given id."""
+    result = await session.execute(_select_users(after).limit(limit))
     return result.scalars().all()
 
 
+async def list_user_records(
+    session: AsyncSession, *, limit: int = DEFAULT_PAGE_SIZE, after: int | None = None
+) -> list[UserRecord]:
+    """Lists the users like `list_users`, selecting only the columns of the view."""
+    stmt = select(User.username, User.id, User.created_at, User.updated_at).order_by(User.id)
+    if after is not None:
+        stmt = stmt.where(User.id > after)
+    result = await session.execute(stmt.limit(limit))
+    return [UserRecord(*row) for row in result.tuples()]
+
+
+async def stream_users(
+    session: AsyncSession, *, after: int | None = None
+) -> AsyncScalarResult[User]:
+    """Streams all the users through a server-side cursor, ordered by id."""
+    return await session.stream_scalars(
+        _select_users(after), execution_options={"yield_per": STREAM_CHUNK_SIZE}
+    )
+
+
+def _select_users(after: int | None) -> Select[tuple[User]]:
+    stmt = select(User).order_by(User.id)
+    if after is not None:
+        stmt = stmt.where(User.id > after)
+    return stmt
+
+
 async def list_users_blocked_by_user(session: AsyncSession, *, username: str) -> Sequence[User]:
     UserBlocked = aliased(User)
     result = await session.execute(
@@ -57,26 +104,152 @@ async def check_if_user_blocked_by_user(
     return res.first() is not None
 
 
-async def block_user(session: AsyncSession, *, user: User, username_to_block: str) -> None:
+async def list_blocks_of_user(
+    session: AsyncSession, *, user_id: int
+) -> Sequence[tuple[int, int]]:
+    """Lists the `(uid, uid_blocked)` blocks made by the user and against the user."""
+    result = await session.execute(
+        select(UserBlock.uid, UserBlock.uid_blocked).where(
+            or_(UserBlock.uid == user_id, UserBlock.uid_blocked == user_id)
+        )
+    )
+    return result.tuples().all()
+
+
+async def block_user(session: AsyncSession, *, user: User, username_to_block: str) -> int:
+    """Blocks a user, returns its id."""
     user_to_block = await get_user_by_username(session, username=username_to_block)
     if not user_to_block:
         raise Exception
     result = await session.execute(
-        select(UserBlock).where(UserBlock.uid == user.id, UserBlock.uid_blocked == user_to_block.id)
+        insert(UserBlock)
+        .values(uid=user.id, uid_blocked=user_to_block.id)
+        .on_conflict_do_nothing()
+        .returning(UserBlock.id)
     )
-    bool(result.first())
-    session.add(UserBlock(uid=user.id, uid_blocked=user_to_block.id))
-    await session.flush()
+    if result.scalar_one_or_none() is not None:
+        await count_user_stats(session, deltas={(user.id, "block_count"): 1})
+    return user_to_block.id
 
 
-async def unblock_user(session: AsyncSession, *, user: User, username_to_unblock: str) -> None:
+async def unblock_user(session: AsyncSession, *, user: User, username_to_unblock: str) -> int:
+    """Unblocks a user, returns its id."""
     user_to_block = await get_user_by_username(session, username=username_to_unblock)
     if not user_to_block:
         raise Exception
     result = await session.execute(
-        select(UserBlock).where(UserBlock.uid == user.id, UserBlock.uid_blocked == user_to_block.id)
+        delete(UserBlock)
+        .where(UserBlock.uid == user.id, UserBlock.uid_blocked == user_to_block.id)
+        .returning(UserBlock.id)
     )
-    user_block = result.scalar_one_or_none()
-    if not user_block:
+    if result.scalar_one_or_none() is None:
         raise Exception
-    await session.delete(user_block)
+    await count_user_stats(session, deltas={(user.id, "block_count"): -1})
+    return user_to_block.id
+
+
+async def follow_user(session: AsyncSession, *, user: User, user_to_follow: User) -> None:
+    result = await session.execute(
+        insert(UserFollow)
+        .values(uid=user.id, uid_followed=user_to_follow.id)
+        .on_conflict_do_nothing()
+        .returning(UserFollow.id)
+    )
+    if result.scalar_one_or_none() is not None:
+        await count_user_stats(
+            session,
+            deltas={(user.id, "following_count"): 1, (user_to_follow.id, "follower_count"): 1},
+        )
+
+
+async def unfollow_user(session: AsyncSession, *, user: User, user_to_unfollow: User) -> None:
+    result = await session.execute(
+        delete(UserFollow)
+        .where(UserFollow.uid == user.id, UserFollow.uid_followed == user_to_unfollow.id)
+        .returning(UserFollow.id)
+    )
+    if result.scalar_one_or_none() is not None:
+        await count_user_stats(
+            session,
+            deltas={(user.id, "following_count"): -1, (user_to_unfollow.id, "follower_count"): -1},
+        )
+
+
+async def list_follower_ids(session: AsyncSession, *, user_id: int) -> Sequence[int]:
+    result = await session.execute(
+        select(UserFollow.uid).where(UserFollow.uid_followed == user_id)
+    )
+    return result.scalars().all()
+
+
+async def count_user_stats(session: AsyncSession, *, deltas: UserStatsDeltas) -> None:
+    """Counts changes to the stats of users.
+
+    Changes are kept until the commit when the session is tracked by a `UserStatsBuffer`,
+    which adds them to Redis, and applied in the transaction otherwise.
+    """
+    pending = session.info.get(USER_STATS_PENDING_KEY)
+    if pending is None:
+        await update_user_stats(session, deltas=deltas)
+    else:
+        pending.update(deltas)
+
+
+async def update_user_stats(session: AsyncSession, *, deltas: UserStatsDeltas) -> None:
+    """Adds changes to the stats of users, in a single statement."""
+    now = datetime.now()
+    rows: dict[int, dict[str, Any]] = {}
+    for (user_id, counter), delta in deltas.items():
+        row = rows.setdefault(
+            user_id,
+            {"uid": user_id, **dict.fromkeys(USER_STATS_COUNTERS, 0), "updated_at": now},
+        )
+        row[counter] += delta
+    if not rows:
+        return
+    # Rows are locked in the order of the ids, so that concurrent updates do not deadlock
+    stmt = insert(UserStats).values([rows[user_id] for user_id in sorted(rows)])
+    await session.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[UserStats.uid],
+            set_={
+                **{
+                    counter: getattr(UserStats, counter) + stmt.excluded[counter]
+                    for counter in USER_STATS_COUNTERS
+                },
+                "updated_at": stmt.excluded.updated_at,
+            },
+        )
+    )
+
+
+async def reconcile_user_stats(
+    session: AsyncSession, *, limit: int = DEFAULT_PAGE_SIZE, after: int | None = None
+) -> Sequence[int]:
+    """Recomputes from their rows the stats of the users ordered by id, after the given
+    id, returns their ids."""
+    users = select(User.id).order_by(User.id).limit(limit)
+    if after is not None:
+        users = users.where(User.id > after)
+    user = users.subquery()
+    stmt = insert(UserStats).from_select(
+        ["uid", *USER_STATS_COUNTERS, "updated_at"],
+        select(
+            user.c.id,
+            select(func.count()).where(Post.uid == user.c.id).scalar_subquery(),
+            select(func.count()).where(UserFollow.uid_followed == user.c.id).scalar_subquery(),
+            select(func.count()).where(UserFollow.uid == user.c.id).scalar_subquery(),
+            select(func.count()).where(UserBlock.uid == user.c.id).scalar_subquery(),
+            literal(datetime.now()),
+        ),
+    )
+    result = await session.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[UserStats.uid],
+            set_={
+                column: stmt.excluded[column]
+                for column in (*USER_STATS_COUNTERS, "updated_at")
+            },
+        ).returning(UserStats.uid)
+    )
+    return result.scalars().all()
@@ -0,0 +1,113 @@
+from collections import Counter
+
+from aster.cache import RedisCache
+from aster.models import User
+from redis.asyncio import Redis
+from redis.asyncio.lock import Lock
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from .constants import USER_CACHE_TAG, USER_STATS_PENDING_KEY
+from .schemas import UserStatsDeltas
+from .services import update_user_stats
+
+DELTAS_KEY = "user_stats:deltas"
+# Deltas being flushed, kept until they are written so that a failed flush is retried
+FLUSHING_KEY = "user_stats:deltas:flushing"
+USER_STATS_COMMITTED_KEY = "user_stats_committed"
+# Held while the deltas are written, by a flush or by the whole reconciliation
+LOCK_KEY = "user_stats:lock"
+LOCK_TIMEOUT = 60
+
+
+class UserStatsBuffer:
+    """Changes to the stats of users, summed in a Redis hash and flushed in batches.
+
+    Counting in Redis keeps the rows of popular users from being locked by every post,
+    follow or block. Deltas are flushed at least once: those of a flush interrupted
+    after its commit are written twice, until the reconciliation corrects the counters.
+    Flushes are skipped while the reconciliation holds the lock, it drains the deltas
+    before recomputing each batch of users. The cached profiles of the users are
+    invalidated once their deltas are written, when given the cache.
+    """
+
+    def __init__(self, redis: Redis, cache: RedisCache | None = None) -> None:
+        self.redis = redis
+        self.cache = cache
+
+    def track(self, session: AsyncSession) -> None:
+        """Keeps the changes counted in the session, to add them after its commits."""
+        session.info[USER_STATS_PENDING_KEY] = Counter()
+        session.info[USER_STATS_COMMITTED_KEY] = Counter()
+
+    async def push(self, session: AsyncSession) -> None:
+        """Adds the changes committed by a tracked session since the last push."""
+        committed = session.info.get(USER_STATS_COMMITTED_KEY)
+        if committed:
+            deltas = dict(committed)
+            committed.clear()
+            await self.add(deltas)
+
+    async def add(self, deltas: UserStatsDeltas) -> None:
+        deltas = {key: delta for key, delta in deltas.items() if delta}
+        if not deltas:
+            return
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for (user_id, counter), delta in deltas.items():
+                pipe.hincrby(DELTAS_KEY, f"{user_id}:{counter}", delta)
+            await pipe.execute()
+
+    def lock(self) -> Lock:
+        """Lock of the writes of the deltas, to refresh with `reacquire` every batch."""
+        return self.redis.lock(LOCK_KEY, timeout=LOCK_TIMEOUT)
+
+    async def flush(self, session: AsyncSession, batch_size: int = 1000) -> int:
+        """Writes the deltas to the database unless the reconciliation runs, returns the
+        number of deltas written."""
+        lock = self.lock()
+        if not await lock.acquire(blocking=False):
+            return 0
+        try:
+            return await self.drain(session, batch_size)
+        finally:
+            await lock.release()
+
+    async def drain(self, session: AsyncSession, batch_size: int = 1000) -> int:
+        """Writes the deltas to the database, under the lock."""
+        if not await self.redis.exists(FLUSHING_KEY):
+            if not await self.redis.exists(DELTAS_KEY):
+                return 0
+            # New changes are counted in a new hash while these ones are written
+            await self.redis.rename(DELTAS_KEY, FLUSHING_KEY)
+        fields: dict[bytes, bytes] = await self.redis.hgetall(FLUSHING_KEY)  # type: ignore[misc]
+        deltas = [(_parse_field(field), int(delta)) for field, delta in fields.items()]
+        for start in range(0, len(deltas), batch_size):
+            await update_user_stats(session, deltas=dict(deltas[start : start + batch_size]))
+        await session.commit()
+        await self.redis.delete(FLUSHING_KEY)
+        if self.cache is not None and deltas:
+            user_ids = {user_id for (user_id, _), _ in deltas}
+            res = await session.execute(select(User.username).where(User.id.in_(user_ids)))
+            await self.cache.invalidate_tags(
+                *(USER_CACHE_TAG.format(username=username) for username in res.scalars())
+            )
+        return len(deltas)
+
+
+@event.listens_for(Session, "after_commit")
+def commit_user_stats(session: Session) -> None:
+    if (pending := session.info.get(USER_STATS_PENDING_KEY)) is not None:
+        session.info[USER_STATS_COMMITTED_KEY].update(pending)
+        pending.clear()
+
+
+@event.listens_for(Session, "after_rollback")
+def discard_user_stats(session: Session) -> None:
+    if (pending := session.info.get(USER_STATS_PENDING_KEY)) is not None:
+        pending.clear()
+
+
+def _parse_field(field: bytes) -> tuple[int, str]:
+    user_id, counter = field.decode().split(":")
+    return int(user_id), counter
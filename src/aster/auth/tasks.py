@@ -0,0 +1,45 @@
+from aster.config import get_settings
+from aster.database import session_factory
+from aster.tasks import Ctx, Queue, task
+
+from . import services
+from .stats import UserStatsBuffer
+
+
+@task(
+    queue=Queue.LOW,
+    max_tries=1,
+    schedule={"second": set(range(0, 60, get_settings().user_stats_flush_interval))},
+)
+async def flush_user_stats(ctx: Ctx) -> int:
+    """Writes the changes to the user stats counted in Redis to the database."""
+    async with session_factory() as session:
+        return await UserStatsBuffer(ctx["redis"], ctx.get("cache")).flush(
+            session, get_settings().user_stats_batch_size
+        )
+
+
+@task(queue=Queue.LOW, max_tries=3, schedule={"hour": {4}, "minute": {0}})
+async def reconcile_user_stats(ctx: Ctx) -> int:
+    """Recomputes the stats of all the users from their rows, in batches.
+
+    Flushes wait for the end of the reconciliation, which writes the pending changes
+    before each batch. Only changes committed while a batch is recomputed, and counted
+    after it, may still be written twice.
+    """
+    buffer = UserStatsBuffer(ctx["redis"], ctx.get("cache"))
+    batch_size = get_settings().user_stats_batch_size
+    reconciled, after = 0, None
+    async with buffer.lock() as lock:
+        while True:
+            async with session_factory() as session:
+                await buffer.drain(session, batch_size)
+                user_ids = await services.reconcile_user_stats(
+                    session, limit=batch_size, after=after
+                )
+                await session.commit()
+            if not user_ids:
+                return reconciled
+            reconciled += len(user_ids)
+            after = max(user_ids)
+            await lock.reacquire()
@@ -1,12 +1,40 @@
-from collections.abc import Callable
-from typing import Any
+import asyncio
+import time
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable, Iterable, Sequence
+from dataclasses import dataclass
+from typing import Annotated, Any, TypeVar
 from urllib.parse import urlencode
+from uuid import uuid4
 
-from fastapi import Request
+import orjson
+import structlog
+from fastapi import Depends, Request, Response, status
+from fastapi.responses import StreamingResponse
+from prometheus_client import Counter
 from redis.asyncio import Redis
 from redis.asyncio.connection import ConnectionPool
+from redis.exceptions import ConnectionError
+
+from aster.config import get_settings
+
+logger = structlog.get_logger()
 
 CacheKeyBuilder = Callable[[Request], str]
+InvalidationListener = Callable[[Sequence[str] | None], None]
+"""Called with the invalidated keys, or `None` when any key may have been invalidated"""
+Endpoint = TypeVar("Endpoint", bound=Callable[..., Any])
+
+RESPONSE_KEY_PREFIX = "response:"
+TAG_KEY_PREFIX = "tag:"
+INVALIDATION_CHANNEL = "aster:cache:invalidate"
+
+CACHE_REQUESTS = Counter(
+    "aster_cache_requests_total", "Cache lookups by tier and result", ["tier", "result"]
+)
+CACHE_EVICTIONS = Counter(
+    "aster_cache_local_evictions_total", "Evictions from the in-process cache", ["reason"]
+)
 
 
 def default_cache_key_builder(request: Request) -> str:
@@ -15,32 +43,306 @@ def default_cache_key_builder(request: Request) -> str:
     return request.url.path + urlencode(query_params, doseq=True)
 
 
+@dataclass(frozen=True)
+class ResponseCacheOptions:
+    """Caching options of an endpoint, read by `AsterRoute`."""
+
+    expiration: int | None = None
+    """Time to live of the cached response, defaults to the cache expiration"""
+    tags: tuple[str, ...] = ()
+    """Tag templates, formatted with the path and query parameters of the request"""
+    cache_key_builder: CacheKeyBuilder | None = None
+    """Key builder overriding the cache one"""
+
+    def format_tags(self, request: Request) -> list[str]:
+        params = {**request.query_params, **request.path_params}
+        return [tag.format_map(params) for tag in self.tags]
+
+
+def cache_response(
+    expiration: int | None = None,
+    tags: Sequence[str] = (),
+    cache_key_builder: CacheKeyBuilder | None = None,
+) -> Callable[[Endpoint], Endpoint]:
+    """Caches the successful responses of a GET endpoint.
+
+    Must be applied below the router decorator, e.g.:
+
+        @posts_router.get("/{post_id}")
+        @cache_response(expiration=30, tags=["post:{post_id}"])
+        async def get_post(...): ...
+    """
+    options = ResponseCacheOptions(expiration, tuple(tags), cache_key_builder)
+
+    def decorator(endpoint: Endpoint) -> Endpoint:
+        endpoint.__aster_cache__ = options  # type: ignore[attr-defined]
+        return endpoint
+
+    return decorator
+
+
+def get_response_cache_options(endpoint: Callable[..., Any]) -> ResponseCacheOptions | None:
+    return getattr(endpoint, "__aster_cache__", None)
+
+
+def dump_response(response: Response) -> bytes:
+    headers = [(k.decode("latin-1"), v.decode("latin-1")) for k, v in response.raw_headers]
+    return orjson.dumps([response.status_code, headers]) + b"\n" + response.body
+
+
+def load_response(value: bytes) -> Response:
+    meta, _, body = value.partition(b"\n")
+    status_code, headers = orjson.loads(meta)
+    response = Response(body, status_code=status_code)
+    response.raw_headers = [(k.encode("latin-1"), v.encode("latin-1")) for k, v in headers]
+    return response
+
+
+class LocalCache:
+    """In-process LRU cache bounded by a number of entries and a memory budget.
+
+    Entries expire after their own TTL, lookups never touch the network.
+    """
+
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 32 << 20, ttl: float = 5.0):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.size = 0
+        self._entries: OrderedDict[str, tuple[float, bytes]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: str) -> bool:
+        entry = self._entries.get(key)
+        return entry is not None and entry[0] > time.monotonic()
+
+    def get(self, key: str) -> bytes | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            CACHE_REQUESTS.labels("local", "miss").inc()
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            self._pop(key, "expired")
+            CACHE_REQUESTS.labels("local", "miss").inc()
+            return None
+        self._entries.move_to_end(key)
+        CACHE_REQUESTS.labels("local", "hit").inc()
+        return value
+
+    def set(self, key: str, value: bytes, ttl: float | None = None) -> None:
+        # The previous value is stale even when the new one is too large to be kept
+        self._pop(key)
+        if len(value) > self.max_bytes:
+            return
+        ttl = min(ttl, self.ttl) if ttl else self.ttl
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self.size += len(value)
+        while len(self._entries) > self.max_entries or self.size > self.max_bytes:
+            self._pop(next(iter(self._entries)), "capacity")
+
+    def delete(self, *keys: str) -> None:
+        for key in keys:
+            self._pop(key, "invalidated")
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.size = 0
+
+    def _pop(self, key: str, reason: str | None = None) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self.size -= len(entry[1])
+        if reason:
+            CACHE_EVICTIONS.labels(reason).inc()
+
+
 class RedisCache:
     def __init__(
         self,
         redis_url: str,
         default_expiration: int = 60,
         cache_key_builder: CacheKeyBuilder = default_cache_key_builder,
+        local: LocalCache | None = None,
     ) -> None:
         self._redis = Redis(connection_pool=ConnectionPool.from_url(redis_url))
         self.default_expiration = default_expiration
         self.key_builder = cache_key_builder
+        self.local = local
+        self.instance_id = uuid4().hex
+        self._invalidation_listeners: list[InvalidationListener] = []
+        self._subscriber: asyncio.Task[None] | None = None
+
+    @property
+    def redis(self) -> Redis:
+        return self._redis
 
     async def get(self, key: str) -> bytes | None:
-        return await self._redis.get(key)
+        if self.local is not None and (value := self.local.get(key)) is not None:
+            return value
+        value = await self._redis.get(key)
+        CACHE_REQUESTS.labels("redis", "miss" if value is None else "hit").inc()
+        if self.local is not None and value is not None:
+            self.local.set(key, value)
+        return value
 
     async def set(self, key: str, value: Any, expiration: int | None = None) -> None:
         await self._redis.set(key, value, ex=expiration)
+        await self.evict(key)
+        if self.local is not None and isinstance(value, bytes):
+            self.local.set(key, value, expiration)
 
-    async def delete(self, key: str) -> Any:
-        await self._redis.delete(key)
+    async def delete(self, *keys: str) -> Any:
+        await self._redis.delete(*keys)
+        await self.evict(*keys)
 
     async def exists(self, key: str) -> bool:
+        if self.local is not None and key in self.local:
+            return True
         return await self._redis.exists(key) == 1
 
+    def add_invalidation_listener(self, listener: InvalidationListener) -> None:
+        """Registers a callback of the keys set or deleted by any instance, before `start`."""
+        self._invalidation_listeners.append(listener)
+
+    @property
+    def tracks_invalidations(self) -> bool:
+        return self.local is not None or bool(self._invalidation_listeners)
+
+    async def start(self) -> None:
+        """Subscribes to the invalidations of the other instances when they are tracked."""
+        if self.tracks_invalidations and self._subscriber is None:
+            self._subscriber = asyncio.create_task(self._listen_invalidations())
+
     async def close(self) -> None:
+        if self._subscriber is not None:
+            self._subscriber.cancel()
+            self._subscriber = None
         await self._redis.close()
 
+    async def evict(self, *keys: str) -> None:
+        """Evicts the keys from the local tier of every instance, e.g. after changing them
+        outside of `set` and `delete`.
+        """
+        if not self.tracks_invalidations or not keys:
+            return
+        self._on_invalidation(keys)
+        await self._redis.publish(INVALIDATION_CHANNEL, orjson.dumps([self.instance_id, keys]))
+
+    def _on_invalidation(self, keys: Sequence[str]) -> None:
+        if self.local is not None:
+            self.local.delete(*keys)
+        for listener in self._invalidation_listeners:
+            listener(keys)
+
+    async def _listen_invalidations(self) -> None:
+        while True:
+            try:
+                async with self._redis.pubsub(ignore_subscribe_messages=True) as pubsub:
+                    await pubsub.subscribe(INVALIDATION_CHANNEL)
+                    async for message in pubsub.listen():
+                        origin, keys = orjson.loads(message["data"])
+                        if origin != self.instance_id:
+                            self._on_invalidation(keys)
+            except ConnectionError:
+                await logger.awarning("Cache invalidation channel lost, clearing local cache")
+                # Invalidations may have been missed while disconnected
+                if self.local is not None:
+                    self.local.clear()
+                for listener in self._invalidation_listeners:
+                    listener(None)
+                await asyncio.sleep(1)
+
     def build_cache_key(self, request: Request, cache_key_builder: CacheKeyBuilder | None) -> str:
         key_builder = cache_key_builder or self.key_builder
         return key_builder(request)
+
+    async def get_response(self, key: str) -> Response | None:
+        value = await self.get(RESPONSE_KEY_PREFIX + key)
+        return load_response(value) if value is not None else None
+
+    async def set_response(
+        self,
+        key: str,
+        response: Response,
+        expiration: int | None = None,
+        tags: Iterable[str] = (),
+    ) -> None:
+        key = RESPONSE_KEY_PREFIX + key
+        expiration = expiration or self.default_expiration
+        value = dump_response(response)
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.set(key, value, ex=expiration)
+            for tag in tags:
+                pipe.sadd(TAG_KEY_PREFIX + tag, key)
+                # A tag must live at least as long as the longest entry it references
+                pipe.expire(TAG_KEY_PREFIX + tag, expiration, nx=True)
+                pipe.expire(TAG_KEY_PREFIX + tag, expiration, gt=True)
+            await pipe.execute()
+        await self.evict(key)
+        if self.local is not None:
+            self.local.set(key, value, expiration)
+
+    async def invalidate_tags(self, *tags: str) -> None:
+        """Deletes every response cached under one of the given tags."""
+        tag_keys = [TAG_KEY_PREFIX + tag for tag in tags]
+        async with self._redis.pipeline(transaction=False) as pipe:
+            for tag_key in tag_keys:
+                pipe.smembers(tag_key)
+            members: list[set[bytes]] = await pipe.execute()
+        keys = {key.decode() for key in set().union(*members)}
+        await self._redis.delete(*tag_keys, *keys)
+        await self.evict(*keys)
+
+    async def cached_response(
+        self,
+        request: Request,
+        options: ResponseCacheOptions,
+        call_next: Callable[[Request], Awaitable[Response]],
+        encoding: str | None = None,
+    ) -> Response:
+        """Returns the cached response of the request or caches the one from `call_next`.
+
+        Responses are cached per content encoding, so that hits are not compressed again.
+        """
+        key = self.build_cache_key(request, options.cache_key_builder)
+        if encoding is not None:
+            key = f"{key}:{encoding}"
+        response = await self.get_response(key)
+        if response is not None:
+            return response
+        response = await call_next(request)
+        if response.status_code == status.HTTP_200_OK and not isinstance(
+            response, StreamingResponse
+        ):
+            await self.set_response(
+                key, response, options.expiration, options.format_tags(request)
+            )
+        return response
+
+
+def create_cache() -> RedisCache | None:
+    """Builds the cache of the settings, with its local tier when enabled."""
+    settings = get_settings()
+    if not settings.redis_url:
+        return None
+    local = (
+        LocalCache(
+            max_entries=settings.cache_local_max_entries,
+            max_bytes=settings.cache_local_max_bytes,
+            ttl=settings.cache_local_ttl,
+        )
+        if settings.cache_local_enabled
+        else None
+    )
+    return RedisCache(str(settings.redis_url), local=local)
+
+
+def get_cache(request: Request) -> RedisCache | None:
+    return getattr(request.state, "cache", None)
+
+
+InjectCache = Annotated[RedisCache | None, Depends(get_cache)]
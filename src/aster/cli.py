@@ -1,4 +1,5 @@
 import typing as t
+from pathlib import Path
 
 import typer
 
@@ -7,17 +8,23 @@ import aster
 app = typer.Typer(help="Providing configuration, server, database commands for aster.")
 database_app = typer.Typer()
 server_app = typer.Typer()
+auth_app = typer.Typer()
 
 app.add_typer(
     database_app,
     name="database",
-    help="Contains all aster database-related commands (init, heads, history, upgrade, drop).",
+    help="Contains all aster database-related commands (init, heads, history, upgrade, drop, explain).",
 )
 app.add_typer(
     server_app,
     name="server",
     help="Contains all aster server-related commands (start, config)",
 )
+app.add_typer(
+    auth_app,
+    name="auth",
+    help="Contains all aster authentication-related commands (calibrate).",
+)
 
 
 def version_callback(show_version: bool) -> None:
@@ -102,6 +109,53 @@ def database_history() -> None:
     history(alembic_cfg)
 
 
+@database_app.command(
+    "explain", help="Checks the query plans of the services against a seeded database."
+)
+def database_explain(
+    baseline: t.Annotated[
+        t.Optional[Path],  # noqa: UP007
+        typer.Option(help="Query plans file to detect regressions."),
+    ] = None,
+    update_baseline: t.Annotated[
+        bool, typer.Option(help="Writes the current query plans to the baseline file.")
+    ] = False,
+) -> None:
+    import asyncio
+
+    from aster.explain import (
+        compare_baseline,
+        dump_baseline,
+        explain_services,
+        missing_scenarios,
+    )
+
+    plans = asyncio.run(explain_services())
+    failed = False
+    for plan in plans:
+        if plan.seq_scans:
+            failed = True
+            typer.secho(
+                f"SEQ SCAN {plan.service}: {', '.join(plan.seq_scans)}\n{plan.statement}",
+                fg=typer.colors.RED,
+            )
+        else:
+            typer.echo(f"OK {plan.service}: {' > '.join(plan.signature)}")
+    for service in missing_scenarios():
+        failed = True
+        typer.secho(f"MISSING SCENARIO {service}", fg=typer.colors.RED)
+    if baseline is not None:
+        if update_baseline:
+            baseline.write_bytes(dump_baseline(plans))
+        elif baseline.exists():
+            for service in compare_baseline(plans, baseline.read_bytes()):
+                failed = True
+                typer.secho(f"PLAN CHANGED {service}", fg=typer.colors.RED)
+    if failed:
+        raise typer.Exit(1)
+    typer.secho("Success.", fg=typer.colors.GREEN)
+
+
 @server_app.command("config", help="Prints the current config")
 def server_config() -> None:
     from aster.config import get_settings
@@ -109,6 +163,26 @@ def server_config() -> None:
     typer.secho(get_settings().model_dump(), fg=typer.colors.BLUE)
 
 
+@auth_app.command(
+    "calibrate", help="Finds the password hashing cost matching a target duration."
+)
+def auth_calibrate(
+    target_ms: t.Annotated[
+        int, typer.Option(help="Longest acceptable duration of a single hash.")
+    ] = 250,
+) -> None:
+    from aster.auth.hashing import calibrate_rounds
+
+    timings = calibrate_rounds(target_ms / 1000)
+    for rounds, duration in timings.items():
+        typer.echo(f"{rounds:>2} rounds: {duration * 1000:.1f} ms")
+    matching = [rounds for rounds, duration in timings.items() if duration <= target_ms / 1000]
+    if not matching:
+        typer.secho("Even the lowest cost exceeds the target.", fg=typer.colors.RED)
+        raise typer.Exit(1)
+    typer.secho(f"ASTER_PASSWORD_HASH_ROUNDS={max(matching)}", fg=typer.colors.GREEN)
+
+
 def entrypoint() -> None:
     from .exceptions import AsterException
 
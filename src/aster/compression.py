@@ -0,0 +1,184 @@
+import asyncio
+import gzip
+import time
+from collections.abc import Callable
+from concurrent.futures import Executor, ThreadPoolExecutor
+from functools import lru_cache
+
+from fastapi import Request, Response
+from fastapi.responses import StreamingResponse
+from prometheus_client import Histogram
+
+from aster.config import get_settings
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+COMPRESSIBLE_MEDIA_TYPES = ("application/json", "text/")
+
+COMPRESSION_TIME = Histogram(
+    "aster_compression_seconds", "Time spent compressing a response body", ["encoding"]
+)
+
+Compress = Callable[[bytes, int], bytes]
+
+
+def compress_gzip(body: bytes, level: int) -> bytes:
+    return gzip.compress(body, level, mtime=0)
+
+
+def compress_brotli(body: bytes, level: int) -> bytes:
+    compressed: bytes = brotli.compress(body, quality=level)
+    return compressed
+
+
+def compress_zstd(body: bytes, level: int) -> bytes:
+    # Compressors are not thread safe, and cheap to create
+    compressed: bytes = zstandard.ZstdCompressor(level=level).compress(body)
+    return compressed
+
+
+def get_available_encodings() -> dict[str, Compress]:
+    """Returns the supported encodings, by order of preference."""
+    encodings: dict[str, Compress] = {}
+    if zstandard is not None:
+        encodings["zstd"] = compress_zstd
+    if brotli is not None:
+        encodings["br"] = compress_brotli
+    encodings["gzip"] = compress_gzip
+    return encodings
+
+
+def negotiate_encoding(accept_encoding: str, encodings: list[str]) -> str | None:
+    """Picks the preferred encoding among the ones with the best quality for the client."""
+    qualities: dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.partition(";")
+        quality = 1.0
+        params = params.strip().lower()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        qualities[coding.strip().lower()] = quality
+    best, best_quality = None, 0.0
+    for encoding in encodings:
+        quality = qualities.get(encoding, qualities.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+class ResponseCompressor:
+    """Compresses the response bodies with the encoding negotiated with the client.
+
+    Bodies above `offload_size` are compressed in an executor, off the event loop,
+    and at most `max_concurrency` of them at once, the others wait for a slot.
+    """
+
+    def __init__(
+        self,
+        executor: Executor,
+        max_concurrency: int,
+        levels: dict[str, int],
+        minimum_size: int = 1024,
+        offload_size: int = 256 * 1024,
+    ) -> None:
+        self.executor = executor
+        self.max_concurrency = max_concurrency
+        self.encodings = get_available_encodings()
+        self.levels = levels
+        self.minimum_size = minimum_size
+        self.offload_size = offload_size
+        self._semaphore: asyncio.Semaphore | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    def negotiate(self, request: Request) -> str | None:
+        accept_encoding = request.headers.get("Accept-Encoding")
+        if not accept_encoding:
+            return None
+        return negotiate_encoding(accept_encoding, list(self.encodings))
+
+    def is_compressible(self, response: Response) -> bool:
+        return (
+            not isinstance(response, StreamingResponse)
+            and response.status_code not in (204, 304)
+            and len(response.body) >= self.minimum_size
+            and "content-encoding" not in response.headers
+            and response.headers.get("content-type", "").startswith(COMPRESSIBLE_MEDIA_TYPES)
+        )
+
+    async def compress(self, response: Response, encoding: str | None) -> Response:
+        if not self.is_compressible(response):
+            return response
+        response.headers.add_vary_header("Accept-Encoding")
+        if encoding is None:
+            return response
+        body = response.body
+        if len(body) >= self.offload_size:
+            compressed = await self._compress_in_executor(encoding, body)
+        else:
+            compressed = self._compress(encoding, body)
+        if len(compressed) >= len(body):
+            return response
+        response.body = compressed
+        response.headers["Content-Encoding"] = encoding
+        response.headers["Content-Length"] = str(len(compressed))
+        return response
+
+    def close(self) -> None:
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def _compress(self, encoding: str, body: bytes) -> bytes:
+        start = time.perf_counter()
+        try:
+            return self.encodings[encoding](body, self.levels[encoding])
+        finally:
+            COMPRESSION_TIME.labels(encoding).observe(time.perf_counter() - start)
+
+    async def _compress_in_executor(self, encoding: str, body: bytes) -> bytes:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._loop = loop
+        assert self._semaphore is not None
+        async with self._semaphore:
+            return await loop.run_in_executor(self.executor, self._compress, encoding, body)
+
+
+@lru_cache
+def get_response_compressor() -> ResponseCompressor | None:
+    settings = get_settings()
+    if not settings.compression_enabled:
+        return None
+    return ResponseCompressor(
+        ThreadPoolExecutor(settings.compression_workers, "response-compressor"),
+        settings.compression_max_concurrency or settings.compression_workers,
+        {
+            "gzip": settings.compression_gzip_level,
+            "br": settings.compression_brotli_quality,
+            "zstd": settings.compression_zstd_level,
+        },
+        settings.compression_minimum_size,
+        settings.compression_offload_size,
+    )
+
+
+def close_response_compressor() -> None:
+    """Shuts down the executor of the compressor, if created, e.g. when the application stops.
+
+    A new compressor is created on the next use.
+    """
+    if get_response_compressor.cache_info().currsize and (
+        compressor := get_response_compressor()
+    ):
+        compressor.close()
+    get_response_compressor.cache_clear()
@@ -2,7 +2,7 @@ import logging
 import secrets
 from functools import cached_property, lru_cache
 from pathlib import Path
-from typing import Annotated
+from typing import Annotated, Literal
 
 import sqlalchemy as sa
 import structlog
@@ -38,6 +38,17 @@ class AppSettings(BaseSettings):
     database_port: int = 5432
     database_engine_pool_size: int = 20
     database_engine_max_overflow: int = 0
+    database_engine_pool_timeout: float = 30.0
+    database_engine_pool_recycle: int = -1
+    database_engine_pool_pre_ping: bool = False
+    database_engine_pool_use_lifo: bool = False
+    database_replica_urls: list[PostgresDsn] = Field(default_factory=list)
+    database_replica_selection: Literal["round_robin", "least_connections"] = "round_robin"
+    database_read_your_writes_window: float = 5.0
+    database_slow_query_threshold: float = 0.5
+    database_slow_query_max_parameters_length: int = 1024
+    database_repeated_query_threshold: int = 10
+    database_query_fingerprint_labels: int = 200
 
     def get_sqlalchemy_url(self, with_name: bool = True) -> sa.URL:
         try:
@@ -80,13 +91,71 @@ class AppSettings(BaseSettings):
 
     redis_url: RedisDsn | None = None
 
+    cache_local_enabled: bool = False
+    cache_local_max_entries: int = 1024
+    cache_local_max_bytes: int = 32 * 1024 * 1024
+    cache_local_ttl: float = 5.0
+
+    timeline_max_length: int = 800
+
+    block_graph_local_enabled: bool = True
+    block_graph_local_max_entries: int = 10_000
+    block_graph_local_ttl: float = 5.0
+    block_graph_expiration: int = 24 * 60 * 60
+
+    user_stats_flush_interval: int = Field(default=10, gt=0, le=60)
+    user_stats_batch_size: int = 1000
+
+    worker_metrics_port: int | None = None
+    worker_queue_depth_interval: float = 15.0
+
+    rate_limit_enabled: bool = True
+    rate_limit_local_max_entries: int = 10_000
+
+    compression_enabled: bool = True
+    compression_minimum_size: int = 1024
+    compression_offload_size: int = 256 * 1024
+    compression_workers: int = 2
+    compression_max_concurrency: int | None = None
+    compression_gzip_level: int = 6
+    compression_brotli_quality: int = 4
+    compression_zstd_level: int = 3
+
+    graphql_document_cache_size: int = 256
+    graphql_persisted_queries_max_entries: int = 1024
+    graphql_persisted_queries_expiration: int = 7 * 24 * 60 * 60
+
     logging_level: int = logging.INFO
+    log_buffer_enabled: bool = True
+    log_buffer_size: int = 10_000
+    log_buffer_batch_size: int = 512
+    log_buffer_flush_interval: float = 0.5
+    log_buffer_overflow: Literal["block", "drop_oldest", "sample"] = "drop_oldest"
+    log_buffer_block_timeout: float = 0.1
+    log_access_enabled: bool = True
+    log_timing_enabled: bool = True
+    log_request_id_header: str | None = "X-Request-ID"
+    log_body_sample_rate: float = Field(default=1.0, ge=0.0, le=1.0)
+    log_body_max_bytes: int = 4096
+    log_body_content_types: list[str] = Field(
+        default_factory=lambda: ["application/json", "application/x-www-form-urlencoded"]
+    )
+    log_body_redacted_keys: list[str] = Field(
+        default_factory=lambda: ["password", "token", "access_token", "secret"]
+    )
 
     cors_origin: list[AnyHttpUrl] = Field(default_factory=list)
 
     secret_key: str = secrets.token_urlsafe(32)
     algorithm: str = "HS256"
     access_token_expire_minutes: int = 30
+    auth_token_cache_enabled: bool = True
+    auth_token_cache_max_entries: int = 10_000
+    auth_token_cache_ttl: int = 60
+    password_hash_rounds: int = 12
+    password_hash_executor: Literal["thread", "process"] = "thread"
+    password_hash_workers: int = 4
+    password_hash_max_concurrency: int | None = None
 
 
 @lru_cache
@@ -1,48 +1,193 @@
+import itertools
 import time
-from collections.abc import AsyncIterable
-from typing import Annotated, Any
+from collections import OrderedDict
+from collections.abc import AsyncIterable, Callable, Sequence
+from typing import Annotated, Any, Protocol
 
 import alembic.command
 import alembic.config
 import psycopg
-from fastapi import Depends
+from fastapi import Depends, Request
 from psycopg import sql
-from sqlalchemy import Engine, event
-from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
-from structlog.contextvars import bind_contextvars, get_contextvars
+from sqlalchemy import Engine, event, make_url
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
+from sqlalchemy.orm import ORMExecuteState, Session, UOWTransaction
+
+from aster.cache import get_cache
+from aster.config import AppSettings, get_settings
+from aster.pool import InstrumentedQueuePool
+from aster.profiler import record_query
+
+WRITE_KEY_PREFIX = "database:write:"
+
+
+def get_engine_options(settings: AppSettings, name: str) -> dict[str, Any]:
+    return {
+        "poolclass": InstrumentedQueuePool,
+        "pool_logging_name": name,
+        "pool_size": settings.database_engine_pool_size,
+        "max_overflow": settings.database_engine_max_overflow,
+        "pool_timeout": settings.database_engine_pool_timeout,
+        "pool_recycle": settings.database_engine_pool_recycle,
+        "pool_pre_ping": settings.database_engine_pool_pre_ping,
+        "pool_use_lifo": settings.database_engine_pool_use_lifo,
+    }
+
+
+engine = create_async_engine(
+    str(get_settings().sqlalchemy_database_url), **get_engine_options(get_settings(), "primary")
+)
+replica_engines = [
+    create_async_engine(
+        make_url(str(url)).set(drivername=get_settings().database_scheme),
+        **get_engine_options(get_settings(), f"replica{i}"),
+    )
+    for i, url in enumerate(get_settings().database_replica_urls)
+]
+session_factory = async_sessionmaker(engine, expire_on_commit=False)
 
-from aster.config import get_settings
 
-engine = create_async_engine(str(get_settings().sqlalchemy_database_url))
-session_factory = async_sessionmaker(engine, expire_on_commit=False)
+class ReplicaSelector:
+    """Picks the replica serving the next read session."""
+
+    def __init__(self, engines: Sequence[AsyncEngine], strategy: str = "round_robin") -> None:
+        self.engines = engines
+        self.strategy = strategy
+        self._cycle = itertools.cycle(engines)
+
+    def select(self) -> AsyncEngine | None:
+        if not self.engines:
+            return None
+        if self.strategy == "least_connections":
+            return min(
+                self.engines,
+                key=lambda engine: engine.pool.checkedout(),  # type: ignore[attr-defined]
+            )
+        return next(self._cycle)
+
+
+UserIdentifier = Callable[[Request], str | None]
+"""Returns the user of a request from its verified credentials, before it is authenticated"""
+
+
+def get_user_identifier(request: Request) -> UserIdentifier | None:
+    return getattr(request.state, "identify_user", None)
+
+
+class WriteTracker:
+    """Remembers the clients which wrote recently, so that they read their own writes.
+
+    Clients are identified by the user of their credentials, whether or not the endpoint
+    authenticates them, so that every token of a user shares its writes, or by their
+    address when anonymous.
+    Writes are shared through the cache when there is one.
+    """
+
+    def __init__(self, window: float, max_entries: int = 10_000) -> None:
+        self.window = window
+        self.max_entries = max_entries
+        self._writes: OrderedDict[str, float] = OrderedDict()
+
+    @staticmethod
+    def get_client_key(request: Request) -> str:
+        identify_user = get_user_identifier(request)
+        if identify_user is not None and (user := identify_user(request)) is not None:
+            return f"user:{user}"
+        return f"ip:{request.client.host}" if request.client else "ip:"
+
+    async def mark(self, request: Request) -> None:
+        key = self.get_client_key(request)
+        self._writes[key] = time.monotonic() + self.window
+        self._writes.move_to_end(key)
+        while len(self._writes) > self.max_entries:
+            self._writes.popitem(last=False)
+        if (cache := get_cache(request)) is not None:
+            await cache.redis.set(WRITE_KEY_PREFIX + key, 1, px=int(self.window * 1000))
 
+    async def wrote_recently(self, request: Request) -> bool:
+        key = self.get_client_key(request)
+        expires_at = self._writes.get(key)
+        if expires_at is not None:
+            if expires_at > time.monotonic():
+                return True
+            del self._writes[key]
+        if (cache := get_cache(request)) is not None:
+            return await cache.redis.exists(WRITE_KEY_PREFIX + key) == 1
+        return False
 
-async def get_session() -> AsyncIterable[AsyncSession]:
+
+replica_selector = ReplicaSelector(replica_engines, get_settings().database_replica_selection)
+write_tracker = WriteTracker(get_settings().database_read_your_writes_window)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def track_orm_execute_writes(orm_execute_state: ORMExecuteState) -> None:
+    if not orm_execute_state.is_select:
+        orm_execute_state.session.info["has_writes"] = True
+
+
+@event.listens_for(Session, "after_flush")
+def track_flush_writes(session: Session, flush_context: UOWTransaction) -> None:
+    session.info["has_writes"] = True
+
+
+class SessionHook(Protocol):
+    """Extension of the request sessions, registered in the state of the application."""
+
+    def track(self, session: AsyncSession) -> None:
+        """Called when the session is opened."""
+
+    async def push(self, session: AsyncSession) -> None:
+        """Called once the transaction of the session is committed."""
+
+
+def get_session_hooks(request: Request) -> Sequence[SessionHook]:
+    return getattr(request.state, "session_hooks", ())
+
+
+async def get_session(request: Request) -> AsyncIterable[AsyncSession]:
+    session_hooks = get_session_hooks(request)
     async with session_factory.begin() as session:
+        for session_hook in session_hooks:
+            session_hook.track(session)
+        yield session
+    for session_hook in session_hooks:
+        await session_hook.push(session)
+    if replica_engines and session.info.get("has_writes"):
+        await write_tracker.mark(request)
+
+
+async def get_read_session(request: Request) -> AsyncIterable[AsyncSession]:
+    """Opens a session on a replica, or on the primary after a recent write of the client."""
+    replica = None
+    if replica_engines and not await write_tracker.wrote_recently(request):
+        replica = replica_selector.select()
+    async with session_factory(bind=replica) if replica else session_factory() as session:
         yield session
 
 
 InjectSession = Annotated[AsyncSession, Depends(get_session)]
+InjectReadSession = Annotated[AsyncSession, Depends(get_read_session)]
 
 
 @event.listens_for(Engine, "before_cursor_execute")
 def before_cursor_execute(
     conn: Any, cursor: Any, statement: Any, parameters: Any, context: Any, executemany: Any
 ) -> None:
-    conn.info["query_start_time"] = time.time()
+    conn.info["query_start_time"] = time.perf_counter_ns()
 
 
 @event.listens_for(Engine, "after_cursor_execute")
 def after_cursor_execute(
     conn: Any, cursor: Any, statement: Any, parameters: Any, context: Any, executemany: Any
 ) -> None:
-    end_time = time.time()
-    bind_contextvars(
-        sql_queries_count=get_contextvars().get("sql_queries_count", 0) + 1,
-        sql_queries_time_spent=get_contextvars().get("sql_queries_time_spent", 0.0)
-        + end_time
-        - conn.info.pop("query_start_time", end_time),
-    )
+    end_time = time.perf_counter_ns()
+    record_query(statement, parameters, end_time - conn.info.pop("query_start_time", end_time))
 
 
 def create_database() -> None:
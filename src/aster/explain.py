@@ -0,0 +1,368 @@
+import inspect
+from collections.abc import Awaitable, Callable, Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any
+
+import orjson
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+
+from aster.auth import services as auth_services
+from aster.auth.schemas import UserCreate
+from aster.database import engine
+from aster.models import Post, User
+from aster.posts import services as posts_services
+from aster.posts.schemas import PostCreate
+
+SERVICE_MODULES = (auth_services, posts_services)
+EXPLAINABLE_STATEMENTS = ("SELECT", "UPDATE", "DELETE", "WITH")
+
+
+@dataclass(frozen=True)
+class Seed:
+    """Rows created before running the scenarios, referenced by id."""
+
+    user_id: int
+    username: str
+    blocked_username: str
+    followed_id: int
+    followed_username: str
+    post_id: int
+
+
+Scenario = Callable[[AsyncSession, Seed], Awaitable[Any]]
+SCENARIOS: dict[str, Scenario] = {}
+
+
+def get_service_name(service: Callable[..., Any]) -> str:
+    return f"{service.__module__}.{service.__qualname__}"
+
+
+def scenario(service: Callable[..., Any]) -> Callable[[Scenario], Scenario]:
+    """Registers the scenario exercising the queries of a service function."""
+
+    def decorator(func: Scenario) -> Scenario:
+        SCENARIOS[get_service_name(service)] = func
+        return func
+
+    return decorator
+
+
+def list_services() -> list[str]:
+    return [
+        get_service_name(func)
+        for module in SERVICE_MODULES
+        for name, func in inspect.getmembers(module, inspect.iscoroutinefunction)
+        if func.__module__ == module.__name__ and not name.startswith("_")
+    ]
+
+
+def missing_scenarios() -> list[str]:
+    return [service for service in list_services() if service not in SCENARIOS]
+
+
+@dataclass(frozen=True)
+class QueryPlan:
+    service: str
+    statement: str
+    plan: dict[str, Any]
+
+    def nodes(self) -> Iterator[dict[str, Any]]:
+        stack = [self.plan]
+        while stack:
+            node = stack.pop()
+            yield node
+            stack.extend(reversed(node.get("Plans", [])))
+
+    @property
+    def seq_scans(self) -> list[str]:
+        """Relations read with a sequential scan."""
+        return [node["Relation Name"] for node in self.nodes() if node["Node Type"] == "Seq Scan"]
+
+    @property
+    def signature(self) -> list[str]:
+        """Node types with the index or relation they read, compared against a baseline."""
+        return [
+            " ".join(
+                filter(
+                    None, (node["Node Type"], node.get("Index Name") or node.get("Relation Name"))
+                )
+            )
+            for node in self.nodes()
+        ]
+
+
+def dump_baseline(plans: list[QueryPlan]) -> bytes:
+    baseline: dict[str, list[list[str]]] = {}
+    for plan in plans:
+        baseline.setdefault(plan.service, []).append(plan.signature)
+    return orjson.dumps(baseline, option=orjson.OPT_INDENT_2 | orjson.OPT_SORT_KEYS)
+
+
+def compare_baseline(plans: list[QueryPlan], baseline: bytes) -> list[str]:
+    """Returns the services whose plans changed since the baseline."""
+    previous: dict[str, list[list[str]]] = orjson.loads(baseline)
+    current: dict[str, list[list[str]]] = orjson.loads(dump_baseline(plans))
+    return sorted(
+        service
+        for service in previous.keys() | current.keys()
+        if previous.get(service) != current.get(service)
+    )
+
+
+@contextmanager
+def capture_statements(conn: AsyncConnection) -> Iterator[list[tuple[str, Any]]]:
+    statements: list[tuple[str, Any]] = []
+
+    def before_cursor_execute(
+        conn: Any, cursor: Any, statement: str, parameters: Any, context: Any, executemany: bool
+    ) -> None:
+        if not executemany and statement.lstrip().upper().startswith(EXPLAINABLE_STATEMENTS):
+            statements.append((statement, parameters))
+
+    event.listen(conn.sync_connection, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(conn.sync_connection, "before_cursor_execute", before_cursor_execute)
+
+
+async def seed_database(session: AsyncSession) -> Seed:
+    user, blocked, followed = (
+        User(username=f"explain_{name}", password="password")
+        for name in ("user", "blocked", "followed")
+    )
+    session.add_all((user, blocked, followed))
+    await session.flush()
+    post = await posts_services.create_post(session, data_in=PostCreate(content="Post"), user=user)
+    await auth_services.block_user(session, user=user, username_to_block=blocked.username)
+    await auth_services.follow_user(session, user=user, user_to_follow=followed)
+    return Seed(
+        user_id=user.id,
+        username=user.username,
+        blocked_username=blocked.username,
+        followed_id=followed.id,
+        followed_username=followed.username,
+        post_id=post.id,
+    )
+
+
+async def explain_services() -> list[QueryPlan]:
+    """Explains the queries of every scenario with sequential scans disabled.
+
+    On a small seeded database the planner prefers sequential scans, disabling them
+    makes it use an index whenever one matches, the remaining ones have none.
+    Everything runs in a transaction which is rolled back.
+    """
+    plans: list[QueryPlan] = []
+    async with engine.connect() as conn, conn.begin():
+        await conn.execute(text("SET LOCAL enable_seqscan = off"))
+        session = AsyncSession(bind=conn, join_transaction_mode="create_savepoint")
+        seed = await seed_database(session)
+        for service, run in SCENARIOS.items():
+            savepoint = await session.begin_nested()
+            try:
+                with capture_statements(conn) as statements:
+                    await run(session, seed)
+                    await session.flush()
+            finally:
+                await savepoint.rollback()
+                session.expunge_all()
+            for statement, parameters in statements:
+                result = await conn.exec_driver_sql(
+                    f"EXPLAIN (FORMAT JSON) {statement}", parameters
+                )
+                plans.append(QueryPlan(service, statement, result.scalar_one()[0]["Plan"]))
+        await session.close()
+    return plans
+
+
+# Auth services
+
+
+@scenario(auth_services.create_user)
+async def explain_create_user(session: AsyncSession, seed: Seed) -> None:
+    await auth_services.create_user(
+        session, data_in=UserCreate(username="explain_new", password="password")
+    )
+
+
+@scenario(auth_services.get_user_by_username)
+async def explain_get_user_by_username(session: AsyncSession, seed: Seed) -> None:
+    await auth_services.get_user_by_username(session, username=seed.username)
+
+
+@scenario(auth_services.get_users_by_ids)
+async def explain_get_users_by_ids(session: AsyncSession, seed: Seed) -> None:
+    await auth_services.get_users_by_ids(session, user_ids=[seed.user_id, seed.followed_id])
+
+
+@scenario(auth_services.list_users)
+async def explain_list_users(session: AsyncSession, seed: Seed) -> None:
+    await auth_services.list_users(session, after=seed.user_id)
+
+
+@scenario(auth_services.list_user_records)
+async def explain_list_user_records(session: AsyncSession, seed: Seed) -> None:
+    await auth_services.list_user_records(session, after=seed.user_id)
+
+
+@scenario(auth_services.stream_users)
+async def explain_stream_users(session: AsyncSession, seed: Seed) -> None:
+    await (await auth_services.stream_users(session, after=seed.user_id)).all()
+
+
+@scenario(auth_services.list_users_blocked_by_user)
+async def explain_list_users_blocked_by_user(session: AsyncSession, seed: Seed) -> None:
+    await auth_services.list_users_blocked_by_user(session, username=seed.username)
+
+
+@scenario(auth_services.check_if_user_blocked_by_user)
+async def explain_check_if_user_blocked_by_user(session: AsyncSession, seed: Seed) -> None:
+    await auth_services.check_if_user_blocked_by_user(
+        session, username=seed.username, username_block=seed.blocked_username
+    )
+
+
+@scenario(auth_services.list_blocks_of_user)
+async def explain_list_blocks_of_user(session: AsyncSession, seed: Seed) -> None:
+    await auth_services.list_blocks_of_user(session, user_id=seed.user_id)
+
+
+@scenario(auth_services.block_user)
+async def explain_block_user(session: AsyncSession, seed: Seed) -> None:
+    user = await session.get_one(User, seed.user_id)
+    await auth_services.block_user(session, user=user, username_to_block=seed.followed_username)
+
+
+@scenario(auth_services.unblock_user)
+async def explain_unblock_user(session: AsyncSession, seed: Seed) -> None:
+    user = await session.get_one(User, seed.user_id)
+    await auth_services.unblock_user(
+        session, user=user, username_to_unblock=seed.blocked_username
+    )
+
+
+@scenario(auth_services.follow_user)
+async def explain_follow_user(session: AsyncSession, seed: Seed) -> None:
+    user = await session.get_one(User, seed.user_id)
+    user_to_follow = await session.get_one(User, seed.followed_id)
+    await auth_services.follow_user(session, user=user_to_follow, user_to_follow=user)
+
+
+@scenario(auth_services.unfollow_user)
+async def explain_unfollow_user(session: AsyncSession, seed: Seed) -> None:
+    user = await session.get_one(User, seed.user_id)
+    user_to_unfollow = await session.get_one(User, seed.followed_id)
+    await auth_services.unfollow_user(session, user=user, user_to_unfollow=user_to_unfollow)
+
+
+@scenario(auth_services.list_follower_ids)
+async def explain_list_follower_ids(session: AsyncSession, seed: Seed) -> None:
+    await auth_services.list_follower_ids(session, user_id=seed.followed_id)
+
+
+
+@scenario(auth_services.count_user_stats)
+async def explain_count_user_stats(session: AsyncSession, seed: Seed) -> None:
+    await auth_services.count_user_stats(session, deltas={(seed.user_id, "post_count"): 1})
+
+
+@scenario(auth_services.update_user_stats)
+async def explain_update_user_stats(session: AsyncSession, seed: Seed) -> None:
+    await auth_services.update_user_stats(
+        session,
+        deltas={(seed.user_id, "following_count"): 1, (seed.followed_id, "follower_count"): 1},
+    )
+
+
+@scenario(auth_services.reconcile_user_stats)
+async def explain_reconcile_user_stats(session: AsyncSession, seed: Seed) -> None:
+    await auth_services.reconcile_user_stats(session, after=seed.user_id - 1)
+
+
+# Posts services
+
+
+@scenario(posts_services.create_post)
+async def explain_create_post(session: AsyncSession, seed: Seed) -> None:
+    user = await session.get_one(User, seed.user_id)
+    await posts_services.create_post(session, data_in=PostCreate(content="Post"), user=user)
+
+
+@scenario(posts_services.create_posts)
+async def explain_create_posts(session: AsyncSession, seed: Seed) -> None:
+    user = await session.get_one(User, seed.user_id)
+    await posts_services.create_posts(
+        session, data_in=[PostCreate(content="Post"), PostCreate(content="Post")], user=user
+    )
+
+
+@scenario(posts_services.get_post_by_id)
+async def explain_get_post_by_id(session: AsyncSession, seed: Seed) -> None:
+    await posts_services.get_post_by_id(session, post_id=seed.post_id)
+
+
+@scenario(posts_services.get_posts_by_ids)
+async def explain_get_posts_by_ids(session: AsyncSession, seed: Seed) -> None:
+    await posts_services.get_posts_by_ids(session, post_ids=[seed.post_id])
+
+
+@scenario(posts_services.list_posts)
+async def explain_list_posts(session: AsyncSession, seed: Seed) -> None:
+    post = await session.get_one(Post, seed.post_id)
+    await posts_services.list_posts(
+        session, username=seed.username, after=(post.created_at, post.id)
+    )
+
+
+@scenario(posts_services.list_post_records)
+async def explain_list_post_records(session: AsyncSession, seed: Seed) -> None:
+    post = await session.get_one(Post, seed.post_id)
+    await posts_services.list_post_records(
+        session, username=seed.username, after=(post.created_at, post.id)
+    )
+
+
+@scenario(posts_services.stream_posts)
+async def explain_stream_posts(session: AsyncSession, seed: Seed) -> None:
+    await (await posts_services.stream_posts(session, username=seed.username)).all()
+
+
+@scenario(posts_services.search_posts)
+async def explain_search_posts(session: AsyncSession, seed: Seed) -> None:
+    await posts_services.search_posts(
+        session, query="post", after=(1.0, seed.post_id), viewer_id=seed.user_id
+    )
+    await posts_services.search_posts(session, query="post -draft", username=seed.username)
+
+
+@scenario(posts_services.list_posts_by_user_ids)
+async def explain_list_posts_by_user_ids(session: AsyncSession, seed: Seed) -> None:
+    await posts_services.list_posts_by_user_ids(
+        session, user_ids=[seed.user_id, seed.followed_id]
+    )
+
+
+@scenario(posts_services.delete_post)
+async def explain_delete_post(session: AsyncSession, seed: Seed) -> None:
+    post = await session.get_one(Post, seed.post_id)
+    await posts_services.delete_post(session, post=post)
+
+
+@scenario(posts_services.list_post_ids_by_user)
+async def explain_list_post_ids_by_user(session: AsyncSession, seed: Seed) -> None:
+    await posts_services.list_post_ids_by_user(session, user_id=seed.user_id)
+
+
+@scenario(posts_services.list_timeline_posts)
+async def explain_list_timeline_posts(session: AsyncSession, seed: Seed) -> None:
+    await posts_services.list_timeline_posts(session, user_id=seed.user_id, before=seed.post_id)
+
+
+@scenario(posts_services.get_timeline_posts_by_ids)
+async def explain_get_timeline_posts_by_ids(session: AsyncSession, seed: Seed) -> None:
+    await posts_services.get_timeline_posts_by_ids(
+        session, user_id=seed.user_id, post_ids=[seed.post_id]
+    )
@@ -1,15 +1,66 @@
 from __future__ import annotations
 
+from collections import defaultdict
+from collections.abc import Sequence
 from datetime import datetime
 from typing import Annotated, Self
 
 import strawberry
-
-from aster.auth.services import get_user_by_username
-from aster.auth.utils import verify_password
-from aster.database import session_factory
+from sqlalchemy.ext.asyncio import AsyncSession
+from strawberry.dataloader import DataLoader
+from strawberry.extensions import ParserCache, ValidationCache
+from strawberry.fastapi import BaseContext
+from strawberry.types import Info
+
+from aster.auth.hashing import get_password_hasher
+from aster.auth.services import get_user_by_username, get_users_by_ids
+from aster.config import get_settings
+from aster.database import InjectSession
+from aster.graph_cache import ResultCache, cache_ttl
 from aster.models import Post, User
-from aster.posts.services import get_post_by_id
+from aster.pagination import decode_cursor, paginate
+from aster.posts.constants import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from aster.posts.schemas import PostCursor
+from aster.posts.services import get_posts_by_ids, list_posts, list_posts_by_user_ids
+
+
+class GraphContext(BaseContext):
+    """Shares a session and the data loaders between the resolvers of a request."""
+
+    def __init__(self, session: AsyncSession) -> None:
+        super().__init__()
+        self.session = session
+        self.user_loader = DataLoader[int, User | None](load_fn=self.load_users)
+        self.post_loader = DataLoader[int, Post | None](load_fn=self.load_posts)
+        self.posts_by_user_loader = DataLoader[tuple[int, int], list[Post]](
+            load_fn=self.load_posts_by_user
+        )
+
+    async def load_users(self, user_ids: Sequence[int]) -> list[User | None]:
+        users = {user.id: user for user in await get_users_by_ids(self.session, user_ids=user_ids)}
+        return [users.get(user_id) for user_id in user_ids]
+
+    async def load_posts(self, post_ids: Sequence[int]) -> list[Post | None]:
+        posts = {post.id: post for post in await get_posts_by_ids(self.session, post_ids=post_ids)}
+        return [posts.get(post_id) for post_id in post_ids]
+
+    async def load_posts_by_user(self, keys: Sequence[tuple[int, int]]) -> list[list[Post]]:
+        """Loads the latest posts of users, keyed by `(user_id, limit)`."""
+        user_ids_by_limit: defaultdict[int, list[int]] = defaultdict(list)
+        for user_id, limit in keys:
+            user_ids_by_limit[limit].append(user_id)
+        posts_by_key: defaultdict[tuple[int, int], list[Post]] = defaultdict(list)
+        for limit, user_ids in user_ids_by_limit.items():
+            for post in await list_posts_by_user_ids(self.session, user_ids=user_ids, limit=limit):
+                posts_by_key[post.uid, limit].append(post)
+        return [posts_by_key[key] for key in keys]
+
+
+async def get_context(session: InjectSession) -> GraphContext:
+    return GraphContext(session)
+
+
+GraphInfo = Info[GraphContext, None]
 
 
 @strawberry.type
@@ -30,7 +81,14 @@ class PostSchema:
     id: strawberry.ID
     content: str
     created_at: datetime
-    user: UserSchema
+    uid: strawberry.Private[int]
+
+    @strawberry.field
+    async def user(self, info: GraphInfo) -> UserSchema:
+        user = await info.context.user_loader.load(self.uid)
+        if not user:
+            raise Exception
+        return UserSchema.marshal(user)
 
     @classmethod
     def marshal(cls, model: Post) -> Self:
@@ -38,15 +96,28 @@ class PostSchema:
             id=strawberry.ID(str(model.id)),
             content=model.content,
             created_at=model.created_at,
-            user=UserSchema.marshal(model.user),
+            uid=model.uid,
         )
 
 
+@strawberry.type
+class PostPageSchema:
+    items: list[PostSchema]
+    next_cursor: str | None
+
+
 @strawberry.type
 class UserSchema:
     id: strawberry.ID
     username: str
 
+    @strawberry.field
+    async def posts(self, info: GraphInfo, first: int = DEFAULT_PAGE_SIZE) -> list[PostSchema]:
+        posts = await info.context.posts_by_user_loader.load(
+            (int(self.id), min(first, MAX_PAGE_SIZE))
+        )
+        return [PostSchema.marshal(post) for post in posts]
+
     @classmethod
     def marshal(cls, model: User) -> Self:
         return cls(id=strawberry.ID(str(model.id)), username=model.username)
@@ -54,26 +125,62 @@ class UserSchema:
 
 @strawberry.type
 class Query:
-    @strawberry.field
-    async def post(self, id: strawberry.ID) -> PostSchema:
-        async with session_factory.begin() as session:
-            post = await get_post_by_id(session, post_id=int(id))
-            if not post:
-                raise Exception
-            return PostSchema.marshal(post)
+    @strawberry.field(metadata=cache_ttl(30))
+    async def post(self, info: GraphInfo, id: strawberry.ID) -> PostSchema:
+        post = await info.context.post_loader.load(int(id))
+        if not post:
+            raise Exception
+        return PostSchema.marshal(post)
+
+    @strawberry.field(metadata=cache_ttl(10))
+    async def posts(
+        self,
+        info: GraphInfo,
+        username: str,
+        first: int = DEFAULT_PAGE_SIZE,
+        after: str | None = None,
+    ) -> PostPageSchema:
+        first = min(first, MAX_PAGE_SIZE)
+        posts = await list_posts(
+            info.context.session,
+            username=username,
+            limit=first + 1,
+            after=decode_cursor(after, PostCursor) if after else None,
+        )
+        for post in posts:
+            info.context.user_loader.prime(post.uid, post.user)
+        page, next_cursor = paginate(posts, first, lambda post: (post.created_at, post.id))
+        return PostPageSchema(
+            items=[PostSchema.marshal(post) for post in page], next_cursor=next_cursor
+        )
+
+    @strawberry.field(metadata=cache_ttl(30))
+    async def user(self, info: GraphInfo, username: str) -> UserSchema | None:
+        user = await get_user_by_username(info.context.session, username=username)
+        if not user:
+            return None
+        info.context.user_loader.prime(user.id, user)
+        return UserSchema.marshal(user)
 
 
 @strawberry.type
 class Mutation:
     @strawberry.field
-    async def login(self, username: str, password: str) -> LoginResult:
-        async with session_factory.begin() as session:
-            user = await get_user_by_username(session, username=username)
-            if not user:
-                return LoginError(message="Something went wrong")
-            if not verify_password(password, user.password):
-                return LoginError(message="Something went wrong")
-            return LoginSuccess(user=UserSchema.marshal(user))
-
-
-schema = strawberry.Schema(Query, mutation=Mutation)
+    async def login(self, info: GraphInfo, username: str, password: str) -> LoginResult:
+        user = await get_user_by_username(info.context.session, username=username)
+        if not user:
+            return LoginError(message="Something went wrong")
+        if not await get_password_hasher().verify(password, user.password):
+            return LoginError(message="Something went wrong")
+        return LoginSuccess(user=UserSchema.marshal(user))
+
+
+schema = strawberry.Schema(
+    Query,
+    mutation=Mutation,
+    extensions=[
+        ParserCache(maxsize=get_settings().graphql_document_cache_size),
+        ValidationCache(maxsize=get_settings().graphql_document_cache_size),
+        ResultCache,
+    ],
+)
@@ -0,0 +1,197 @@
+import hashlib
+from collections.abc import AsyncIterator
+from typing import Any, cast
+
+import orjson
+from fastapi import Request
+from graphql import (
+    DocumentNode,
+    ExecutionResult,
+    GraphQLError,
+    GraphQLSchema,
+    TypeInfo,
+    TypeInfoVisitor,
+    Visitor,
+    visit,
+)
+from graphql.language import FieldNode
+from strawberry.extensions import SchemaExtension
+from strawberry.fastapi import GraphQLRouter
+from strawberry.fastapi.router import FastAPIRequestAdapter
+from strawberry.http import GraphQLRequestData
+from strawberry.http.async_base_view import AsyncHTTPRequestAdapter
+from strawberry.http.base import BaseRequestProtocol
+from strawberry.http.exceptions import HTTPException
+from strawberry.types import ExecutionResult as StrawberryExecutionResult
+from strawberry.types.graphql import OperationType
+
+from aster.cache import LocalCache, get_cache
+from aster.config import get_settings
+
+CACHE_TTL = "aster_cache_ttl"
+PERSISTED_QUERY_KEY_PREFIX = "graphql:query:"
+RESULT_KEY_PREFIX = "graphql:result:"
+
+
+def cache_ttl(seconds: int) -> dict[str, int]:
+    """Field metadata opting the results selecting the field into caching, e.g.:
+
+    @strawberry.field(metadata=cache_ttl(30))
+    """
+    return {CACHE_TTL: seconds}
+
+
+def sha256(value: str | bytes) -> str:
+    return hashlib.sha256(value.encode() if isinstance(value, str) else value).hexdigest()
+
+
+class _CacheTTLVisitor(Visitor):
+    def __init__(self, schema: GraphQLSchema, type_info: TypeInfo) -> None:
+        super().__init__()
+        self.schema = schema
+        self.type_info = type_info
+        self.ttl: int | None = None
+        self.cacheable = True
+
+    def enter_field(self, node: FieldNode, *args: Any) -> None:
+        field = self.type_info.get_field_def()
+        if field is None or node.name.value.startswith("__"):
+            return
+        definition = field.extensions.get("strawberry-definition")
+        ttl = definition.metadata.get(CACHE_TTL) if definition is not None else None
+        if ttl is None:
+            if self.type_info.get_parent_type() is self.schema.query_type:
+                self.cacheable = False
+            return
+        self.ttl = ttl if self.ttl is None else min(self.ttl, ttl)
+
+
+def get_result_ttl(schema: GraphQLSchema, document: DocumentNode) -> int | None:
+    """Returns the smallest TTL of the selected fields, if every root field declares one."""
+    type_info = TypeInfo(schema)
+    visitor = _CacheTTLVisitor(schema, type_info)
+    visit(document, TypeInfoVisitor(type_info, visitor))
+    return visitor.ttl if visitor.cacheable else None
+
+
+class ResultCache(SchemaExtension):
+    """Caches the results of the queries whose fields declare a TTL in the response cache.
+
+    Results are keyed by the query and the variables only, fields reading the
+    authenticated user must not declare a TTL.
+    """
+
+    async def on_execute(self) -> AsyncIterator[None]:
+        execution_context = self.execution_context
+        request: Request | None = getattr(execution_context.context, "request", None)
+        cache = get_cache(request) if request is not None else None
+        ttl = None
+        if cache is not None and execution_context.operation_type == OperationType.QUERY:
+            assert execution_context.graphql_document is not None
+            ttl = get_result_ttl(
+                execution_context.schema._schema, execution_context.graphql_document
+            )
+        if cache is None or ttl is None:
+            yield
+            return
+        key = RESULT_KEY_PREFIX + sha256(
+            orjson.dumps(
+                [
+                    execution_context.query,
+                    execution_context.operation_name,
+                    execution_context.variables,
+                ],
+                option=orjson.OPT_SORT_KEYS,
+            )
+        )
+        value = await cache.get(key)
+        if value is not None:
+            execution_context.result = ExecutionResult(orjson.loads(value), None)
+            yield
+            return
+        yield
+        result = execution_context.result
+        if result is not None and not result.errors:
+            await cache.set(key, orjson.dumps(result.data), ttl)
+
+
+class PersistedQueryNotFound(Exception):
+    pass
+
+
+class AsterGraphQLRouter(GraphQLRouter[Any, Any]):
+    """Supports automatic persisted queries, documents are stored by their SHA-256 hash.
+
+    Documents are kept in memory and shared through the cache when there is one.
+    """
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        settings = get_settings()
+        self.persisted_queries_expiration = settings.graphql_persisted_queries_expiration
+        self.persisted_queries = LocalCache(
+            settings.graphql_persisted_queries_max_entries,
+            ttl=self.persisted_queries_expiration,
+        )
+
+    async def execute_operation(
+        self, request: Request, context: Any, root_value: Any
+    ) -> StrawberryExecutionResult:
+        try:
+            return await super().execute_operation(request, context, root_value)
+        except PersistedQueryNotFound:
+            error = GraphQLError(
+                "PersistedQueryNotFound", extensions={"code": "PERSISTED_QUERY_NOT_FOUND"}
+            )
+            return StrawberryExecutionResult(data=None, errors=[error])
+
+    def should_render_graphql_ide(self, request: BaseRequestProtocol) -> bool:
+        # Persisted queries are sent by GET without the query
+        return (
+            super().should_render_graphql_ide(request)
+            and request.query_params.get("extensions") is None
+        )
+
+    async def parse_http_body(self, request: AsyncHTTPRequestAdapter) -> GraphQLRequestData:
+        request_data = await super().parse_http_body(request)
+        if request.method == "GET":
+            extensions = orjson.loads(str(request.query_params.get("extensions") or "{}"))
+        elif "application/json" in (request.content_type or ""):
+            extensions = orjson.loads(await request.get_body()).get("extensions") or {}
+        else:
+            return request_data
+        persisted_query = extensions.get("persistedQuery")
+        if not persisted_query:
+            return request_data
+        if persisted_query.get("version") != 1:
+            raise HTTPException(400, "Unsupported persisted query version")
+        query_hash: str = persisted_query.get("sha256Hash", "")
+        fastapi_request = cast(FastAPIRequestAdapter, request).request
+        if request_data.query is None:
+            request_data.query = await self.load_persisted_query(fastapi_request, query_hash)
+            if request_data.query is None:
+                raise PersistedQueryNotFound
+        elif sha256(request_data.query) != query_hash:
+            raise HTTPException(400, "Provided sha256Hash does not match the query")
+        else:
+            await self.store_persisted_query(fastapi_request, query_hash, request_data.query)
+        return request_data
+
+    async def load_persisted_query(self, request: Request, query_hash: str) -> str | None:
+        key = PERSISTED_QUERY_KEY_PREFIX + query_hash
+        value = self.persisted_queries.get(key)
+        cache = get_cache(request)
+        if value is None and cache is not None:
+            value = await cache.get(key)
+            if value is not None:
+                self.persisted_queries.set(key, value)
+        return value.decode() if value is not None else None
+
+    async def store_persisted_query(self, request: Request, query_hash: str, query: str) -> None:
+        key = PERSISTED_QUERY_KEY_PREFIX + query_hash
+        if key in self.persisted_queries:
+            return
+        self.persisted_queries.set(key, query.encode())
+        cache = get_cache(request)
+        if cache is not None:
+            await cache.set(key, query.encode(), self.persisted_queries_expiration)
@@ -1,15 +1,25 @@
+import asyncio
 import atexit
 import logging
+import random
+import sys
+import threading
+import time
+from collections import deque
 from collections.abc import Callable
-from dataclasses import asdict, dataclass, field
+from dataclasses import dataclass, field, fields
+from functools import lru_cache
 from logging.handlers import QueueHandler, QueueListener
 from queue import Queue
-from typing import Any
+from typing import Any, BinaryIO, Literal
 
 import orjson
 import structlog
+from prometheus_client import Counter
 from structlog.types import BindableLogger, FilteringBoundLogger, Processor, WrappedLogger
 
+from aster.config import get_settings
+
 
 def default_structlog_processors() -> list[Processor]:
     return [
@@ -60,7 +70,8 @@ class StructLoggingConfig:
             from structlog import configure, get_logger
 
             # we now configure structlog
-            configure(**dict(asdict(self).items()))
+            # Not `asdict`, which deep copies the logger factory
+            configure(**{f.name: getattr(self, f.name) for f in fields(self)})
             return get_logger
         except ImportError as e:  # pragma: no cover
             raise e
@@ -78,3 +89,176 @@ class QueueListenerHandler(QueueHandler):
         self.listener.start()
 
         atexit.register(self.listener.stop)
+
+
+LOG_RECORDS_DROPPED = Counter(
+    "aster_log_records_dropped_total", "Log records dropped by the log buffer", ["policy"]
+)
+
+OverflowPolicy = Literal["block", "drop_oldest", "sample"]
+
+
+def in_event_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+class LogBuffer:
+    """Bounded buffer of rendered records, written in batches by a background thread.
+
+    When the buffer is full, the `block` policy waits for the writer, `drop_oldest`
+    drops the oldest record, and `sample` keeps a decreasing share of the records
+    once the buffer is half full and drops the new ones once it is full.
+
+    `block` waits at most `block_timeout` seconds, and never on an event loop, which
+    would stall every request: it falls back to dropping the oldest record instead.
+    """
+
+    def __init__(
+        self,
+        file: BinaryIO | None = None,
+        capacity: int = 10_000,
+        batch_size: int = 512,
+        flush_interval: float = 0.5,
+        overflow: OverflowPolicy = "drop_oldest",
+        block_timeout: float = 0.1,
+    ) -> None:
+        self.file = file or sys.stdout.buffer
+        self.capacity = capacity
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.overflow = overflow
+        self.block_timeout = block_timeout
+        self.dropped = 0
+        self._records: deque[bytes] = deque()
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        self._not_full = threading.Condition(self._lock)
+        self._closed = False
+        self._thread: threading.Thread | None = None
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="aster-log-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def put(self, record: bytes) -> None:
+        with self._lock:
+            size = len(self._records)
+            if size >= self.capacity or (
+                self.overflow == "sample" and not self._should_sample(size)
+            ):
+                if self.overflow == "block" and self._wait_not_full():
+                    pass
+                elif self.overflow in ("block", "drop_oldest"):
+                    self._records.popleft()
+                    self._drop("drop_oldest")
+                else:
+                    self._drop(self.overflow)
+                    return
+            self._records.append(record)
+            if len(self._records) >= self.batch_size:
+                self._not_empty.notify()
+
+    def flush(self) -> None:
+        """Writes the buffered records from the calling thread."""
+        while batch := self._take():
+            self._write(batch)
+
+    def close(self) -> None:
+        with self._lock:
+            self._closed = True
+            self._not_empty.notify()
+            self._not_full.notify_all()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        self.flush()
+
+    def _should_sample(self, size: int) -> bool:
+        threshold = self.capacity // 2
+        if size < threshold:
+            return True
+        return random.random() < (self.capacity - size) / (self.capacity - threshold)
+
+    def _wait_not_full(self) -> bool:
+        if self._thread is None or in_event_loop():
+            return False
+        deadline = time.monotonic() + self.block_timeout
+        while len(self._records) >= self.capacity and not self._closed:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                return False
+            self._not_full.wait(timeout)
+        return True
+
+    def _drop(self, policy: OverflowPolicy) -> None:
+        """Counts a dropped record under the policy which actually dropped it."""
+        self.dropped += 1
+        LOG_RECORDS_DROPPED.labels(policy).inc()
+
+    def _take(self) -> list[bytes]:
+        with self._lock:
+            count = min(len(self._records), self.batch_size)
+            batch = [self._records.popleft() for _ in range(count)]
+            self._not_full.notify_all()
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            with self._lock:
+                if len(self._records) < self.batch_size and not self._closed:
+                    self._not_empty.wait(self.flush_interval)
+                if self._closed:
+                    return
+            self.flush()
+
+    def _write(self, batch: list[bytes]) -> None:
+        try:
+            self.file.write(b"\n".join(batch) + b"\n")
+            self.file.flush()
+        except (OSError, ValueError):
+            # The output is gone, e.g. closed at exit
+            pass
+
+
+class BufferedBytesLogger:
+    """Structlog logger handing the rendered records to a `LogBuffer`."""
+
+    __slots__ = ("_buffer",)
+
+    def __init__(self, buffer: LogBuffer) -> None:
+        self._buffer = buffer
+
+    def msg(self, message: bytes) -> None:
+        self._buffer.put(message)
+
+    log = debug = info = warn = warning = msg
+    fatal = failure = err = error = critical = exception = msg
+
+
+class BufferedBytesLoggerFactory:
+    def __init__(self, buffer: LogBuffer) -> None:
+        self._logger = BufferedBytesLogger(buffer)
+
+    def __call__(self, *args: Any) -> BufferedBytesLogger:
+        return self._logger
+
+
+@lru_cache
+def get_log_buffer() -> LogBuffer:
+    settings = get_settings()
+    buffer = LogBuffer(
+        capacity=settings.log_buffer_size,
+        batch_size=settings.log_buffer_batch_size,
+        flush_interval=settings.log_buffer_flush_interval,
+        overflow=settings.log_buffer_overflow,
+        block_timeout=settings.log_buffer_block_timeout,
+    )
+    buffer.start()
+    return buffer
@@ -1,5 +1,5 @@
 import time
-from typing import cast
+from typing import Any
 from uuid import uuid4
 
 import structlog
@@ -8,24 +8,57 @@ from asgiref.typing import (
     ASGIReceiveCallable,
     ASGISendCallable,
     ASGISendEvent,
-    HTTPResponseBodyEvent,
-    HTTPResponseStartEvent,
+    HTTPScope,
     Scope,
 )
-from starlette import datastructures, types
 from structlog.contextvars import bind_contextvars, clear_contextvars
 
 from .context import correlation_id
+from .profiler import QueryStats, collect_queries
 
 logger = structlog.get_logger()
 
 
-class LoggingMiddleware:
+def get_route(scope: HTTPScope) -> str:
+    """The path template of the route matched by the request, or its path until matched."""
+    route = scope.get("route")
+    return getattr(route, "path", None) or scope["path"]
+
+
+class RequestRecord:
+    __slots__ = ("request_id", "start", "status", "queries")
+
+    def __init__(self) -> None:
+        self.request_id: str | None = None
+        self.start = 0.0
+        self.status: int | None = None
+        self.queries: QueryStats | None = None
+
+
+class ObservabilityMiddleware:
+    """Correlation ids, timing, status capture, SQL statements and the access log in a
+    single layer, with one `send` wrapper and one record per request.
+
+    Statements are collected here rather than in the routes, so that every endpoint,
+    GraphQL included, reports them.
+    """
+
     def __init__(
-        self, app: ASGI3Application, logger: structlog.types.FilteringBoundLogger
+        self,
+        app: ASGI3Application,
+        logger: structlog.types.FilteringBoundLogger,
+        *,
+        correlation_id_header: str | None = "X-Request-ID",
+        timing: bool = True,
+        access_log: bool = True,
     ):
         self.app = app
         self.logger = logger
+        self.correlation_id_header = (
+            correlation_id_header.lower().encode() if correlation_id_header else None
+        )
+        self.timing = timing
+        self.access_log = access_log
 
     async def __call__(
         self, scope: Scope, receive: ASGIReceiveCallable, send: ASGISendCallable
@@ -33,75 +66,47 @@ class LoggingMiddleware:
         if scope["type"] != "http":
             return await self.app(scope, receive, send)
         clear_contextvars()
-        send = self.create_send_wrapper(scope, send)
-        try:
-            await self.app(scope, receive, send)
-        except Exception as exc:
-            await self.logger.aexception("Exception during request: %s" % type(exc))
-            raise exc
-        else:
-            await self.logger.ainfo("HTTP Request")
-
-    async def extract_response_data(self, message: HTTPResponseStartEvent) -> None:
-        bind_contextvars(
-            status=message["status"],
+        record = RequestRecord()
+        if self.correlation_id_header is not None:
+            record.request_id = uuid4().hex
+            correlation_id.set(record.request_id)
+            bind_contextvars(request_id=record.request_id)
+        header = (
+            (self.correlation_id_header, record.request_id.encode())
+            if self.correlation_id_header is not None and record.request_id is not None
+            else None
         )
 
-    async def extract_response_body_data(self, message: HTTPResponseBodyEvent) -> None:
-        # {"body": message["body"]}
-        ...
-
-    def create_send_wrapper(
-        self, scope: Scope, send: ASGISendCallable
-    ) -> ASGISendCallable:
         async def send_wrapper(message: ASGISendEvent) -> None:
             if message["type"] == "http.response.start":
-                await self.extract_response_data(message)
-            elif message["type"] == "http.response.body":
-                await self.extract_response_body_data(message)
-            await send(message)
-
-        return send_wrapper
-
-
-class CorrelationIDMiddleware:
-    def __init__(self, app: ASGI3Application, header_name: str = "X-Request-ID"):
-        self.app = app
-        self.header_name = header_name
-
-    async def __call__(
-        self, scope: Scope, receive: ASGIReceiveCallable, send: ASGISendCallable
-    ) -> None:
-        correlation_id.set(id_value := uuid4().hex)
-        bind_contextvars(request_id=id_value)
-        sender = self.create_send_wrapper(scope, send)
-        await self.app(scope, receive, sender)
-
-    def create_send_wrapper(
-        self, scope: Scope, send: ASGISendCallable
-    ) -> ASGISendCallable:
-        async def send_wrapper(message: ASGISendEvent) -> None:
-            if message["type"] == "http.response.start" and (
-                id_value := correlation_id.get()
-            ):
-                headers = datastructures.MutableHeaders(
-                    scope=cast(types.Message, message)
-                )
-                headers.append(self.header_name, id_value)
+                record.status = message["status"]
+                if header is not None:
+                    message["headers"] = [*message.get("headers", ()), header]
             await send(message)
 
-        return send_wrapper
-
-
-class TimingMiddleware:
-    def __init__(self, app: ASGI3Application):
-        self.app = app
-
-    async def __call__(
-        self, scope: Scope, receive: ASGIReceiveCallable, send: ASGISendCallable
-    ) -> None:
+        if self.timing:
+            record.start = time.perf_counter()
         try:
-            start = time.time()
-            await self.app(scope, receive, send)
-        finally:
-            bind_contextvars(process_time=time.time() - start)
+            with collect_queries(lambda: get_route(scope)) as record.queries:
+                await self.app(scope, receive, send_wrapper)
+        except Exception as exc:
+            self.logger.exception(
+                "Exception during request: %s" % type(exc), **self.fields(record)
+            )
+            raise exc
+        else:
+            if self.access_log:
+                # Logged in the loop: the response is sent already, and the async
+                # methods would hand every record to a thread
+                self.logger.info("HTTP Request", **self.fields(record))
+
+    def fields(self, record: RequestRecord) -> dict[str, Any]:
+        fields: dict[str, Any] = {}
+        if record.status is not None:
+            fields["status"] = record.status
+        if self.timing:
+            fields["process_time"] = time.perf_counter() - record.start
+        if record.queries is not None:
+            fields["sql_queries_count"] = record.queries.count
+            fields["sql_queries_time_spent"] = record.queries.duration
+        return fields
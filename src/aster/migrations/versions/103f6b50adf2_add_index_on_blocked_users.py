@@ -0,0 +1,37 @@
+"""Add index on blocked users
+
+Revision ID: 103f6b50adf2
+Revises: 8e49047b6f5e
+Create Date: 2026-10-18 22:06:14.285361
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str | None = "103f6b50adf2"
+down_revision: str | None = "8e49047b6f5e"
+branch_labels: str | None = None
+depends_on: str | None = None
+
+
+def upgrade() -> None:
+    # Indexes are built without locking writes, outside of the migration transaction
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "user_block_uid_blocked_idx",
+            "user_block",
+            ["uid_blocked"],
+            unique=False,
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "user_block_uid_blocked_idx",
+            table_name="user_block",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
@@ -0,0 +1,59 @@
+"""Add indexes for post listings and blocks
+
+Revision ID: 50734e1c8ee9
+Revises: 1f41126b6dbc
+Create Date: 2026-10-18 18:58:44.112227
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str | None = "50734e1c8ee9"
+down_revision: str | None = "1f41126b6dbc"
+branch_labels: str | None = None
+depends_on: str | None = None
+
+
+def upgrade() -> None:
+    # Duplicated blocks would make the unique index build fail
+    op.execute(
+        """
+        DELETE FROM user_block a USING user_block b
+        WHERE a.uid = b.uid AND a.uid_blocked = b.uid_blocked AND a.id > b.id;
+        """
+    )
+    # Indexes are built without locking writes, outside of the migration transaction
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "post_uid_created_at_id_idx",
+            "post",
+            ["uid", sa.text("created_at DESC"), sa.text("id DESC")],
+            unique=False,
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.create_index(
+            "user_block_uid_uid_blocked_idx",
+            "user_block",
+            ["uid", "uid_blocked"],
+            unique=True,
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "user_block_uid_uid_blocked_idx",
+            table_name="user_block",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
+        op.drop_index(
+            "post_uid_created_at_id_idx",
+            table_name="post",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
@@ -0,0 +1,48 @@
+"""Add user_stats
+
+Revision ID: 5d2c8a41f7b9
+Revises: 103f6b50adf2
+Create Date: 2026-10-18 23:41:08.118402
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str | None = "5d2c8a41f7b9"
+down_revision: str | None = "103f6b50adf2"
+branch_labels: str | None = None
+depends_on: str | None = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "user_stats",
+        sa.Column("uid", sa.Integer(), nullable=False),
+        sa.Column("post_count", sa.Integer(), nullable=False),
+        sa.Column("follower_count", sa.Integer(), nullable=False),
+        sa.Column("following_count", sa.Integer(), nullable=False),
+        sa.Column("block_count", sa.Integer(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(["uid"], ["user_.id"], name=op.f("user_stats_uid_fkey")),
+        sa.PrimaryKeyConstraint("uid", name=op.f("user_stats_pkey")),
+    )
+    # Counters of the existing users, kept up to date from now on
+    op.execute(
+        """
+        INSERT INTO user_stats
+            (uid, post_count, follower_count, following_count, block_count, updated_at)
+        SELECT
+            user_.id,
+            (SELECT count(*) FROM post WHERE post.uid = user_.id),
+            (SELECT count(*) FROM user_follow WHERE user_follow.uid_followed = user_.id),
+            (SELECT count(*) FROM user_follow WHERE user_follow.uid = user_.id),
+            (SELECT count(*) FROM user_block WHERE user_block.uid = user_.id),
+            now()
+        FROM user_
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("user_stats")
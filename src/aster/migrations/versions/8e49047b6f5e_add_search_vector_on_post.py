@@ -0,0 +1,51 @@
+"""Add search vector on post
+
+Revision ID: 8e49047b6f5e
+Revises: 50734e1c8ee9
+Create Date: 2026-10-18 21:12:37.503918
+
+"""
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str | None = "8e49047b6f5e"
+down_revision: str | None = "50734e1c8ee9"
+branch_labels: str | None = None
+depends_on: str | None = None
+
+
+def upgrade() -> None:
+    # Adding a stored generated column rewrites the table, under an exclusive lock
+    op.add_column(
+        "post",
+        sa.Column(
+            "search_vector",
+            postgresql.TSVECTOR(),
+            sa.Computed("to_tsvector('english', content)", persisted=True),
+            nullable=True,
+        ),
+    )
+    # Indexes are built without locking writes, outside of the migration transaction
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "post_search_vector_idx",
+            "post",
+            ["search_vector"],
+            unique=False,
+            postgresql_using="gin",
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "post_search_vector_idx",
+            table_name="post",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
+    op.drop_column("post", "search_vector")
@@ -1,7 +1,20 @@
 from datetime import datetime
 from typing import Annotated
 
-from sqlalchemy import DateTime, ForeignKey, Identity, Integer, MetaData, String, Text
+from sqlalchemy import (
+    Computed,
+    DateTime,
+    ForeignKey,
+    Identity,
+    Index,
+    Integer,
+    MetaData,
+    String,
+    Text,
+    UniqueConstraint,
+)
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.ext.asyncio import AsyncAttrs
 from sqlalchemy.orm import (
     DeclarativeBase,
     Mapped,
@@ -20,7 +33,7 @@ POSTGRES_INDEXES_NAMING_CONVENTION = {
 metadata = MetaData(naming_convention=POSTGRES_INDEXES_NAMING_CONVENTION)
 
 
-class BaseORMModel(MappedAsDataclass, DeclarativeBase):
+class BaseORMModel(AsyncAttrs, MappedAsDataclass, DeclarativeBase):
     metadata = metadata
     """subclasses will be converted to dataclasses"""
 
@@ -44,11 +57,22 @@ class Post(BaseORMModel, kw_only=True):
         DateTime, default_factory=datetime.now, onupdate=datetime.now
     )
     uid: Mapped[int] = mapped_column(ForeignKey("user_.id"), init=False)
+    search_vector: Mapped[str] = mapped_column(
+        TSVECTOR,
+        Computed("to_tsvector('english', content)", persisted=True),
+        init=False,
+        deferred=True,
+        repr=False,
+    )
 
     # Relationships
     user: Mapped["User"] = relationship()
 
 
+Index("post_uid_created_at_id_idx", Post.uid, Post.created_at.desc(), Post.id.desc())
+Index("post_search_vector_idx", Post.search_vector, postgresql_using="gin")
+
+
 class User(BaseORMModel):
     __tablename__ = "user_"
 
@@ -77,10 +101,43 @@ class User(BaseORMModel):
         foreign_keys="UserBlock.uid_blocked",
         back_populates="user_blocked",
     )
+    users_followed: Mapped[list["UserFollow"]] = relationship(
+        "UserFollow",
+        default_factory=list,
+        foreign_keys="UserFollow.uid",
+        back_populates="user",
+    )
+    users_followed_by: Mapped[list["UserFollow"]] = relationship(
+        "UserFollow",
+        default_factory=list,
+        foreign_keys="UserFollow.uid_followed",
+        back_populates="user_followed",
+    )
+    stats: Mapped["UserStats | None"] = relationship(default=None)
+
+
+class UserStats(BaseORMModel):
+    """Counters of a user, maintained by the services and reconciled periodically."""
+
+    __tablename__ = "user_stats"
+
+    # Columns
+    uid: Mapped[int] = mapped_column(ForeignKey("user_.id"), init=False, primary_key=True)
+    post_count: Mapped[int] = mapped_column(default=0)
+    follower_count: Mapped[int] = mapped_column(default=0)
+    following_count: Mapped[int] = mapped_column(default=0)
+    block_count: Mapped[int] = mapped_column(default=0)
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime, default_factory=datetime.now, onupdate=datetime.now
+    )
 
 
 class UserBlock(BaseORMModel):
     __tablename__ = "user_block"
+    __table_args__ = (
+        Index("user_block_uid_uid_blocked_idx", "uid", "uid_blocked", unique=True),
+        Index("user_block_uid_blocked_idx", "uid_blocked"),
+    )
 
     # Columns
     id: Mapped[int] = mapped_column(Integer, Identity(), init=False, primary_key=True)
@@ -100,3 +157,27 @@ class UserBlock(BaseORMModel):
         back_populates="users_blocked_by",
         init=False,
     )
+
+
+class UserFollow(BaseORMModel):
+    __tablename__ = "user_follow"
+    __table_args__ = (UniqueConstraint("uid", "uid_followed"),)
+
+    # Columns
+    id: Mapped[int] = mapped_column(Integer, Identity(), init=False, primary_key=True)
+    uid: Mapped[int] = mapped_column(ForeignKey("user_.id"))
+    uid_followed: Mapped[int] = mapped_column(ForeignKey("user_.id"), index=True)
+
+    # Relationships
+    user: Mapped["User"] = relationship(
+        "User",
+        foreign_keys="UserFollow.uid",
+        back_populates="users_followed",
+        init=False,
+    )
+    user_followed: Mapped["User"] = relationship(
+        "User",
+        foreign_keys="UserFollow.uid_followed",
+        back_populates="users_followed_by",
+        init=False,
+    )
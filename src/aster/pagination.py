@@ -0,0 +1,31 @@
+import base64
+from collections.abc import Callable, Sequence
+from typing import Any, TypeVar
+
+import orjson
+from fastapi import HTTPException, status
+from pydantic import TypeAdapter, ValidationError
+
+T = TypeVar("T")
+
+
+def encode_cursor(*values: Any) -> str:
+    """Encodes the keyset values of the last item of a page into an opaque cursor."""
+    return base64.urlsafe_b64encode(orjson.dumps(values)).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, adapter: TypeAdapter[T]) -> T:
+    try:
+        values = orjson.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return adapter.validate_python(values)
+    except (ValueError, ValidationError) as err:
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, "Invalid cursor") from err
+
+
+def paginate(
+    items: Sequence[T], limit: int, keyset: Callable[[T], tuple[Any, ...]]
+) -> tuple[Sequence[T], str | None]:
+    """Splits `limit + 1` fetched items into a page and the cursor of the next one."""
+    if len(items) <= limit:
+        return items, None
+    return items[:limit], encode_cursor(*keyset(items[limit - 1]))
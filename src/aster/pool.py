@@ -0,0 +1,74 @@
+import time
+import weakref
+from collections.abc import Iterator
+from typing import Any
+
+from prometheus_client import REGISTRY, Counter, Histogram
+from prometheus_client.core import GaugeMetricFamily, Metric
+from prometheus_client.registry import Collector
+from sqlalchemy.exc import TimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool, PoolProxiedConnection
+
+POOL_CHECKOUT_TIME = Histogram(
+    "aster_database_pool_checkout_seconds",
+    "Time spent waiting for a connection from the pool",
+    ["pool"],
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+POOL_TIMEOUTS = Counter(
+    "aster_database_pool_timeouts_total", "Checkouts which timed out waiting for the pool", ["pool"]
+)
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """Queue pool recording the checkout wait times and timeouts.
+
+    Pools are labelled by their logging name, given with `pool_logging_name`.
+    """
+
+    pools: "weakref.WeakSet[InstrumentedQueuePool]" = weakref.WeakSet()
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        InstrumentedQueuePool.pools.add(self)
+
+    @property
+    def name(self) -> str:
+        return self._orig_logging_name or "default"
+
+    def connect(self) -> PoolProxiedConnection:
+        start = time.perf_counter()
+        try:
+            return super().connect()
+        except TimeoutError:
+            POOL_TIMEOUTS.labels(self.name).inc()
+            raise
+        finally:
+            POOL_CHECKOUT_TIME.labels(self.name).observe(time.perf_counter() - start)
+
+
+class PoolCollector(Collector):
+    """Reports the state of the instrumented pools when scraped."""
+
+    def collect(self) -> Iterator[Metric]:
+        size = GaugeMetricFamily(
+            "aster_database_pool_size", "Configured size of the pool", labels=["pool"]
+        )
+        checked_out = GaugeMetricFamily(
+            "aster_database_pool_checked_out",
+            "Connections currently checked out",
+            labels=["pool"],
+        )
+        overflow = GaugeMetricFamily(
+            "aster_database_pool_overflow",
+            "Connections opened beyond the pool size",
+            labels=["pool"],
+        )
+        for pool in list(InstrumentedQueuePool.pools):
+            size.add_metric([pool.name], pool.size())
+            checked_out.add_metric([pool.name], pool.checkedout())
+            overflow.add_metric([pool.name], max(pool.overflow(), 0))
+        yield from (size, checked_out, overflow)
+
+
+REGISTRY.register(PoolCollector())
@@ -1,11 +1,27 @@
-from aster.auth.dependencies import InjectAuthenticatedUser
-from aster.database import InjectSession
+from typing import Annotated
+
+from aster.auth.dependencies import InjectAuthenticatedUser, InjectOptionalUser
+from aster.cache import InjectCache, cache_response
+from aster.database import InjectReadSession, InjectSession
+from aster.pagination import decode_cursor, paginate
 from aster.posts.dependencies import InjectValidPost
+from aster.ratelimit import rate_limit
 from aster.responses import AsterResponse
 from aster.routes import AsterRoute
-from fastapi import APIRouter, status
+from aster.schemas import dump_page
+from aster.streaming import InjectStreamFormat, streaming_response
+from aster.worker import InjectQueue
+from fastapi import APIRouter, Body, Query, Response, status
 
-from . import schemas, services
+from . import schemas, services, tasks, timeline
+from .constants import (
+    DEFAULT_PAGE_SIZE,
+    MAX_BULK_SIZE,
+    MAX_PAGE_SIZE,
+    POST_CACHE_TAG,
+    POSTS_BY_USER_CACHE_TAG,
+    SEARCH_MAX_QUERY_LENGTH,
+)
 
 posts_router = APIRouter(prefix="/posts", route_class=AsterRoute)
 
@@ -13,32 +29,150 @@ posts_router = APIRouter(prefix="/posts", route_class=AsterRoute)
 @posts_router.post(
     "", response_model=schemas.PostView, status_code=status.HTTP_201_CREATED
 )
+@rate_limit(60, 60, key="user")
 async def create_post(
-    data_in: schemas.PostCreate, session: InjectSession, user: InjectAuthenticatedUser
+    data_in: schemas.PostCreate,
+    session: InjectSession,
+    user: InjectAuthenticatedUser,
+    cache: InjectCache,
+    queue: InjectQueue,
 ) -> AsterResponse:
     post = await services.create_post(session, data_in=data_in, user=user)
     await session.commit()
+    if cache:
+        await cache.invalidate_tags(POSTS_BY_USER_CACHE_TAG.format(username=user.username))
+    if queue:
+        await tasks.fanout_posts.enqueue(queue, user.id, post.id)
     return AsterResponse(
         schemas.PostView.model_validate(post).model_dump_json(), status.HTTP_201_CREATED
     )
 
 
+@posts_router.post(
+    "/bulk", response_model=schemas.PostBulkView, status_code=status.HTTP_201_CREATED
+)
+@rate_limit(10, 60, key="user")
+async def create_posts(
+    data_in: Annotated[list[schemas.PostCreate], Body(min_length=1, max_length=MAX_BULK_SIZE)],
+    session: InjectSession,
+    user: InjectAuthenticatedUser,
+    cache: InjectCache,
+    queue: InjectQueue,
+) -> AsterResponse:
+    post_ids = await services.create_posts(session, data_in=data_in, user=user)
+    await session.commit()
+    if cache:
+        await cache.invalidate_tags(POSTS_BY_USER_CACHE_TAG.format(username=user.username))
+    if queue:
+        await tasks.fanout_posts.enqueue(queue, user.id, *post_ids)
+    return AsterResponse(
+        schemas.PostBulkView(ids=list(post_ids)).model_dump_json(), status.HTTP_201_CREATED
+    )
+
+
 @posts_router.get("", response_model=schemas.ListPostView)
-async def list_posts(username: str, session: InjectSession) -> AsterResponse:
-    posts = await services.list_posts(session, username=username)
-    return AsterResponse(schemas.ListPostView.model_validate(posts).model_dump_json())
+@cache_response(expiration=30, tags=[POSTS_BY_USER_CACHE_TAG])
+async def list_posts(
+    username: str,
+    session: InjectReadSession,
+    stream_format: InjectStreamFormat,
+    limit: Annotated[int, Query(ge=1, le=MAX_PAGE_SIZE)] = DEFAULT_PAGE_SIZE,
+    cursor: str | None = None,
+) -> Response:
+    after = decode_cursor(cursor, schemas.PostCursor) if cursor else None
+    if stream_format:
+        return streaming_response(
+            lambda session: services.stream_posts(session, username=username, after=after),
+            schemas.PostView,
+            stream_format,
+            session.bind,
+        )
+    posts = await services.list_post_records(
+        session, username=username, limit=limit + 1, after=after
+    )
+    page, next_cursor = paginate(posts, limit, lambda post: (post.created_at, post.id))
+    return AsterResponse(dump_page(page, next_cursor))
+
+
+@posts_router.get("/search", response_model=schemas.ListPostView)
+async def search_posts(
+    q: Annotated[str, Query(min_length=1, max_length=SEARCH_MAX_QUERY_LENGTH)],
+    user: InjectOptionalUser,
+    session: InjectReadSession,
+    username: str | None = None,
+    limit: Annotated[int, Query(ge=1, le=MAX_PAGE_SIZE)] = DEFAULT_PAGE_SIZE,
+    cursor: str | None = None,
+) -> AsterResponse:
+    after = decode_cursor(cursor, schemas.SearchCursor) if cursor else None
+    results = await services.search_posts(
+        session,
+        query=q,
+        limit=limit + 1,
+        after=after,
+        username=username,
+        viewer_id=user.id if user else None,
+    )
+    page, next_cursor = paginate(results, limit, lambda result: (result[0], result[1].id))
+    return AsterResponse(dump_page([post for _, post in page], next_cursor))
 
 
 @posts_router.get("/{post_id}", response_model=schemas.PostView)
+@cache_response(expiration=60, tags=[POST_CACHE_TAG])
 async def get_post(post: InjectValidPost) -> AsterResponse:
-    return AsterResponse(schemas.PostView.model_validate(post).model_dump_json())
+    return AsterResponse(
+        schemas.PostView.model_validate(post).model_dump_json(), last_modified=post.updated_at
+    )
 
 
 @posts_router.delete("/{post_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_post(
     post: InjectValidPost,
     session: InjectSession,
+    cache: InjectCache,
 ) -> AsterResponse:
+    tags = (
+        POST_CACHE_TAG.format(post_id=post.id),
+        POSTS_BY_USER_CACHE_TAG.format(username=post.user.username),
+    )
     await services.delete_post(session, post=post)
     await session.commit()
+    if cache:
+        await cache.invalidate_tags(*tags)
     return AsterResponse(status_code=status.HTTP_204_NO_CONTENT)
+
+
+timeline_router = APIRouter(prefix="/user/timeline", route_class=AsterRoute)
+
+
+@timeline_router.get("", response_model=schemas.ListPostView)
+async def get_timeline(
+    user: InjectAuthenticatedUser,
+    session: InjectReadSession,
+    cache: InjectCache,
+    limit: Annotated[int, Query(ge=1, le=MAX_PAGE_SIZE)] = DEFAULT_PAGE_SIZE,
+    cursor: str | None = None,
+) -> AsterResponse:
+    before = decode_cursor(cursor, schemas.TimelineCursor)[0] if cursor else None
+    post_ids = (
+        await timeline.get_timeline_post_ids(
+            cache.redis, user_id=user.id, limit=limit + 1, before=before
+        )
+        if cache
+        else []
+    )
+    if len(post_ids) > limit:
+        page_ids, next_cursor = paginate(post_ids, limit, lambda post_id: (post_id,))
+        posts = await services.get_timeline_posts_by_ids(
+            session, user_id=user.id, post_ids=page_ids
+        )
+    else:
+        # The fan-out timeline is unavailable or exhausted, older posts may have been trimmed
+        all_posts = await services.list_timeline_posts(
+            session, user_id=user.id, limit=limit + 1, before=before
+        )
+        posts, next_cursor = paginate(all_posts, limit, lambda post: (post.id,))
+    return AsterResponse(
+        schemas.ListPostView.model_validate(
+            {"items": posts, "next_cursor": next_cursor}
+        ).model_dump_json()
+    )
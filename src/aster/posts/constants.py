@@ -0,0 +1,17 @@
+DEFAULT_PAGE_SIZE = 10
+MAX_PAGE_SIZE = 100
+STREAM_CHUNK_SIZE = 1000
+MAX_BULK_SIZE = 1000
+
+POST_CACHE_TAG = "post:{post_id}"
+POSTS_BY_USER_CACHE_TAG = "posts:{username}"
+
+TIMELINE_KEY = "timeline:{user_id}"
+
+# Must match the configuration of the generated `post.search_vector` column
+SEARCH_CONFIG = "english"
+SEARCH_MAX_QUERY_LENGTH = 256
+# Matches ranked per search, the newest ones, so that common terms stay cheap
+SEARCH_MAX_CANDIDATES = 1000
+# Newest posts walked to find the candidates of common queries, before using the index
+SEARCH_SCAN_WINDOW = 100_000
@@ -1,8 +1,9 @@
+from dataclasses import dataclass
 from datetime import datetime
 
-from aster.auth.schemas import UserView
-from aster.schemas import ORJSONModel
-from pydantic import Field, RootModel
+from aster.auth.schemas import UserRecord, UserView
+from aster.schemas import ORJSONModel, Page
+from pydantic import Field, TypeAdapter
 
 
 class PostBase(ORJSONModel):
@@ -19,4 +20,29 @@ class PostView(PostBase, from_attributes=True):
     user: UserView
 
 
-ListPostView = RootModel[list[PostView]]
+class PostBulkView(ORJSONModel):
+    ids: list[int]
+    """Ids of the created posts, in the order they were given"""
+
+
+ListPostView = Page[PostView]
+
+
+@dataclass(frozen=True, slots=True)
+class PostRecord:
+    """Columns of `PostView`, in its field order, serialized as is by orjson."""
+
+    content: str
+    id: int
+    created_at: datetime
+    user: UserRecord
+
+
+PostKeyset = tuple[datetime, int]
+PostCursor: TypeAdapter[PostKeyset] = TypeAdapter(PostKeyset)  # type: ignore[arg-type]
+
+TimelineKeyset = tuple[int]
+TimelineCursor: TypeAdapter[TimelineKeyset] = TypeAdapter(TimelineKeyset)  # type: ignore[arg-type]
+
+SearchKeyset = tuple[float, int]
+SearchCursor: TypeAdapter[SearchKeyset] = TypeAdapter(SearchKeyset)  # type: ignore[arg-type]
@@ -1,11 +1,37 @@
 from collections.abc import Sequence
+from datetime import datetime
+from typing import Any, TypeVar
 
-from aster.models import Post, User
-from sqlalchemy import desc, select
-from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import contains_eager, joinedload
+from aster.auth.schemas import UserRecord
+from aster.auth.services import count_user_stats
+from aster.models import Post, User, UserBlock, UserFollow
+from sqlalchemy import (
+    ColumnElement,
+    Double,
+    Select,
+    and_,
+    cast,
+    desc,
+    func,
+    insert,
+    or_,
+    select,
+    true,
+    tuple_,
+)
+from sqlalchemy.ext.asyncio import AsyncScalarResult, AsyncSession
+from sqlalchemy.orm import aliased, contains_eager, joinedload
 
-from .schemas import PostCreate
+from .constants import (
+    DEFAULT_PAGE_SIZE,
+    SEARCH_CONFIG,
+    SEARCH_MAX_CANDIDATES,
+    SEARCH_SCAN_WINDOW,
+    STREAM_CHUNK_SIZE,
+)
+from .schemas import PostCreate, PostRecord
+
+RowT = TypeVar("RowT", bound=tuple[Any, ...])
 
 
 async def create_post(
@@ -14,9 +40,27 @@ async def create_post(
     post = Post(**data_in.model_dump(), user=user)
     session.add(post)
     await session.flush()
+    await count_user_stats(session, deltas={(user.id, "post_count"): 1})
     return post
 
 
+async def create_posts(
+    session: AsyncSession, *, data_in: Sequence[PostCreate], user: User
+) -> Sequence[int]:
+    """Creates posts with multi-row inserts, returns their ids in the order given."""
+    now = datetime.now()
+    res = await session.execute(
+        insert(Post).returning(Post.id, sort_by_parameter_order=True),
+        [
+            {**post.model_dump(), "uid": user.id, "created_at": now, "updated_at": now}
+            for post in data_in
+        ],
+    )
+    post_ids = res.scalars().all()
+    await count_user_stats(session, deltas={(user.id, "post_count"): len(post_ids)})
+    return post_ids
+
+
 async def get_post_by_id(session: AsyncSession, *, post_id: int) -> Post | None:
     res = await session.execute(
         select(Post).options(joinedload(Post.user)).where(Post.id == post_id)
@@ -24,17 +68,223 @@ async def get_post_by_id(session: AsyncSession, *, post_id: int) -> Post | None:
     return res.scalar_one_or_none()
 
 
+async def get_posts_by_ids(session: AsyncSession, *, post_ids: Sequence[int]) -> Sequence[Post]:
+    res = await session.execute(select(Post).where(Post.id.in_(post_ids)))
+    return res.scalars().all()
+
+
 async def list_posts(
-    session: AsyncSession, *, username: str, limit: int = 10, offset: int = 0
+    session: AsyncSession,
+    *,
+    username: str,
+    limit: int = DEFAULT_PAGE_SIZE,
+    after: tuple[datetime, int] | None = None,
 ) -> Sequence[Post]:
+    """Lists the posts of a user, newest first, after the `(created_at, id)` keyset."""
+    res = await session.execute(_select_posts_by_username(username, after).limit(limit))
+    return res.scalars().all()
+
+
+async def list_post_records(
+    session: AsyncSession,
+    *,
+    username: str,
+    limit: int = DEFAULT_PAGE_SIZE,
+    after: tuple[datetime, int] | None = None,
+) -> list[PostRecord]:
+    """Lists the posts of a user like `list_posts`, selecting only the columns of the view."""
+    stmt = select(
+        Post.content,
+        Post.id,
+        Post.created_at,
+        User.username,
+        User.id,
+        User.created_at,
+        User.updated_at,
+    ).join(Post.user)
+    res = await session.execute(_filter_posts_by_username(stmt, username, after).limit(limit))
+    return [
+        PostRecord(
+            content, post_id, created_at, UserRecord(username, user_id, user_created_at, updated_at)
+        )
+        for content, post_id, created_at, username, user_id, user_created_at, updated_at in (
+            res.tuples()
+        )
+    ]
+
+
+async def stream_posts(
+    session: AsyncSession, *, username: str, after: tuple[datetime, int] | None = None
+) -> AsyncScalarResult[Post]:
+    """Streams all the posts of a user through a server-side cursor, newest first."""
+    return await session.stream_scalars(
+        _select_posts_by_username(username, after),
+        execution_options={"yield_per": STREAM_CHUNK_SIZE},
+    )
+
+
+def _select_posts_by_username(
+    username: str, after: tuple[datetime, int] | None
+) -> Select[tuple[Post]]:
+    stmt = select(Post).join(Post.user).options(contains_eager(Post.user))
+    return _filter_posts_by_username(stmt, username, after)
+
+
+def _filter_posts_by_username(
+    stmt: Select[RowT], username: str, after: tuple[datetime, int] | None
+) -> Select[RowT]:
+    stmt = stmt.where(User.username == username).order_by(desc(Post.created_at), desc(Post.id))
+    if after is not None:
+        stmt = stmt.where(tuple_(Post.created_at, Post.id) < after)
+    return stmt
+
+
+async def search_posts(
+    session: AsyncSession,
+    *,
+    query: str,
+    limit: int = DEFAULT_PAGE_SIZE,
+    after: tuple[float, int] | None = None,
+    username: str | None = None,
+    viewer_id: int | None = None,
+) -> list[tuple[float, PostRecord]]:
+    """Searches the posts matching a web search query, best ranked first, after the
+    `(rank, id)` keyset.
+
+    Only the newest `SEARCH_MAX_CANDIDATES` matches are ranked, so that the cost of a
+    search does not grow with the number of posts matching it. The posts of the users
+    blocked by the viewer, or blocking them, are left out.
+    """
+    tsquery = func.websearch_to_tsquery(SEARCH_CONFIG, query)
+    matches = await _find_search_matches(
+        session, tsquery, username=username, viewer_id=viewer_id
+    )
+    ranked = sorted(matches, reverse=True)
+    if after is not None:
+        ranked = [match for match in ranked if match < after]
+    page = ranked[:limit]
     res = await session.execute(
-        select(Post)
+        select(
+            Post.content,
+            Post.id,
+            Post.created_at,
+            User.username,
+            User.id,
+            User.created_at,
+            User.updated_at,
+        )
         .join(Post.user)
-        .options(contains_eager(Post.user))
-        .where(User.username == username)
+        .where(Post.id.in_([post_id for _, post_id in page]))
+    )
+    records = {
+        post_id: PostRecord(
+            content, post_id, created_at, UserRecord(username, user_id, user_created_at, updated_at)
+        )
+        for content, post_id, created_at, username, user_id, user_created_at, updated_at in (
+            res.tuples()
+        )
+    }
+    return [(rank, records[post_id]) for rank, post_id in page if post_id in records]
+
+
+async def _find_search_matches(
+    session: AsyncSession,
+    tsquery: ColumnElement[Any],
+    *,
+    username: str | None,
+    viewer_id: int | None,
+) -> list[tuple[float, int]]:
+    """Finds the newest matches of a search with their `(rank, id)`.
+
+    The planner can not tell reliably whether a query is common, e.g. for phrases, and
+    picks between walking the posts newest first and reading the GIN index by its
+    estimates, which costs a scan of the table when wrong. Instead the index is read
+    first, up to one match over `SEARCH_MAX_CANDIDATES`: rare queries are answered by
+    it alone. The newest posts are walked up to `SEARCH_SCAN_WINDOW` for the common
+    ones, and the index is read again for the older posts when they do not hold enough
+    matches.
+    """
+    stmt = _select_search_matches(Post, tsquery, viewer_id)
+    if username is not None:
+        author = select(User.id).where(User.username == username).scalar_subquery()
+        # No index sorts all the posts by creation date, the GIN index is read instead
+        res = await session.execute(
+            stmt.where(Post.uid == author).order_by(desc(Post.created_at), desc(Post.id))
+        )
+        return [(rank, post_id) for rank, post_id in res.tuples()]
+
+    res = await session.execute(stmt.limit(SEARCH_MAX_CANDIDATES + 1))
+    matches = [(rank, post_id) for rank, post_id in res.tuples()]
+    if len(matches) <= SEARCH_MAX_CANDIDATES:
+        return matches
+
+    recent = aliased(
+        Post,
+        select(Post.id, Post.uid, Post.search_vector)
+        .order_by(desc(Post.id))
+        .limit(SEARCH_SCAN_WINDOW)
+        .subquery(),
+    )
+    res = await session.execute(
+        _select_search_matches(recent, tsquery, viewer_id).order_by(desc(recent.id))
+    )
+    matches = [(rank, post_id) for rank, post_id in res.tuples()]
+    if len(matches) == SEARCH_MAX_CANDIDATES:
+        return matches
+    # Null when the window holds every post, then there are no older matches
+    newest_older_id = (
+        select(Post.id).order_by(desc(Post.id)).offset(SEARCH_SCAN_WINDOW).limit(1)
+    ).scalar_subquery()
+    res = await session.execute(
+        stmt.where(Post.id <= newest_older_id)
+        .order_by(desc(Post.created_at), desc(Post.id))
+        .limit(SEARCH_MAX_CANDIDATES - len(matches))
+    )
+    return matches + [(rank, post_id) for rank, post_id in res.tuples()]
+
+
+def _select_search_matches(
+    post: type[Post], tsquery: ColumnElement[Any], viewer_id: int | None
+) -> Select[tuple[float, int]]:
+    # Ranks are compared as sent in the cursors, in double precision
+    rank = cast(func.ts_rank(post.search_vector, tsquery), Double[float]())
+    stmt = (
+        select(rank, post.id)
+        .where(post.search_vector.bool_op("@@")(tsquery))
+        .limit(SEARCH_MAX_CANDIDATES)
+    )
+    if viewer_id is not None:
+        stmt = stmt.where(_is_visible_to(post, viewer_id))
+    return stmt
+
+
+def _is_visible_to(post: type[Post], user_id: int) -> ColumnElement[bool]:
+    """Posts whose author is not blocked by the user and does not block them."""
+    blocked = select(UserBlock.uid_blocked).where(UserBlock.uid == user_id)
+    blocked_by = select(UserBlock.uid).where(UserBlock.uid_blocked == user_id)
+    return and_(post.uid.not_in(blocked), post.uid.not_in(blocked_by))
+
+
+async def list_posts_by_user_ids(
+    session: AsyncSession, *, user_ids: Sequence[int], limit: int = DEFAULT_PAGE_SIZE
+) -> Sequence[Post]:
+    """Lists the latest posts of each user in a single statement, newest first."""
+    LatestPost = aliased(Post)
+    latest = (
+        select(LatestPost.id)
+        .where(LatestPost.uid == User.id)
+        .order_by(desc(LatestPost.created_at), desc(LatestPost.id))
         .limit(limit)
-        .offset(offset)
-        .order_by(desc(Post.created_at))
+        .correlate(User)
+        .lateral()
+    )
+    res = await session.execute(
+        select(Post)
+        .select_from(User)
+        .join(latest, true())
+        .join(Post, Post.id == latest.c.id)
+        .where(User.id.in_(user_ids))
+        .order_by(desc(Post.created_at), desc(Post.id))
     )
     return res.scalars().all()
 
@@ -42,3 +292,56 @@ async def list_posts(
 async def delete_post(session: AsyncSession, *, post: Post) -> None:
     await session.delete(post)
     await session.flush()
+    await count_user_stats(session, deltas={(post.uid, "post_count"): -1})
+
+
+async def list_post_ids_by_user(
+    session: AsyncSession, *, user_id: int, limit: int = DEFAULT_PAGE_SIZE
+) -> Sequence[int]:
+    res = await session.execute(
+        select(Post.id)
+        .where(Post.uid == user_id)
+        .order_by(desc(Post.created_at), desc(Post.id))
+        .limit(limit)
+    )
+    return res.scalars().all()
+
+
+def _is_in_timeline_of(user_id: int) -> ColumnElement[bool]:
+    """Posts of the user and of the users they follow, without blocked users either way."""
+    followed = select(UserFollow.uid_followed).where(UserFollow.uid == user_id)
+    return and_(or_(Post.uid == user_id, Post.uid.in_(followed)), _is_visible_to(Post, user_id))
+
+
+async def list_timeline_posts(
+    session: AsyncSession,
+    *,
+    user_id: int,
+    limit: int = DEFAULT_PAGE_SIZE,
+    before: int | None = None,
+) -> Sequence[Post]:
+    """Builds the timeline of a user from the database, newest first."""
+    stmt = (
+        select(Post)
+        .options(joinedload(Post.user))
+        .where(_is_in_timeline_of(user_id))
+        .order_by(desc(Post.id))
+        .limit(limit)
+    )
+    if before is not None:
+        stmt = stmt.where(Post.id < before)
+    res = await session.execute(stmt)
+    return res.scalars().all()
+
+
+async def get_timeline_posts_by_ids(
+    session: AsyncSession, *, user_id: int, post_ids: Sequence[int]
+) -> Sequence[Post]:
+    """Hydrates timeline post ids, dropping deleted posts and posts no longer visible."""
+    res = await session.execute(
+        select(Post)
+        .options(joinedload(Post.user))
+        .where(Post.id.in_(post_ids), _is_in_timeline_of(user_id))
+        .order_by(desc(Post.id))
+    )
+    return res.scalars().all()
@@ -0,0 +1,38 @@
+from aster.auth.blocks import BlockGraph
+from aster.auth.services import list_follower_ids
+from aster.config import get_settings
+from aster.database import session_factory
+from aster.tasks import Ctx, Queue, batch_task, task
+
+from .services import list_post_ids_by_user
+from .timeline import push_to_timelines
+
+
+def get_block_graph(ctx: Ctx) -> BlockGraph:
+    return BlockGraph(ctx["redis"], expiration=get_settings().block_graph_expiration)
+
+
+@batch_task(queue=Queue.HIGH, window=1.0)
+async def fanout_posts(ctx: Ctx, author_id: int, post_ids: list[int]) -> int:
+    """Pushes new posts of an author into the timelines of its author and followers.
+
+    Posts created within the batch window are pushed together, so the followers are
+    listed once. Followers blocked by the author, or blocking them, are skipped.
+    """
+    async with session_factory() as session:
+        follower_ids = await list_follower_ids(session, user_id=author_id)
+    follower_ids = await get_block_graph(ctx).filter_visible(author_id, follower_ids)
+    await push_to_timelines(ctx["redis"], [author_id, *follower_ids], post_ids)
+    return len(follower_ids)
+
+
+@task(coalesce=lambda user_id, followed_id: f"{user_id}:{followed_id}")
+async def backfill_timeline(ctx: Ctx, user_id: int, followed_id: int) -> None:
+    """Pushes the latest posts of a newly followed user into the follower timeline."""
+    if not await get_block_graph(ctx).filter_visible(user_id, [followed_id]):
+        return
+    async with session_factory() as session:
+        post_ids = await list_post_ids_by_user(
+            session, user_id=followed_id, limit=get_settings().timeline_max_length
+        )
+    await push_to_timelines(ctx["redis"], [user_id], post_ids)
@@ -0,0 +1,37 @@
+from collections.abc import Iterable
+
+from aster.config import get_settings
+from redis.asyncio import Redis
+
+from .constants import TIMELINE_KEY
+
+
+async def push_to_timelines(redis: Redis, user_ids: Iterable[int], post_ids: Iterable[int]) -> None:
+    """Adds posts to the timelines of users, keeping only the newest entries.
+
+    Posts are scored by id, which grows with their creation date.
+    """
+    mapping = {str(post_id): post_id for post_id in post_ids}
+    if not mapping:
+        return
+    max_length = get_settings().timeline_max_length
+    async with redis.pipeline(transaction=False) as pipe:
+        for user_id in user_ids:
+            key = TIMELINE_KEY.format(user_id=user_id)
+            pipe.zadd(key, mapping)
+            pipe.zremrangebyrank(key, 0, -max_length - 1)
+        await pipe.execute()
+
+
+async def get_timeline_post_ids(
+    redis: Redis, *, user_id: int, limit: int, before: int | None = None
+) -> list[int]:
+    """Returns the newest post ids of a timeline, older than `before` when given."""
+    post_ids = await redis.zrevrangebyscore(
+        TIMELINE_KEY.format(user_id=user_id),
+        f"({before}" if before is not None else "+inf",
+        "-inf",
+        start=0,
+        num=limit,
+    )
+    return [int(post_id) for post_id in post_ids]
@@ -0,0 +1,159 @@
+import hashlib
+import re
+from collections import Counter
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any
+
+import structlog
+from prometheus_client import Histogram
+
+from aster.config import get_settings
+
+logger = structlog.get_logger()
+
+QUERY_TIME = Histogram(
+    "aster_sql_query_seconds",
+    "Duration of the SQL statements by fingerprint",
+    ["fingerprint"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+
+TRANSACTION_STATEMENTS = ("SAVEPOINT", "RELEASE SAVEPOINT", "ROLLBACK TO SAVEPOINT")
+_NORMALIZATIONS = (
+    (re.compile(r"'(?:[^']|'')*'"), "?"),
+    (re.compile(r"%\(\w+\)s|%s|\$\d+"), "?"),
+    (re.compile(r"\?::[\w\[\]]+"), "?"),
+    (re.compile(r"\b\d+(?:\.\d+)?\b"), "?"),
+    (re.compile(r"\s+"), " "),
+    (re.compile(r"\(\?(?:, \?)*\)"), "(?)"),
+    # Rows of multi-row inserts
+    (re.compile(r"(\([^()]*\))(?:, \1)+"), r"\1"),
+)
+
+OTHER_FINGERPRINTS = "other"
+_labelled_fingerprints: set[str] = set()
+
+_active_stats: ContextVar[tuple["QueryStats", ...]] = ContextVar("query_stats", default=())
+
+
+@lru_cache(maxsize=1024)
+def normalize_statement(statement: str) -> str:
+    """Replaces the literals and parameters of a statement, and collapses lists of them."""
+    for pattern, replacement in _NORMALIZATIONS:
+        statement = pattern.sub(replacement, statement)
+    return statement.strip()
+
+
+@lru_cache(maxsize=1024)
+def fingerprint(statement: str) -> str:
+    return hashlib.sha1(normalize_statement(statement).encode()).hexdigest()[:12]
+
+
+def fingerprint_label(statement_fingerprint: str) -> str:
+    """Bounds the label values of the histogram to the first fingerprints seen,
+    the statements past the limit are timed together.
+    """
+    if statement_fingerprint in _labelled_fingerprints:
+        return statement_fingerprint
+    if len(_labelled_fingerprints) < get_settings().database_query_fingerprint_labels:
+        _labelled_fingerprints.add(statement_fingerprint)
+        return statement_fingerprint
+    return OTHER_FINGERPRINTS
+
+
+# Route of the statements, or a callable returning it when they run, e.g. once matched
+Route = str | Callable[[], str]
+
+
+@dataclass
+class QueryStats:
+    """Statements executed while collecting, e.g. during a request.
+
+    The statements themselves are only kept when `keep_statements` is set.
+    """
+
+    route: Route | None = None
+    keep_statements: bool = False
+    count: int = 0
+    duration_ns: int = 0
+    fingerprints: Counter[str] = field(default_factory=Counter)
+    statements: list[str] = field(default_factory=list)
+
+    @property
+    def duration(self) -> float:
+        return self.duration_ns / 1e9
+
+    def record(self, statement: str, statement_fingerprint: str, duration_ns: int) -> int:
+        self.count += 1
+        self.duration_ns += duration_ns
+        self.fingerprints[statement_fingerprint] += 1
+        if self.keep_statements:
+            self.statements.append(statement)
+        return self.fingerprints[statement_fingerprint]
+
+
+@contextmanager
+def collect_queries(
+    route: Route | None = None, *, keep_statements: bool = False
+) -> Iterator[QueryStats]:
+    """Collects the statements executed in the current context, collections can be nested."""
+    stats = QueryStats(route, keep_statements)
+    token = _active_stats.set((*_active_stats.get(), stats))
+    try:
+        yield stats
+    finally:
+        _active_stats.reset(token)
+
+
+def record_query(statement: str, parameters: Any, duration_ns: int) -> None:
+    if statement.startswith(TRANSACTION_STATEMENTS):
+        return
+    statement_fingerprint = fingerprint(statement)
+    QUERY_TIME.labels(fingerprint_label(statement_fingerprint)).observe(duration_ns / 1e9)
+    settings = get_settings()
+    route = None
+    for stats in _active_stats.get():
+        repeated = stats.record(statement, statement_fingerprint, duration_ns)
+        if stats.route is None:
+            continue
+        route = stats.route() if callable(stats.route) else stats.route
+        if repeated == settings.database_repeated_query_threshold + 1:
+            logger.warning(
+                "Repeated query",
+                fingerprint=statement_fingerprint,
+                statement=normalize_statement(statement),
+                route=route,
+            )
+    if duration_ns >= settings.database_slow_query_threshold * 1e9:
+        logger.warning(
+            "Slow query",
+            fingerprint=statement_fingerprint,
+            statement=statement,
+            parameters=repr(parameters)[: settings.database_slow_query_max_parameters_length],
+            duration=duration_ns / 1e9,
+            route=route,
+        )
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+@contextmanager
+def query_budget(max_queries: int) -> Iterator[QueryStats]:
+    """Fails when more than `max_queries` statements run inside the block, e.g. in tests:
+
+    with query_budget(2):
+        await client.get("/posts", params={"username": "test"})
+    """
+    with collect_queries(keep_statements=True) as stats:
+        yield stats
+    if stats.count > max_queries:
+        statements = "\n".join(stats.statements)
+        raise QueryBudgetExceeded(
+            f"{stats.count} queries executed, expected at most {max_queries}:\n{statements}"
+        )
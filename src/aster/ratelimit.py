@@ -0,0 +1,187 @@
+import math
+import time
+from collections import OrderedDict
+from collections.abc import Callable
+from dataclasses import dataclass
+from typing import Any, Literal, TypeVar
+
+from fastapi import Request
+from prometheus_client import Counter
+
+from aster.cache import RedisCache
+
+Endpoint = TypeVar("Endpoint", bound=Callable[..., Any])
+
+RATE_LIMIT_KEY_PREFIX = "ratelimit:"
+
+RATE_LIMIT_REQUESTS = Counter(
+    "aster_rate_limit_requests_total",
+    "Rate limited requests by where they were checked and the decision",
+    ["tier", "result"],
+)
+
+# Generic cell rate algorithm: the key stores the theoretical arrival time of the
+# next request, which moves forward by one emission interval per allowed request.
+# Times are in milliseconds, from the Redis clock so that instances agree.
+GCRA_SCRIPT = """
+local period = tonumber(ARGV[1])
+local interval = tonumber(ARGV[2])
+local clock = redis.call("TIME")
+local now = tonumber(clock[1]) * 1000 + tonumber(clock[2]) / 1000
+local tat = math.max(tonumber(redis.call("GET", KEYS[1])) or now, now)
+local new_tat = tat + interval
+if new_tat - now > period + 0.01 then
+    return {0, 0, math.ceil(tat - now), math.ceil(new_tat - now - period)}
+end
+redis.call("SET", KEYS[1], tostring(new_tat), "PX", math.ceil(new_tat - now))
+local remaining = math.floor((period - (new_tat - now)) / interval + 0.001)
+return {1, remaining, math.ceil(new_tat - now), 0}
+"""
+
+
+@dataclass(frozen=True)
+class RateLimit:
+    """Rate limit of an endpoint, read by `AsterRoute`."""
+
+    limit: int
+    """Requests allowed in a period, as a burst or spread over the period"""
+    period: int
+    """Period in seconds"""
+    key: Literal["user", "ip"] = "ip"
+    """Counts the requests by authenticated user, falling back to the address, or by address"""
+    scope: str | None = None
+    """Name shared by the endpoints counting together, defaults to the route"""
+
+    @property
+    def policy(self) -> str:
+        return f"{self.limit};w={self.period}"
+
+
+def rate_limit(
+    limit: int, period: int, key: Literal["user", "ip"] = "ip", scope: str | None = None
+) -> Callable[[Endpoint], Endpoint]:
+    """Rejects the requests over the limit with a 429 response.
+
+    Must be applied below the router decorator, e.g.:
+
+        @login_router.post("")
+        @rate_limit(10, 60)
+        async def login(...): ...
+    """
+    options = RateLimit(limit, period, key, scope)
+
+    def decorator(endpoint: Endpoint) -> Endpoint:
+        endpoint.__aster_rate_limit__ = options  # type: ignore[attr-defined]
+        return endpoint
+
+    return decorator
+
+
+def get_rate_limit(endpoint: Callable[..., Any]) -> RateLimit | None:
+    return getattr(endpoint, "__aster_rate_limit__", None)
+
+
+@dataclass(frozen=True, slots=True)
+class RateLimitResult:
+    allowed: bool
+    rate_limit: RateLimit
+    remaining: int
+    reset: float
+    """Seconds until the limit is fully restored"""
+    retry_after: float
+    """Seconds until a request is allowed again, when rejected"""
+
+    @property
+    def headers(self) -> dict[str, str]:
+        headers = {
+            "RateLimit-Limit": str(self.rate_limit.limit),
+            "RateLimit-Remaining": str(self.remaining),
+            "RateLimit-Reset": str(math.ceil(self.reset)),
+            "RateLimit-Policy": self.rate_limit.policy,
+        }
+        if not self.allowed:
+            headers["Retry-After"] = str(math.ceil(self.retry_after))
+        return headers
+
+
+class RateLimiter:
+    """Counts the requests in Redis, atomically, or in process without a cache.
+
+    Clients over their limit are remembered in process until they may retry, so
+    that floods are rejected without a round trip to Redis.
+
+    Limits by user count the requests of the user returned by `identify_user`, which
+    runs before the endpoint authenticates the request, from its verified credentials:
+    a user cannot multiply its limit with new tokens.
+    """
+
+    def __init__(
+        self,
+        cache: RedisCache | None = None,
+        max_entries: int = 10_000,
+        identify_user: Callable[[Request], str | None] | None = None,
+    ) -> None:
+        self.cache = cache
+        self.max_entries = max_entries
+        self.identify_user = identify_user
+        self._script = cache.redis.register_script(GCRA_SCRIPT) if cache is not None else None
+        self._rejected: OrderedDict[str, tuple[float, float]] = OrderedDict()
+        self._arrivals: OrderedDict[str, float] = OrderedDict()
+
+    def build_key(self, request: Request, rate_limit: RateLimit, scope: str) -> str:
+        client = f"ip:{request.client.host}" if request.client else "ip:"
+        if (
+            rate_limit.key == "user"
+            and self.identify_user is not None
+            and (user := self.identify_user(request)) is not None
+        ):
+            client = f"user:{user}"
+        return f"{rate_limit.scope or scope}:{client}"
+
+    async def hit(self, key: str, rate_limit: RateLimit) -> RateLimitResult:
+        now = time.monotonic()
+        rejected = self._rejected.get(key)
+        if rejected is not None:
+            retry_at, reset_at = rejected
+            if retry_at > now:
+                RATE_LIMIT_REQUESTS.labels("local", "rejected").inc()
+                return RateLimitResult(False, rate_limit, 0, reset_at - now, retry_at - now)
+            del self._rejected[key]
+        if self._script is None:
+            tier = "local"
+            result = self._hit_local(key, rate_limit, now)
+        else:
+            tier = "redis"
+            period = rate_limit.period * 1000
+            allowed, remaining, reset, retry_after = await self._script(
+                keys=[RATE_LIMIT_KEY_PREFIX + key], args=[period, period / rate_limit.limit]
+            )
+            result = RateLimitResult(
+                bool(allowed), rate_limit, remaining, reset / 1000, retry_after / 1000
+            )
+        RATE_LIMIT_REQUESTS.labels(tier, "allowed" if result.allowed else "rejected").inc()
+        if not result.allowed:
+            self._set(self._rejected, key, (now + result.retry_after, now + result.reset))
+        return result
+
+    def _hit_local(self, key: str, rate_limit: RateLimit, now: float) -> RateLimitResult:
+        interval = rate_limit.period / rate_limit.limit
+        arrival = max(self._arrivals.get(key, now), now)
+        next_arrival = arrival + interval
+        if next_arrival - now > rate_limit.period + 1e-6:
+            return RateLimitResult(
+                False, rate_limit, 0, arrival - now, next_arrival - now - rate_limit.period
+            )
+        self._set(self._arrivals, key, next_arrival)
+        remaining = int((rate_limit.period - (next_arrival - now)) / interval + 0.001)
+        return RateLimitResult(True, rate_limit, remaining, next_arrival - now, 0)
+
+    def _set(self, entries: "OrderedDict[str, Any]", key: str, value: Any) -> None:
+        entries[key] = value
+        entries.move_to_end(key)
+        while len(entries) > self.max_entries:
+            entries.popitem(last=False)
+
+
+def get_rate_limiter(request: Request) -> RateLimiter | None:
+    return getattr(request.state, "rate_limiter", None)
@@ -1,5 +1,79 @@
-from fastapi import Response
+import hashlib
+from collections.abc import Mapping
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+
+from fastapi import Request, Response, status
+from starlette.background import BackgroundTask
+
+# Validators sent back with a 304, other headers describe the omitted body
+NOT_MODIFIED_HEADERS = (b"etag", b"last-modified", b"cache-control", b"vary")
+
+
+def make_etag(body: bytes) -> str:
+    return f'W/"{hashlib.md5(body, usedforsecurity=False).hexdigest()}"'
+
+
+def format_http_date(value: datetime) -> str:
+    # Naive datetimes are local times, as stored by the models
+    return format_datetime(value.astimezone(timezone.utc), usegmt=True)
 
 
 class AsterResponse(Response):
+    """JSON response with a weak ETag, and `Last-Modified` when given.
+
+    `AsterRoute` answers the conditional requests matching them with a 304.
+    """
+
     media_type = "application/json"
+
+    def __init__(
+        self,
+        content: str | bytes | None = None,
+        status_code: int = status.HTTP_200_OK,
+        headers: Mapping[str, str] | None = None,
+        media_type: str | None = None,
+        background: BackgroundTask | None = None,
+        last_modified: datetime | None = None,
+    ) -> None:
+        super().__init__(content, status_code, headers, media_type, background)
+        if status_code == status.HTTP_200_OK:
+            self.raw_headers.append((b"etag", make_etag(self.body).encode("latin-1")))
+            if last_modified is not None:
+                self.raw_headers.append(
+                    (b"last-modified", format_http_date(last_modified).encode("latin-1"))
+                )
+
+
+def is_not_modified(request: Request, response: Response) -> bool:
+    """Evaluates `If-None-Match`, or `If-Modified-Since` without it, against the response."""
+    if_none_match = request.headers.get("If-None-Match")
+    if if_none_match is not None:
+        etag = response.headers.get("ETag")
+        if etag is None:
+            return False
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return "*" in tags or etag.removeprefix("W/") in tags
+    if_modified_since = request.headers.get("If-Modified-Since")
+    last_modified = response.headers.get("Last-Modified")
+    if if_modified_since is None or last_modified is None:
+        return False
+    try:
+        return parsedate_to_datetime(last_modified) <= parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+
+
+def conditional_response(request: Request, response: Response) -> Response:
+    """Replaces a successful response by a 304 when the client already has it."""
+    if (
+        request.method not in ("GET", "HEAD")
+        or response.status_code != status.HTTP_200_OK
+        or not is_not_modified(request, response)
+    ):
+        return response
+    not_modified = Response(status_code=status.HTTP_304_NOT_MODIFIED)
+    not_modified.raw_headers = [
+        (key, value) for key, value in response.raw_headers if key in NOT_MODIFIED_HEADERS
+    ]
+    return not_modified
@@ -1,12 +1,21 @@
+import random
 from collections.abc import Callable
 from typing import Any
 
-from fastapi import Request, Response
+import orjson
+from fastapi import HTTPException, Request, Response, status
 from fastapi.responses import JSONResponse
 from fastapi.routing import APIRoute
 from starlette.datastructures import Address, UploadFile
 from structlog.contextvars import bind_contextvars
 
+from aster.cache import get_cache, get_response_cache_options
+from aster.compression import get_response_compressor
+from aster.config import AppSettings, get_settings
+from aster.ratelimit import get_rate_limit, get_rate_limiter
+from aster.responses import conditional_response
+from aster.streaming import is_stream_request
+
 
 def get_client_addr(client: Address | None) -> str | None:
     if client is None:
@@ -14,39 +23,115 @@ def get_client_addr(client: Address | None) -> str | None:
     return f"{client[0]}:{client[1]}"
 
 
-async def extract_body(request: Request) -> Any:
-    if request.method != "GET":
-        request_encoding_type = request.headers.get("Content-Type", "")
-        if request_encoding_type == "application/json":
-            return await request.json()
-        form_data = await request.form()
-        if request_encoding_type == "application/x-www-form-urlencoded":
-            return dict(form_data)
-        if form_data:
-            return {
+REDACTED = "[REDACTED]"
+
+
+def redact(value: Any, keys: frozenset[str]) -> Any:
+    if isinstance(value, dict):
+        return {
+            k: REDACTED if str(k).lower() in keys else redact(v, keys) for k, v in value.items()
+        }
+    if isinstance(value, list):
+        return [redact(v, keys) for v in value]
+    return value
+
+
+def capture_body(request: Request, settings: AppSettings) -> Any:
+    """Returns the body already read by the endpoint, for the logs.
+
+    The body is never read here: it is skipped when the endpoint did not read it,
+    when it is larger than the cap or when its content type is not allowed.
+    """
+    if request.method in ("GET", "HEAD", "OPTIONS"):
+        return None
+    sample_rate = settings.log_body_sample_rate
+    if sample_rate <= 0 or (sample_rate < 1 and random.random() >= sample_rate):
+        return None
+    content_type = request.headers.get("Content-Type", "").partition(";")[0].strip().lower()
+    if content_type not in settings.log_body_content_types:
+        return None
+    body: bytes | None = getattr(request, "_body", None)
+    content_length = request.headers.get("Content-Length", "")
+    if content_length.isdigit():
+        size: int | None = int(content_length)
+    else:
+        size = len(body) if body is not None else None
+    if size is None or size > settings.log_body_max_bytes:
+        return None
+    keys = frozenset(key.lower() for key in settings.log_body_redacted_keys)
+    form = getattr(request, "_form", None)
+    if form is not None:
+        return redact(
+            {
                 key: repr(value) if isinstance(value, UploadFile) else value
-                for key, value in form_data.multi_items()
-            }
-        return await request.body()
-    return None
+                for key, value in form.multi_items()
+            },
+            keys,
+        )
+    if body is None:
+        return None
+    if content_type == "application/json" or content_type.endswith("+json"):
+        try:
+            return redact(orjson.loads(body), keys)
+        except orjson.JSONDecodeError:
+            pass
+    return body.decode(errors="replace")
 
 
 class AsterRoute(APIRoute):
     def get_route_handler(self) -> Callable:  # type: ignore
         original_route_handler = super().get_route_handler()
+        cache_options = get_response_cache_options(self.endpoint)
+        rate_limit = get_rate_limit(self.endpoint)
 
         async def custom_route_handler(request: Request) -> Response:
-            opt_context = {
-                "client": get_client_addr(request.client),
-                "body": await extract_body(request),
-            }
+            client = get_client_addr(request.client)
             bind_contextvars(
                 path=request.url.path,
                 method=request.method,
-                **{k: v for k, v in opt_context.items() if v is not None},
+                **({"client": client} if client is not None else {}),
             )
-            response = await original_route_handler(request)
-            return response
+            rate_limit_result = None
+            if rate_limit is not None and (limiter := get_rate_limiter(request)) is not None:
+                rate_limit_result = await limiter.hit(
+                    limiter.build_key(request, rate_limit, self.unique_id), rate_limit
+                )
+                if not rate_limit_result.allowed:
+                    raise HTTPException(
+                        status.HTTP_429_TOO_MANY_REQUESTS,
+                        "Too many requests",
+                        headers=rate_limit_result.headers,
+                    )
+            compressor = get_response_compressor()
+            encoding = compressor.negotiate(request) if compressor is not None else None
+
+            async def call_endpoint(request: Request) -> Response:
+                response: Response = await original_route_handler(request)
+                if compressor is not None:
+                    response = await compressor.compress(response, encoding)
+                return response
+
+            try:
+                if (
+                    cache_options is not None
+                    and request.method == "GET"
+                    and not is_stream_request(request)
+                    and (cache := get_cache(request)) is not None
+                ):
+                    response = await cache.cached_response(
+                        request, cache_options, call_endpoint, encoding
+                    )
+                else:
+                    response = await call_endpoint(request)
+                response = conditional_response(request, response)
+                if rate_limit_result is not None:
+                    response.headers.update(rate_limit_result.headers)
+                return response
+            finally:
+                # Captured once the endpoint has read, and cached, the body
+                body = capture_body(request, get_settings())
+                if body is not None:
+                    bind_contextvars(body=body)
 
         return custom_route_handler
 
@@ -1,11 +1,13 @@
+from collections.abc import Sequence
 from datetime import datetime
-from typing import Any
+from typing import Any, Generic, TypeVar
 from zoneinfo import ZoneInfo
 
 import orjson
-from fastapi.encoders import jsonable_encoder
 from pydantic import BaseModel
 
+ItemT = TypeVar("ItemT")
+
 
 def orjson_dumps(v: Any, *, default: Any) -> str:
     return orjson.dumps(v, default=default).decode()
@@ -27,6 +29,15 @@ class ORJSONModel(
     # )
 
     def serializable_dict(self, **kwargs: Any) -> Any:
-        default_dict = super().model_dump(**kwargs)
+        return self.model_dump(mode="json", **kwargs)
+
+
+class Page(ORJSONModel, Generic[ItemT]):
+    items: list[ItemT]
+    next_cursor: str | None = None
+    """Cursor of the next page, `None` on the last page"""
+
 
-        return jsonable_encoder(default_dict)
+def dump_page(items: Sequence[Any], next_cursor: str | None) -> bytes:
+    """Serializes a page of records, e.g. dataclasses, as a `Page` of their view."""
+    return orjson.dumps({"items": items, "next_cursor": next_cursor})
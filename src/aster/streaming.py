@@ -0,0 +1,74 @@
+from collections.abc import AsyncIterator, Awaitable, Callable
+from typing import Annotated, Any, Literal
+
+from fastapi import Depends, Request
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine, AsyncScalarResult, AsyncSession
+
+from aster.database import session_factory
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+TRUTHY_VALUES = ("1", "true", "on", "yes")
+
+StreamFormat = Literal["ndjson", "json"]
+StreamQuery = Callable[[AsyncSession], Awaitable[AsyncScalarResult[Any]]]
+
+
+def is_stream_request(request: Request) -> bool:
+    return (
+        NDJSON_MEDIA_TYPE in request.headers.get("Accept", "")
+        or request.query_params.get("stream", "").lower() in TRUTHY_VALUES
+    )
+
+
+def get_stream_format(request: Request, stream: bool = False) -> StreamFormat | None:
+    """Returns the requested streaming format, through the Accept header or `stream=true`."""
+    if NDJSON_MEDIA_TYPE in request.headers.get("Accept", ""):
+        return "ndjson"
+    return "json" if stream else None
+
+
+InjectStreamFormat = Annotated[StreamFormat | None, Depends(get_stream_format)]
+
+
+async def iter_json(
+    query: StreamQuery,
+    model: type[BaseModel],
+    stream_format: StreamFormat,
+    bind: AsyncEngine | AsyncConnection | None = None,
+) -> AsyncIterator[bytes]:
+    """Serializes the rows of the query one partition at a time.
+
+    The query runs in its own session, on `bind` when given: the request one is
+    closed once the endpoint returns, before the response is sent.
+    """
+    separator = b"\n" if stream_format == "ndjson" else b","
+    if stream_format == "json":
+        yield b"["
+    first = True
+    async with session_factory(bind=bind) if bind else session_factory() as session:
+        result = await query(session)
+        async for rows in result.partitions():
+            chunk = separator.join(
+                model.model_validate(row).model_dump_json().encode() for row in rows
+            )
+            if stream_format == "ndjson":
+                yield chunk + separator
+            else:
+                yield chunk if first else separator + chunk
+            first = False
+    if stream_format == "json":
+        yield b"]"
+
+
+def streaming_response(
+    query: StreamQuery,
+    model: type[BaseModel],
+    stream_format: StreamFormat,
+    bind: AsyncEngine | AsyncConnection | None = None,
+) -> StreamingResponse:
+    media_type = NDJSON_MEDIA_TYPE if stream_format == "ndjson" else "application/json"
+    return StreamingResponse(
+        iter_json(query, model, stream_format, bind), media_type=media_type
+    )
@@ -0,0 +1,268 @@
+import asyncio
+import enum
+import random
+import time
+from collections.abc import Awaitable, Callable, Mapping
+from typing import Any, Concatenate, Generic, ParamSpec, TypeVar
+
+import orjson
+from arq import ArqRedis, Retry
+from arq.cron import CronJob, cron
+from arq.jobs import Job
+from arq.worker import Function, func
+from prometheus_client import Counter, Histogram
+
+Ctx = dict[str, Any]
+P = ParamSpec("P")
+R = TypeVar("R")
+K = TypeVar("K", int, str)
+T = TypeVar("T")
+
+# Batches scheduled for a job which never ran are given to a new job after this delay
+BATCH_SCHEDULED_EXPIRATION = 60 * 60
+# Batches taken by a job which never finished are dropped after this delay
+BATCH_PROCESSING_EXPIRATION = 24 * 60 * 60
+
+# Takes the items of a batch for a job, or the ones it already took when run again
+TAKE_BATCH_SCRIPT = """
+if redis.call("EXISTS", KEYS[2]) == 0 then
+    redis.call("DEL", KEYS[3])
+    if redis.call("EXISTS", KEYS[1]) == 0 then
+        return {}
+    end
+    redis.call("RENAME", KEYS[1], KEYS[2])
+    redis.call("EXPIRE", KEYS[2], ARGV[1])
+end
+return redis.call("LRANGE", KEYS[2], 0, -1)
+"""
+# Puts the items taken by a job back in front of the batch, returns whether a job is needed
+RESTORE_BATCH_SCRIPT = """
+local values = redis.call("LRANGE", KEYS[1], 0, -1)
+for i = #values, 1, -1 do
+    redis.call("LPUSH", KEYS[2], values[i])
+end
+redis.call("DEL", KEYS[1])
+if #values == 0 then
+    return 0
+end
+return redis.call("SET", KEYS[3], 1, "EX", ARGV[1], "NX") and 1 or 0
+"""
+
+JOBS_ENQUEUED = Counter("aster_jobs_enqueued_total", "Jobs enqueued by task", ["task"])
+JOBS = Counter("aster_jobs_total", "Jobs run by task and outcome", ["task", "status"])
+JOB_DURATION = Histogram("aster_job_duration_seconds", "Time spent running a job", ["task"])
+JOB_DELAY = Histogram(
+    "aster_job_delay_seconds", "Time between the moment a job is due and its start", ["task"]
+)
+
+
+class Queue(enum.StrEnum):
+    """Queues of the jobs, each consumed by its own workers."""
+
+    HIGH = "aster:queue:high"
+    DEFAULT = "arq:queue"
+    LOW = "aster:queue:low"
+
+
+TASKS: dict[str, "BaseTask"] = {}
+
+
+class BaseTask:
+    """Job function registered with its queue, retry policy and schedule.
+
+    Failed jobs are retried up to `max_tries` times, after a delay growing exponentially
+    from `backoff` up to `max_backoff`, with jitter so that failures do not retry in step.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        *,
+        queue: Queue = Queue.DEFAULT,
+        max_tries: int = 5,
+        backoff: float = 1.0,
+        max_backoff: float = 5 * 60,
+        timeout: float | None = None,
+        schedule: Mapping[str, Any] | None = None,
+    ) -> None:
+        if name in TASKS:
+            raise ValueError(f"Task {name} is already registered")
+        self.name = name
+        self.queue = queue
+        self.max_tries = max_tries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.schedule = schedule
+        TASKS[name] = self
+
+    async def run(self, ctx: Ctx, *args: Any, **kwargs: Any) -> Any:
+        raise NotImplementedError
+
+    def get_backoff(self, job_try: int) -> float:
+        delay = min(self.max_backoff, self.backoff * 2 ** (job_try - 1))
+        return delay * random.uniform(0.5, 1.0)
+
+    async def execute(self, ctx: Ctx, *args: Any, **kwargs: Any) -> Any:
+        """Runs a job, recording its metrics, and turns its failures into retries."""
+        start = time.time()
+        JOB_DELAY.labels(self.name).observe(max(0.0, start - ctx["score"] / 1000))
+        try:
+            result = await self.run(ctx, *args, **kwargs)
+        except Exception as exc:
+            if ctx["job_try"] < self.max_tries:
+                JOBS.labels(self.name, "retried").inc()
+                raise Retry(defer=self.get_backoff(ctx["job_try"])) from exc
+            JOBS.labels(self.name, "failed").inc()
+            raise
+        finally:
+            JOB_DURATION.labels(self.name).observe(time.time() - start)
+        JOBS.labels(self.name, "complete").inc()
+        return result
+
+    def to_function(self) -> Function:
+        return func(self.execute, name=self.name, max_tries=self.max_tries, timeout=self.timeout)
+
+    def to_cron_job(self) -> CronJob:
+        assert self.schedule is not None
+        return cron(
+            self.execute,
+            name=self.name,
+            max_tries=self.max_tries,
+            timeout=self.timeout,
+            **self.schedule,
+        )
+
+
+class Task(BaseTask, Generic[P, R]):
+    """Task whose jobs call a function with the arguments they were enqueued with.
+
+    Jobs with the same `coalesce` key are coalesced: they are not enqueued while one is
+    waiting or being retried.
+    """
+
+    def __init__(
+        self,
+        function: Callable[Concatenate[Ctx, P], Awaitable[R]],
+        *,
+        coalesce: Callable[..., str] | None = None,
+        **options: Any,
+    ) -> None:
+        super().__init__(function.__name__, **options)
+        self.function = function
+        self.coalesce = coalesce
+
+    async def __call__(self, ctx: Ctx, *args: P.args, **kwargs: P.kwargs) -> R:
+        return await self.function(ctx, *args, **kwargs)
+
+    async def run(self, ctx: Ctx, *args: Any, **kwargs: Any) -> R:
+        return await self.function(ctx, *args, **kwargs)
+
+    async def enqueue(self, queue: ArqRedis, *args: P.args, **kwargs: P.kwargs) -> Job | None:
+        """Enqueues a job, returns None when coalesced with a waiting one."""
+        job_id = f"{self.name}:{self.coalesce(*args, **kwargs)}" if self.coalesce else None
+        job_kwargs: dict[str, Any] = kwargs
+        job = await queue.enqueue_job(
+            self.name, *args, _job_id=job_id, _queue_name=self.queue, **job_kwargs
+        )
+        if job is not None:
+            JOBS_ENQUEUED.labels(self.name).inc()
+        return job
+
+
+class BatchTask(BaseTask, Generic[K, T, R]):
+    """Task whose jobs call a function with the items enqueued for a key, in batches.
+
+    Items are appended to a Redis list and the first item of a batch schedules a job
+    `window` seconds later. The job moves the items of the key to a list of its own, kept
+    until the function succeeds, so that its retries and its runs after a crash resume
+    the same batch. Items of a job cancelled, by a timeout or a shutdown, are put back
+    in front of the next batch. Items of a batch failing its last try are dropped.
+    """
+
+    def __init__(
+        self,
+        function: Callable[[Ctx, K, list[T]], Awaitable[R]],
+        *,
+        window: float = 1.0,
+        **options: Any,
+    ) -> None:
+        super().__init__(function.__name__, **options)
+        self.function: Callable[[Ctx, K, list[T]], Awaitable[R]] = function
+        self.window = window
+
+    def get_items_key(self, key: K) -> str:
+        return f"aster:batch:{self.name}:{key}"
+
+    async def __call__(self, ctx: Ctx, key: K, items: list[T]) -> R:
+        return await self.function(ctx, key, items)
+
+    async def run(self, ctx: Ctx, key: K) -> R | None:
+        redis: ArqRedis = ctx["redis"]
+        items_key = self.get_items_key(key)
+        processing_key = f"{items_key}:processing:{ctx['job_id']}"
+        values = await redis.register_script(TAKE_BATCH_SCRIPT)(
+            keys=[items_key, processing_key, items_key + ":scheduled"],
+            args=[BATCH_PROCESSING_EXPIRATION],
+        )
+        if not values:
+            return None
+        try:
+            result = await self.function(ctx, key, [orjson.loads(value) for value in values])
+        except Exception:
+            if ctx["job_try"] >= self.max_tries:
+                await redis.delete(processing_key)
+            raise
+        except BaseException:
+            await asyncio.shield(self._restore(redis, key, processing_key))
+            raise
+        await redis.delete(processing_key)
+        return result
+
+    async def enqueue(self, queue: ArqRedis, key: K, *items: T) -> Job | None:
+        """Adds items to the batch of a key, returns the job scheduled for the batch."""
+        items_key = self.get_items_key(key)
+        async with queue.pipeline(transaction=True) as pipe:
+            pipe.rpush(items_key, *(orjson.dumps(item) for item in items))
+            pipe.set(items_key + ":scheduled", 1, ex=BATCH_SCHEDULED_EXPIRATION, nx=True)
+            _, scheduled = await pipe.execute()
+        if not scheduled:
+            return None
+        return await self._schedule(queue, key)
+
+    async def _schedule(self, queue: ArqRedis, key: K) -> Job | None:
+        JOBS_ENQUEUED.labels(self.name).inc()
+        return await queue.enqueue_job(
+            self.name, key, _queue_name=self.queue, _defer_by=self.window
+        )
+
+    async def _restore(self, redis: ArqRedis, key: K, processing_key: str) -> None:
+        items_key = self.get_items_key(key)
+        scheduled = await redis.register_script(RESTORE_BATCH_SCRIPT)(
+            keys=[processing_key, items_key, items_key + ":scheduled"],
+            args=[BATCH_SCHEDULED_EXPIRATION],
+        )
+        if scheduled:
+            await self._schedule(redis, key)
+
+
+def task(
+    *, coalesce: Callable[..., str] | None = None, **options: Any
+) -> Callable[[Callable[Concatenate[Ctx, P], Awaitable[R]]], Task[P, R]]:
+    """Registers a task, see `BaseTask` for the options."""
+
+    def decorator(function: Callable[Concatenate[Ctx, P], Awaitable[R]]) -> Task[P, R]:
+        return Task(function, coalesce=coalesce, **options)
+
+    return decorator
+
+
+def batch_task(
+    *, window: float = 1.0, **options: Any
+) -> Callable[[Callable[[Ctx, K, list[T]], Awaitable[R]]], BatchTask[K, T, R]]:
+    """Registers a batch task, see `BaseTask` for the options."""
+
+    def decorator(function: Callable[[Ctx, K, list[T]], Awaitable[R]]) -> BatchTask[K, T, R]:
+        return BatchTask(function, window=window, **options)
+
+    return decorator
@@ -1,37 +1,85 @@
 import asyncio
-from typing import Any
+from typing import Annotated, Any
 
-from arq import create_pool
+import structlog
+from arq import ArqRedis
 from arq.connections import RedisSettings
+from fastapi import Depends, Request
+from prometheus_client import Gauge, start_http_server
+from redis.exceptions import RedisError
 
+# Registers the tasks of each domain
+from aster.auth import tasks as auth_tasks  # noqa: F401
+from aster.cache import create_cache
 from aster.config import get_settings
+from aster.posts import tasks as posts_tasks  # noqa: F401
+from aster.tasks import TASKS, Ctx, Queue
 
+logger = structlog.get_logger()
 
-async def task1(ctx: Any) -> int:
-    print("running the task")
-    return 42
+QUEUE_DEPTH = Gauge("aster_queue_depth", "Jobs waiting in a queue", ["queue"])
+# Workers of different queues may share a host, each serves its metrics on its own port
+METRICS_PORT_OFFSETS = {Queue.DEFAULT: 0, Queue.HIGH: 1, Queue.LOW: 2}
 
 
-async def main() -> None:
+def get_redis_settings() -> RedisSettings:
     redis_url = get_settings().redis_url
     if redis_url is None:
         raise ValueError
-    redis = await create_pool(
-        RedisSettings(
-            host=redis_url.host or "localhost",
-            port=int(redis_url.port) if redis_url.port else 6379,
-            username=redis_url.username,
-            password=redis_url.password,
+    return RedisSettings.from_dsn(str(redis_url))
+
+
+def get_queue(request: Request) -> ArqRedis | None:
+    return getattr(request.state, "queue", None)
+
+
+InjectQueue = Annotated[ArqRedis | None, Depends(get_queue)]
+
+
+async def sample_queue_depth(redis: ArqRedis, queue: Queue, interval: float) -> None:
+    while True:
+        try:
+            QUEUE_DEPTH.labels(queue).set(await redis.zcard(queue))
+        except RedisError:
+            await logger.awarning("Queue depth sampling failed", queue=queue)
+        await asyncio.sleep(interval)
+
+
+def get_worker_settings(queue: Queue) -> dict[str, Any]:
+    """Settings of the workers consuming a queue, with the tasks and schedules of the queue.
+
+    `keep_result` is 0 so that coalesced jobs can be enqueued again once done.
+    """
+
+    async def startup(ctx: Ctx) -> None:
+        settings = get_settings()
+        # Tasks invalidate the responses cached by the API
+        ctx["cache"] = create_cache()
+        if settings.worker_metrics_port is None:
+            return
+        start_http_server(settings.worker_metrics_port + METRICS_PORT_OFFSETS[queue])
+        ctx["queue_depth_sampler"] = asyncio.create_task(
+            sample_queue_depth(ctx["redis"], queue, settings.worker_queue_depth_interval)
         )
-    )
-    job = await redis.enqueue_job("task1")
-    if job:
-        print(await job.result(timeout=5))
 
+    async def shutdown(ctx: Ctx) -> None:
+        if (sampler := ctx.get("queue_depth_sampler")) is not None:
+            sampler.cancel()
+        if (cache := ctx.get("cache")) is not None:
+            await cache.close()
 
-class WorkerSettings:
-    functions = [task1]
+    tasks = [task for task in TASKS.values() if task.queue is queue]
+    return {
+        "queue_name": queue,
+        "functions": [task.to_function() for task in tasks if task.schedule is None],
+        "cron_jobs": [task.to_cron_job() for task in tasks if task.schedule is not None],
+        "redis_settings": get_redis_settings() if get_settings().redis_url else RedisSettings(),
+        "keep_result": 0,
+        "on_startup": startup,
+        "on_shutdown": shutdown,
+    }
 
 
-if __name__ == "__main__":
-    asyncio.run(main())
+WorkerSettings = get_worker_settings(Queue.DEFAULT)
+HighPriorityWorkerSettings = get_worker_settings(Queue.HIGH)
+LowPriorityWorkerSettings = get_worker_settings(Queue.LOW)
@@ -3,7 +3,8 @@ from typing import Any, Callable, Coroutine
 import dirty_equals as de
 import pytest
 from aster.auth.schemas import UserCreate
-from aster.auth.services import create_user
+from aster.auth.services import create_user, reconcile_user_stats, update_user_stats
+from aster.posts.schemas import PostCreate
 from httpx import Response
 from sqlalchemy.ext.asyncio import AsyncSession
 
@@ -38,6 +39,7 @@ async def test_register(
         username=new_user.username,
         created_at=de.IsDatetime(iso_string=True),
         updated_at=de.IsDatetime(iso_string=True),
+        stats={"post_count": 0, "follower_count": 0, "following_count": 0, "block_count": 0},
     )
 
 
@@ -92,3 +94,70 @@ async def test_block_unblock_user(
     assert res.status_code == 204
     res = await api_check_user_blocked_by_authenticated_user(user2.username)
     assert res.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_list_users_pagination(
+    session: AsyncSession, api_list_users: Callable[..., Coroutine[Any, Any, Response]]
+) -> None:
+    usernames = [f"user{i}" for i in range(5)]
+    for username in usernames:
+        await create_user(session, data_in=UserCreate(username=username, password="password"))
+    await session.commit()
+
+    res = await api_list_users(limit=3)
+    assert res.status_code == 200
+    assert [user["username"] for user in res.json()["items"]] == usernames[:3]
+    res = await api_list_users(limit=3, cursor=res.json()["next_cursor"])
+    assert res.status_code == 200
+    assert res.json() == {
+        "items": de.IsList(*(de.IsPartialDict(username=u) for u in usernames[3:])),
+        "next_cursor": None,
+    }
+
+    res = await api_list_users(stream=True)
+    assert [user["username"] for user in res.json()] == usernames
+
+
+@pytest.mark.asyncio
+async def test_user_stats(
+    session: AsyncSession,
+    api_login: Callable[[dict[str, str]], Coroutine[Any, Any, Response]],
+    api_get_user: Callable[[str], Coroutine[Any, Any, Response]],
+    api_get_authenticated_user: Callable[[], Coroutine[Any, Any, Response]],
+    api_create_post: Callable[[PostCreate], Coroutine[Any, Any, Response]],
+    api_follow_user: Callable[[str], Coroutine[Any, Any, Response]],
+    api_unfollow_user: Callable[[str], Coroutine[Any, Any, Response]],
+    api_block_user: Callable[[str], Coroutine[Any, Any, Response]],
+) -> None:
+    user1 = UserCreate(username="user1", password="password")
+    user2 = UserCreate(username="user2", password="password")
+    user3 = UserCreate(username="user3", password="password")
+    for user in (user1, user2, user3):
+        await create_user(session, data_in=user)
+    await session.commit()
+
+    await api_login({"username": user1.username, "password": user1.password.get_secret_value()})
+    for i in range(2):
+        await api_create_post(PostCreate(content=f"Post {i}"))
+    await api_follow_user(user2.username)
+    await api_follow_user(user2.username)
+    await api_follow_user(user3.username)
+    await api_unfollow_user(user3.username)
+    await api_block_user(user3.username)
+
+    res = await api_get_user(user1.username)
+    assert res.status_code == 200
+    assert res.json()["stats"] == {"post_count": 2, "follower_count": 0, "following_count": 1}
+    res = await api_get_user(user2.username)
+    assert res.json()["stats"] == {"post_count": 0, "follower_count": 1, "following_count": 0}
+    res = await api_get_authenticated_user()
+    assert res.json()["stats"] == de.IsPartialDict(post_count=2, block_count=1)
+
+    # Counters which drifted are corrected by the reconciliation
+    user1_id = res.json()["id"]
+    await update_user_stats(session, deltas={(user1_id, "post_count"): 5})
+    assert await reconcile_user_stats(session, after=user1_id - 1) == de.Contains(user1_id)
+    await session.commit()
+    res = await api_get_user(user1.username)
+    assert res.json()["stats"] == de.IsPartialDict(post_count=2, following_count=1)
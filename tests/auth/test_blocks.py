@@ -0,0 +1,141 @@
+import asyncio
+from collections.abc import Callable
+
+import pytest
+from aster.auth.blocks import (
+    BLOCKED_BY_KEY,
+    BLOCKED_KEY,
+    LOADED_MEMBER,
+    VERSION_KEY,
+    BlockGraph,
+    UserBlocks,
+)
+from aster.auth.schemas import UserCreate
+from aster.auth.services import block_user, create_user, unblock_user
+from aster.cache import RedisCache
+from aster.models import User
+from redis.asyncio import Redis
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+async def create_users(session: AsyncSession, *usernames: str) -> list[User]:
+    return [
+        await create_user(session, data_in=UserCreate(username=username, password="password"))
+        for username in usernames
+    ]
+
+
+@pytest.mark.asyncio
+async def test_block_graph(session: AsyncSession) -> None:
+    user, blocked, other = await create_users(session, "user", "blocked", "other")
+    await block_user(session, user=user, username_to_block=blocked.username)
+    await session.commit()
+    block_graph = BlockGraph(max_entries=2)
+
+    assert await block_graph.get_blocks(user.id) == UserBlocks(
+        frozenset({blocked.id}), frozenset()
+    )
+    assert await block_graph.is_blocked(user.id, blocked.id)
+    assert not await block_graph.is_blocked(blocked.id, user.id)
+    # Blocks hide the posts both ways
+    author_ids = [other.id, blocked.id, user.id]
+    assert await block_graph.filter_visible(user.id, author_ids) == [other.id, user.id]
+    assert await block_graph.filter_visible(blocked.id, author_ids) == [other.id, blocked.id]
+
+    # Blocks are read from the in-process tier until updated through the graph
+    await block_user(session, user=other, username_to_block=user.username)
+    await session.commit()
+    assert await block_graph.filter_visible(user.id, [other.id]) == [other.id]
+    await block_graph.add_block(other.id, user.id)
+    assert await block_graph.filter_visible(user.id, [other.id]) == []
+
+    await unblock_user(session, user=user, username_to_unblock=blocked.username)
+    await session.commit()
+    await block_graph.remove_block(user.id, blocked.id)
+    assert not await block_graph.is_blocked(user.id, blocked.id)
+
+
+@pytest.mark.asyncio
+async def test_block_graph_redis(session: AsyncSession, redis: Redis) -> None:
+    user, blocked, other = await create_users(session, "user", "blocked", "other")
+    await block_user(session, user=user, username_to_block=blocked.username)
+    await session.commit()
+    block_graph = BlockGraph(redis)
+
+    assert await block_graph.get_blocks(user.id) == UserBlocks(
+        frozenset({blocked.id}), frozenset()
+    )
+    assert await redis.smembers(BLOCKED_KEY.format(user_id=user.id)) == {
+        LOADED_MEMBER,
+        str(blocked.id).encode(),
+    }
+    assert await redis.smembers(BLOCKED_BY_KEY.format(user_id=user.id)) == {LOADED_MEMBER}
+    assert await redis.ttl(BLOCKED_KEY.format(user_id=user.id)) > 0
+
+    # Loaded sets are read from Redis, changes are only seen through the graph
+    await unblock_user(session, user=user, username_to_unblock=blocked.username)
+    await session.commit()
+    assert await BlockGraph(redis).is_blocked(user.id, blocked.id)
+    await block_graph.remove_block(user.id, blocked.id)
+    assert not await BlockGraph(redis).is_blocked(user.id, blocked.id)
+
+    # Sets created by an update are partial, they are loaded from the database on a read
+    await block_user(session, user=other, username_to_block=blocked.username)
+    await session.commit()
+    await block_graph.add_block(other.id, blocked.id)
+    assert await redis.smembers(BLOCKED_BY_KEY.format(user_id=blocked.id)) == {
+        str(other.id).encode()
+    }
+    assert await block_graph.get_blocks(blocked.id) == UserBlocks(
+        frozenset(), frozenset({other.id})
+    )
+    assert LOADED_MEMBER in await redis.smembers(BLOCKED_BY_KEY.format(user_id=blocked.id))
+
+
+@pytest.mark.asyncio
+async def test_block_graph_redis_race(session: AsyncSession, redis: Redis) -> None:
+    user, blocked = await create_users(session, "user", "blocked")
+    await block_user(session, user=user, username_to_block=blocked.username)
+    await session.commit()
+    block_graph = BlockGraph(redis)
+
+    # Blocks read before an update are not stored over it
+    version = await redis.get(VERSION_KEY.format(user_id=user.id))
+    stale_blocks = UserBlocks(frozenset({blocked.id}), frozenset())
+    await unblock_user(session, user=user, username_to_unblock=blocked.username)
+    await session.commit()
+    await block_graph.remove_block(user.id, blocked.id)
+    assert not await block_graph.store(user.id, stale_blocks, version)
+    assert await redis.smembers(BLOCKED_KEY.format(user_id=user.id)) == set()
+
+    assert not await block_graph.is_blocked(user.id, blocked.id)
+    assert await redis.smembers(BLOCKED_KEY.format(user_id=user.id)) == {LOADED_MEMBER}
+    # Sets already loaded are kept
+    version = await redis.get(VERSION_KEY.format(user_id=user.id))
+    assert await block_graph.store(user.id, stale_blocks, version)
+    assert await redis.smembers(BLOCKED_KEY.format(user_id=user.id)) == {LOADED_MEMBER}
+
+
+@pytest.mark.asyncio
+async def test_block_graph_invalidations(
+    session: AsyncSession, redis: Redis, redis_cache: Callable[..., RedisCache]
+) -> None:
+    user, blocked = await create_users(session, "user", "blocked")
+    graphs = []
+    for _ in range(2):
+        cache = redis_cache()
+        graph = BlockGraph(redis, max_entries=10, ttl=60)
+        graph.track_invalidations(cache)
+        await cache.start()
+        graphs.append(graph)
+    await asyncio.sleep(0.1)
+
+    assert not await graphs[1].is_blocked(user.id, blocked.id)
+    await block_user(session, user=user, username_to_block=blocked.username)
+    await session.commit()
+    await graphs[0].add_block(user.id, blocked.id)
+    for _ in range(50):
+        if await graphs[1].is_blocked(user.id, blocked.id):
+            break
+        await asyncio.sleep(0.01)
+    assert await graphs[1].is_blocked(user.id, blocked.id)
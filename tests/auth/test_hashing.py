@@ -0,0 +1,28 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from aster.api import create_app, lifespan
+from aster.auth.hashing import PasswordHasher, get_password_hasher
+
+
+@pytest.mark.asyncio
+async def test_password_hasher() -> None:
+    hasher = PasswordHasher(ThreadPoolExecutor(2), max_concurrency=2, rounds=4)
+
+    hashes = await asyncio.gather(*(hasher.hash(f"password{i}") for i in range(4)))
+    assert hashes[0].startswith("$2b$04$")
+    assert await hasher.verify("password0", hashes[0])
+    assert not await hasher.verify("password1", hashes[0])
+    hasher.close()
+
+
+@pytest.mark.asyncio
+async def test_lifespan_closes_password_hasher() -> None:
+    hasher = get_password_hasher()
+    async with lifespan(create_app()):
+        pass
+    with pytest.raises(RuntimeError):
+        hasher.executor.submit(print)
+    # A later application gets a new executor
+    assert get_password_hasher() is not hasher
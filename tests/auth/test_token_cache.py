@@ -0,0 +1,90 @@
+from datetime import datetime, timedelta
+
+import pytest
+from aster.api import create_app
+from aster.auth.cache import TokenCache, UserSnapshot
+from aster.auth.schemas import UserCreate
+from aster.auth.services import create_user
+from aster.models import Post
+from aster.posts.schemas import PostCreate
+from aster.posts.services import create_post
+from aster.profiler import query_budget
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.types import Receive, Scope, Send
+
+
+@pytest.mark.asyncio
+async def test_token_cache(session: AsyncSession) -> None:
+    user = await create_user(session, data_in=UserCreate(username="test", password="password"))
+    await session.commit()
+    token_cache = TokenCache(max_entries=2)
+
+    await token_cache.set(
+        "token", UserSnapshot.from_user(user), datetime.now() + timedelta(minutes=1)
+    )
+    await token_cache.set("expired", UserSnapshot.from_user(user), datetime.now())
+    assert await token_cache.get("expired") is None
+    snapshot = await token_cache.get("token")
+    assert snapshot == UserSnapshot.from_user(user)
+
+    # The snapshot can be used as a persistent user without loading it
+    session.expunge_all()
+    cached_user = snapshot.to_user()
+    session.add(cached_user)
+    post = await create_post(session, data_in=PostCreate(content="Post"), user=cached_user)
+    await session.commit()
+    assert (await session.get_one(Post, post.id)).uid == user.id
+    stats = await cached_user.awaitable_attrs.stats
+    assert stats is not None and stats.post_count == 1
+
+    await token_cache.invalidate_user(user.id)
+    assert await token_cache.get("token") is None
+    assert len(token_cache) == 0
+
+    # Entries outlive neither the token nor the TTL of the cache
+    token_cache = TokenCache(ttl=0)
+    await token_cache.set(
+        "token", UserSnapshot.from_user(user), datetime.now() + timedelta(minutes=1)
+    )
+    assert await token_cache.get("token") is None
+
+
+@pytest.mark.asyncio
+async def test_token_cache_requests(session: AsyncSession) -> None:
+    app = create_app()
+    token_cache = TokenCache()
+
+    async def app_with_token_cache(scope: Scope, receive: Receive, send: Send) -> None:
+        scope["state"] = {"token_cache": token_cache}
+        await app(scope, receive, send)
+
+    user = await create_user(session, data_in=UserCreate(username="test", password="password"))
+    await session.commit()
+    async with AsyncClient(app=app_with_token_cache, base_url="http://testserver") as client:
+        res = await client.post("/login", data={"username": "test", "password": "password"})
+        client.headers["Authorization"] = f"Bearer {res.json()['access_token']}"
+
+        res = await client.get("/user")
+        assert res.status_code == 200
+        assert len(token_cache) == 1
+
+        # Only the stats of the user are loaded, the user comes from the cache
+        with query_budget(1) as stats:
+            res = await client.get("/user")
+        assert res.status_code == 200
+        assert res.json()["stats"]["post_count"] == 0
+        assert not any("FROM user_ " in statement for statement in stats.statements)
+
+        # Tokens are forgotten once the user changes, unless the change is rolled back
+        token_cache.track(session)
+        user.password = "changed"
+        await session.flush()
+        await session.rollback()
+        await token_cache.push(session)
+        assert len(token_cache) == 1
+
+        user.password = "changed"
+        await session.commit()
+        await token_cache.push(session)
+        assert len(token_cache) == 0
@@ -0,0 +1,95 @@
+from collections.abc import Callable
+
+import pytest
+from aster.auth.schemas import UserCreate
+from aster.auth.services import count_user_stats, create_user
+from aster.auth.stats import DELTAS_KEY, FLUSHING_KEY, UserStatsBuffer
+from aster.auth.tasks import reconcile_user_stats
+from aster.cache import TAG_KEY_PREFIX, RedisCache
+from aster.config import AppSettings
+from aster.models import UserStats
+from aster.posts.schemas import PostCreate
+from aster.posts.services import create_post
+from pydantic import ValidationError
+from redis.asyncio import Redis
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+@pytest.mark.asyncio
+async def test_user_stats_buffer(
+    session: AsyncSession, redis: Redis, redis_cache: Callable[..., RedisCache]
+) -> None:
+    user = await create_user(session, data_in=UserCreate(username="test", password="password"))
+    await session.commit()
+    user_id = user.id
+    buffer = UserStatsBuffer(redis)
+    buffer.track(session)
+
+    # Changes are added to Redis once committed, rolled back ones are discarded
+    await create_post(session, data_in=PostCreate(content="Post"), user=user)
+    await session.rollback()
+    await count_user_stats(session, deltas={(user_id, "post_count"): 1})
+    await count_user_stats(session, deltas={(user_id, "follower_count"): 2})
+    await buffer.push(session)
+    assert await redis.hgetall(DELTAS_KEY) == {}
+    await session.commit()
+    await buffer.push(session)
+    assert await redis.hgetall(DELTAS_KEY) == {
+        f"{user_id}:post_count".encode(): b"1",
+        f"{user_id}:follower_count".encode(): b"2",
+    }
+
+    assert await buffer.flush(session) == 2
+    assert not await redis.exists(DELTAS_KEY, FLUSHING_KEY)
+    stats = await session.get_one(UserStats, user_id, populate_existing=True)
+    assert (stats.post_count, stats.follower_count) == (1, 2)
+
+    # Deltas of a failed flush are written before the ones counted since
+    await redis.hset(FLUSHING_KEY, f"{user_id}:post_count", 3)
+    await buffer.add({(user_id, "post_count"): 4})
+    assert await buffer.flush(session) == 1
+    assert await redis.hgetall(DELTAS_KEY) == {f"{user_id}:post_count".encode(): b"4"}
+    assert await buffer.flush(session, batch_size=1) == 1
+    stats = await session.get_one(UserStats, user_id, populate_existing=True)
+    assert stats.post_count == 8
+
+    # Cached profiles of the users are invalidated once their deltas are written
+    buffer = UserStatsBuffer(redis, redis_cache())
+    await redis.sadd(f"{TAG_KEY_PREFIX}user:test", "response")
+    await redis.set("response", b"")
+    await buffer.add({(user_id, "post_count"): 1})
+    assert await buffer.flush(session) == 1
+    assert not await redis.exists(f"{TAG_KEY_PREFIX}user:test", "response")
+
+    # Flushes are skipped while the lock is held by the reconciliation
+    await buffer.add({(user_id, "post_count"): 1})
+    async with buffer.lock():
+        assert await buffer.flush(session) == 0
+    assert await redis.exists(DELTAS_KEY)
+
+
+@pytest.mark.asyncio
+async def test_reconcile_user_stats(session: AsyncSession, redis: Redis) -> None:
+    user = await create_user(session, data_in=UserCreate(username="test", password="password"))
+    buffer = UserStatsBuffer(redis)
+    buffer.track(session)
+    await create_post(session, data_in=PostCreate(content="Post"), user=user)
+    await session.commit()
+    await buffer.push(session)
+    # Drift left by a flush written twice
+    await buffer.add({(user.id, "post_count"): 1})
+    await buffer.drain(session)
+    await buffer.add({(user.id, "post_count"): 1})
+
+    assert await reconcile_user_stats({"redis": redis}) >= 1
+    # Pending deltas were drained before the counts were recomputed
+    assert not await redis.exists(DELTAS_KEY, FLUSHING_KEY)
+    stats = await session.get_one(UserStats, user.id, populate_existing=True)
+    assert stats.post_count == 1
+
+
+def test_user_stats_flush_interval() -> None:
+    assert AppSettings(user_stats_flush_interval=60).user_stats_flush_interval == 60
+    for interval in (0, 61):
+        with pytest.raises(ValidationError):
+            AppSettings(user_stats_flush_interval=interval)
@@ -5,6 +5,9 @@ from collections.abc import AsyncGenerator, AsyncIterable, Callable, Coroutine
 from typing import Any
 
 import pytest_asyncio
+from arq import ArqRedis
+from fakeredis import FakeServer
+from fakeredis.aioredis import FakeRedis
 from httpx import AsyncClient, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 
@@ -15,6 +18,7 @@ os.environ["ASTER_DATABASE_NAME"] = "aster-" + "".join(
 # ruff: noqa: E402
 
 from aster.api import create_app
+from aster.cache import RedisCache
 from aster.database import drop_database, engine, init_database, session_factory
 from aster.posts.schemas import PostCreate
 
@@ -40,6 +44,30 @@ async def session() -> AsyncIterable[AsyncSession]:
         await transaction.rollback()
 
 
+@pytest_asyncio.fixture
+async def redis() -> AsyncIterable[ArqRedis]:
+    redis = ArqRedis(connection_pool=FakeRedis(server=FakeServer()).connection_pool)
+    yield redis
+    await redis.aclose()
+
+
+@pytest_asyncio.fixture
+async def redis_cache(redis: ArqRedis) -> AsyncIterable[Callable[..., RedisCache]]:
+    """Builds caches sharing the fake Redis server, e.g. to stand for several instances."""
+    caches: list[RedisCache] = []
+
+    def _r(**options: Any) -> RedisCache:
+        cache = RedisCache("redis://localhost", **options)
+        cache._redis = redis
+        caches.append(cache)
+        return cache
+
+    yield _r
+    for cache in caches:
+        if cache._subscriber is not None:
+            cache._subscriber.cancel()
+
+
 # Auth API
 
 
@@ -67,9 +95,9 @@ def api_register_user(
 
 
 @pytest_asyncio.fixture
-def api_list_users(client: AsyncClient) -> Callable[[], Coroutine[Any, Any, Response]]:
-    async def _r() -> Response:
-        return await client.get(f"{client.base_url}/users")
+def api_list_users(client: AsyncClient) -> Callable[..., Coroutine[Any, Any, Response]]:
+    async def _r(**params: Any) -> Response:
+        return await client.get(f"{client.base_url}/users", params=params)
 
     return _r
 
@@ -146,6 +174,22 @@ def api_unblock_user(client: AsyncClient) -> Callable[[str], Coroutine[Any, Any,
     return _r
 
 
+@pytest_asyncio.fixture
+def api_follow_user(client: AsyncClient) -> Callable[[str], Coroutine[Any, Any, Response]]:
+    async def _r(username: str) -> Response:
+        return await client.put(f"{client.base_url}/user/follows/{username}")
+
+    return _r
+
+
+@pytest_asyncio.fixture
+def api_unfollow_user(client: AsyncClient) -> Callable[[str], Coroutine[Any, Any, Response]]:
+    async def _r(username: str) -> Response:
+        return await client.delete(f"{client.base_url}/user/follows/{username}")
+
+    return _r
+
+
 # Post API
 
 
@@ -158,9 +202,31 @@ def api_create_post(client: AsyncClient) -> Callable[[PostCreate], Coroutine[Any
 
 
 @pytest_asyncio.fixture
-def api_list_posts(client: AsyncClient) -> Callable[[str], Coroutine[Any, Any, Response]]:
-    async def _r(username: str) -> Response:
-        return await client.get(f"{client.base_url}/posts", params={"username": username})
+def api_create_posts(
+    client: AsyncClient,
+) -> Callable[[list[PostCreate]], Coroutine[Any, Any, Response]]:
+    async def _r(data_in: list[PostCreate]) -> Response:
+        return await client.post(
+            f"{client.base_url}/posts/bulk", json=[post.model_dump() for post in data_in]
+        )
+
+    return _r
+
+
+@pytest_asyncio.fixture
+def api_list_posts(client: AsyncClient) -> Callable[..., Coroutine[Any, Any, Response]]:
+    async def _r(username: str, **params: Any) -> Response:
+        return await client.get(
+            f"{client.base_url}/posts", params={"username": username, **params}
+        )
+
+    return _r
+
+
+@pytest_asyncio.fixture
+def api_search_posts(client: AsyncClient) -> Callable[..., Coroutine[Any, Any, Response]]:
+    async def _r(q: str, **params: Any) -> Response:
+        return await client.get(f"{client.base_url}/posts/search", params={"q": q, **params})
 
     return _r
 
@@ -179,3 +245,11 @@ def api_delete_post(client: AsyncClient) -> Callable[[int], Coroutine[Any, Any,
         return await client.delete(f"{client.base_url}/posts/{post_id}")
 
     return _r
+
+
+@pytest_asyncio.fixture
+def api_get_timeline(client: AsyncClient) -> Callable[..., Coroutine[Any, Any, Response]]:
+    async def _r(**params: Any) -> Response:
+        return await client.get(f"{client.base_url}/user/timeline", params=params)
+
+    return _r
@@ -1,10 +1,14 @@
 from typing import Any, Callable, Coroutine
 
 import dirty_equals as de
+import orjson
 import pytest
 from aster.auth.schemas import UserCreate
+from aster.auth.services import create_user
+from aster.posts import services
 from aster.posts.schemas import PostCreate
-from httpx import Response
+from httpx import AsyncClient, Response
+from sqlalchemy.ext.asyncio import AsyncSession
 
 
 @pytest.mark.asyncio
@@ -53,9 +57,9 @@ async def test_post(
     res = await api_list_posts(new_user.username)
     assert res.status_code == 200
     post1_equal = post_equal(post1.content)
-    assert res.json() == de.IsList(post1_equal)
+    assert res.json() == {"items": de.IsList(post1_equal), "next_cursor": None}
 
-    res = await api_get_post(res.json()[0]["id"])
+    res = await api_get_post(res.json()["items"][0]["id"])
     assert res.status_code == 200
     assert res.json() == post1_equal
 
@@ -65,9 +69,260 @@ async def test_post(
 
     res = await api_list_posts(new_user.username)
     assert res.status_code == 200
-    assert res.json() == de.IsList(
+    assert res.json()["items"] == de.IsList(
         post_equal(post2.content), post1_equal
     )  # order by created_at desc
 
-    res = await api_delete_post(res.json()[0]["id"])
+    res = await api_delete_post(res.json()["items"][0]["id"])
     assert res.status_code == 204
+
+
+@pytest.mark.asyncio
+async def test_list_posts_pagination(
+    session: AsyncSession,
+    api_login: Callable[[dict[str, str]], Coroutine[Any, Any, Response]],
+    api_create_post: Callable[[PostCreate], Coroutine[Any, Any, Response]],
+    api_list_posts: Callable[..., Coroutine[Any, Any, Response]],
+) -> None:
+    user = UserCreate(username="author", password="password")
+    await create_user(session, data_in=user)
+    await session.commit()
+    await api_login({"username": user.username, "password": user.password.get_secret_value()})
+    for i in range(5):
+        res = await api_create_post(PostCreate(content=f"Post {i}"))
+        assert res.status_code == 201
+
+    contents: list[str] = []
+    cursor = None
+    while True:
+        params = {"limit": 2} | ({"cursor": cursor} if cursor else {})
+        res = await api_list_posts(user.username, **params)
+        assert res.status_code == 200
+        assert len(res.json()["items"]) <= 2
+        contents.extend(post["content"] for post in res.json()["items"])
+        if (cursor := res.json()["next_cursor"]) is None:
+            break
+    assert contents == [f"Post {i}" for i in reversed(range(5))]
+
+    res = await api_list_posts(user.username, cursor="invalid")
+    assert res.status_code == 400
+    res = await api_list_posts(user.username, limit=1000)
+    assert res.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_timeline(
+    session: AsyncSession,
+    api_login: Callable[[dict[str, str]], Coroutine[Any, Any, Response]],
+    api_create_post: Callable[[PostCreate], Coroutine[Any, Any, Response]],
+    api_follow_user: Callable[[str], Coroutine[Any, Any, Response]],
+    api_unfollow_user: Callable[[str], Coroutine[Any, Any, Response]],
+    api_block_user: Callable[[str], Coroutine[Any, Any, Response]],
+    api_get_timeline: Callable[..., Coroutine[Any, Any, Response]],
+) -> None:
+    reader, followed, blocked, other = (
+        UserCreate(username=username, password="password")
+        for username in ("reader", "followed", "blocked", "other")
+    )
+    for user in (reader, followed, blocked, other):
+        await create_user(session, data_in=user)
+    await session.commit()
+
+    for user in (followed, blocked, other):
+        await api_login({"username": user.username, "password": "password"})
+        res = await api_create_post(PostCreate(content=f"Post of {user.username}"))
+        assert res.status_code == 201
+
+    await api_login({"username": reader.username, "password": "password"})
+    assert (await api_follow_user(reader.username)).status_code == 400
+    assert (await api_follow_user("unknown_user")).status_code == 404
+    for user in (followed, blocked):
+        res = await api_follow_user(user.username)
+        assert res.status_code == 204
+    res = await api_create_post(PostCreate(content="Post of reader"))
+    assert res.status_code == 201
+
+    res = await api_get_timeline(limit=2)
+    assert res.status_code == 200
+    assert [post["content"] for post in res.json()["items"]] == [
+        "Post of reader",
+        "Post of blocked",
+    ]
+    res = await api_get_timeline(limit=2, cursor=res.json()["next_cursor"])
+    assert res.json() == {
+        "items": de.IsList(de.IsPartialDict(content="Post of followed")),
+        "next_cursor": None,
+    }
+
+    await api_block_user(blocked.username)
+    await api_unfollow_user(followed.username)
+    res = await api_get_timeline()
+    assert [post["content"] for post in res.json()["items"]] == ["Post of reader"]
+
+
+@pytest.mark.asyncio
+async def test_stream_posts(
+    client: AsyncClient,
+    session: AsyncSession,
+    api_login: Callable[[dict[str, str]], Coroutine[Any, Any, Response]],
+    api_create_post: Callable[[PostCreate], Coroutine[Any, Any, Response]],
+    api_list_posts: Callable[..., Coroutine[Any, Any, Response]],
+) -> None:
+    user = UserCreate(username="author", password="password")
+    await create_user(session, data_in=user)
+    await session.commit()
+    await api_login({"username": user.username, "password": user.password.get_secret_value()})
+    for i in range(3):
+        await api_create_post(PostCreate(content=f"Post {i}"))
+
+    res = await client.get(
+        "/posts",
+        params={"username": user.username},
+        headers={"Accept": "application/x-ndjson"},
+    )
+    assert res.headers["content-type"] == "application/x-ndjson"
+    lines = [orjson.loads(line) for line in res.text.splitlines()]
+    assert [post["content"] for post in lines] == ["Post 2", "Post 1", "Post 0"]
+
+    res = await api_list_posts(user.username, stream=True)
+    assert [post["content"] for post in res.json()] == ["Post 2", "Post 1", "Post 0"]
+
+    res = await api_list_posts("nobody", stream=True)
+    assert res.json() == []
+
+
+@pytest.mark.asyncio
+async def test_create_posts_bulk(
+    session: AsyncSession,
+    api_login: Callable[[dict[str, str]], Coroutine[Any, Any, Response]],
+    api_create_posts: Callable[[list[PostCreate]], Coroutine[Any, Any, Response]],
+    api_list_posts: Callable[..., Coroutine[Any, Any, Response]],
+) -> None:
+    user = UserCreate(username="author", password="password")
+    await create_user(session, data_in=user)
+    await session.commit()
+    await api_login({"username": user.username, "password": user.password.get_secret_value()})
+
+    res = await api_create_posts([PostCreate(content=f"Post {i}") for i in range(3)])
+    assert res.status_code == 201
+    ids = res.json()["ids"]
+    assert ids == sorted(ids) and len(ids) == 3
+
+    res = await api_list_posts(user.username)
+    assert [post["id"] for post in res.json()["items"]] == ids[::-1]
+
+    res = await api_create_posts([])
+    assert res.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_get_post_conditional(
+    client: AsyncClient,
+    session: AsyncSession,
+    api_login: Callable[[dict[str, str]], Coroutine[Any, Any, Response]],
+    api_create_post: Callable[[PostCreate], Coroutine[Any, Any, Response]],
+) -> None:
+    user = UserCreate(username="conditional", password="password")
+    await create_user(session, data_in=user)
+    await session.commit()
+    await api_login({"username": user.username, "password": user.password.get_secret_value()})
+    post_id = (await api_create_post(PostCreate(content="Post"))).json()["id"]
+
+    res = await client.get(f"/posts/{post_id}")
+    assert res.status_code == 200
+    etag, last_modified = res.headers["ETag"], res.headers["Last-Modified"]
+    assert etag.startswith('W/"')
+
+    res = await client.get(f"/posts/{post_id}", headers={"If-None-Match": etag})
+    assert res.status_code == 304
+    assert res.content == b""
+    assert res.headers["ETag"] == etag
+
+    res = await client.get(f"/posts/{post_id}", headers={"If-Modified-Since": last_modified})
+    assert res.status_code == 304
+
+    res = await client.get(f"/posts/{post_id}", headers={"If-None-Match": 'W/"other"'})
+    assert res.status_code == 200
+
+    res = await client.get("/posts", params={"username": user.username})
+    assert "Last-Modified" not in res.headers
+    res = await client.get(
+        "/posts", params={"username": user.username}, headers={"If-None-Match": res.headers["ETag"]}
+    )
+    assert res.status_code == 304
+
+
+@pytest.mark.asyncio
+async def test_search_posts(
+    client: AsyncClient,
+    session: AsyncSession,
+    api_login: Callable[[dict[str, str]], Coroutine[Any, Any, Response]],
+    api_create_post: Callable[[PostCreate], Coroutine[Any, Any, Response]],
+    api_block_user: Callable[[str], Coroutine[Any, Any, Response]],
+    api_search_posts: Callable[..., Coroutine[Any, Any, Response]],
+) -> None:
+    reader, author, blocked = (
+        UserCreate(username=username, password="password")
+        for username in ("reader", "author", "blocked")
+    )
+    for user in (reader, author, blocked):
+        await create_user(session, data_in=user)
+    await session.commit()
+
+    await api_login({"username": author.username, "password": "password"})
+    for content in ("The quick brown fox", "Foxes chasing a fox", "A lazy dog"):
+        assert (await api_create_post(PostCreate(content=content))).status_code == 201
+    await api_login({"username": blocked.username, "password": "password"})
+    assert (await api_create_post(PostCreate(content="A fox, blocked"))).status_code == 201
+
+    client.headers.pop("Authorization")
+    res = await api_search_posts("fox", limit=2)
+    assert res.status_code == 200
+    # Both terms of the second post match, it ranks first
+    assert [post["content"] for post in res.json()["items"]] == [
+        "Foxes chasing a fox",
+        de.AnyThing,
+    ]
+    assert res.json()["items"][0] == de.IsPartialDict(
+        user=de.IsPartialDict(username=author.username)
+    )
+    res = await api_search_posts("fox", limit=2, cursor=res.json()["next_cursor"])
+    assert res.json() == {
+        "items": de.IsList(de.IsPartialDict(content="The quick brown fox")),
+        "next_cursor": None,
+    }
+
+    res = await api_search_posts("fox -quick", username=author.username)
+    assert [post["content"] for post in res.json()["items"]] == ["Foxes chasing a fox"]
+
+    await api_login({"username": reader.username, "password": "password"})
+    await api_block_user(blocked.username)
+    res = await api_search_posts("fox")
+    assert {post["user"]["username"] for post in res.json()["items"]} == {author.username}
+
+    assert (await api_search_posts("")).status_code == 422
+    assert (await api_search_posts("fox", cursor="invalid")).status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_search_candidates(session: AsyncSession, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(services, "SEARCH_MAX_CANDIDATES", 3)
+    monkeypatch.setattr(services, "SEARCH_SCAN_WINDOW", 4)
+    user = await create_user(session, data_in=UserCreate(username="test", password="password"))
+    contents = ["fox", "fox", "fox dog", "fox", "dog", "dog cat", "dog", "dog"]
+    post_ids = await services.create_posts(
+        session, data_in=[PostCreate(content=content) for content in contents], user=user
+    )
+    await session.commit()
+
+    async def search(query: str) -> set[int]:
+        results = await services.search_posts(session, query=query, limit=10)
+        return {post.id for _, post in results}
+
+    # Rare queries are answered by the index alone
+    assert await search("cat") == {post_ids[5]}
+    assert await search("fox dog") == {post_ids[2]}
+    # Common ones by the newest posts, then by the older ones when they hold too few
+    assert await search("dog") == set(post_ids[5:])
+    assert await search("fox") == set(post_ids[1:4])
+    assert await search("cat or fox") == {post_ids[5], post_ids[3], post_ids[2]}
@@ -0,0 +1,164 @@
+import asyncio
+from collections.abc import Callable
+
+import pytest
+from aster.api import create_app
+from aster.auth.schemas import UserCreate
+from aster.auth.services import create_user
+from aster.cache import (
+    RESPONSE_KEY_PREFIX,
+    TAG_KEY_PREFIX,
+    LocalCache,
+    RedisCache,
+    ResponseCacheOptions,
+)
+from aster.models import Post
+from fastapi import Request, Response
+from httpx import AsyncClient
+from prometheus_client import REGISTRY
+from redis.asyncio import Redis
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.types import Receive, Scope, Send
+
+
+def build_request(path: str) -> Request:
+    return Request(
+        {"type": "http", "method": "GET", "path": path, "query_string": b"", "headers": []}
+    )
+
+
+def get_evictions(reason: str) -> float:
+    value = REGISTRY.get_sample_value("aster_cache_local_evictions_total", {"reason": reason})
+    return value or 0.0
+
+
+@pytest.mark.asyncio
+async def test_local_cache() -> None:
+    capacity_evictions = get_evictions("capacity")
+    cache = LocalCache(max_entries=3, max_bytes=10, ttl=60)
+    for key in ("a", "b", "c"):
+        cache.set(key, b"12")
+    assert (len(cache), cache.size) == (3, 6)
+
+    # Least recently used entries are evicted first, by count and by size
+    assert cache.get("a") == b"12"
+    cache.set("d", b"12")
+    assert cache.get("b") is None
+    cache.set("e", b"1234567")
+    assert [key in cache for key in "acde"] == [False, False, True, True]
+    assert (len(cache), cache.size) == (2, 9)
+    assert get_evictions("capacity") == capacity_evictions + 3
+
+    # Values over the budget are not kept, and do not leave the previous one behind
+    cache.set("d", b"12345678901")
+    assert cache.get("d") is None
+    assert (len(cache), cache.size) == (1, 7)
+
+    invalidated_evictions = get_evictions("invalidated")
+    cache.delete("e", "missing")
+    assert (len(cache), cache.size) == (0, 0)
+    assert get_evictions("invalidated") == invalidated_evictions + 1
+
+
+@pytest.mark.asyncio
+async def test_local_cache_ttl() -> None:
+    expired_evictions = get_evictions("expired")
+    cache = LocalCache(ttl=0.05)
+    cache.set("a", b"1")
+    cache.set("b", b"1", ttl=60)
+    cache.set("c", b"1", ttl=0.01)
+    assert "a" in cache
+    await asyncio.sleep(0.02)
+    # Entries expire after their own TTL, capped by the cache one
+    assert "a" in cache and "c" not in cache
+    await asyncio.sleep(0.05)
+    assert cache.get("a") is None and cache.get("b") is None
+    assert get_evictions("expired") == expired_evictions + 2
+    assert cache.size == 1
+
+
+@pytest.mark.asyncio
+async def test_cached_endpoints(
+    session: AsyncSession, redis: Redis, redis_cache: Callable[..., RedisCache]
+) -> None:
+    app = create_app()
+    cache = redis_cache()
+
+    async def app_with_cache(scope: Scope, receive: Receive, send: Send) -> None:
+        scope["state"] = {"cache": cache}
+        await app(scope, receive, send)
+
+    await create_user(session, data_in=UserCreate(username="test", password="password"))
+    await session.commit()
+    async with AsyncClient(app=app_with_cache, base_url="http://testserver") as client:
+        client.headers["Accept-Encoding"] = "identity"
+        res = await client.post("/login", data={"username": "test", "password": "password"})
+        client.headers["Authorization"] = f"Bearer {res.json()['access_token']}"
+        post_id = (await client.post("/posts", json={"content": "Post"})).json()["id"]
+
+        res = await client.get(f"/posts/{post_id}")
+        assert res.status_code == 200
+        assert await redis.smembers(f"{TAG_KEY_PREFIX}post:{post_id}") == {
+            f"{RESPONSE_KEY_PREFIX}/posts/{post_id}".encode()
+        }
+
+        # Hits replay the status, headers and body of the cached response
+        post = await session.get_one(Post, post_id)
+        post.content = "Changed"
+        await session.commit()
+        hit = await client.get(f"/posts/{post_id}")
+        assert hit.status_code == 200
+        assert hit.json()["content"] == "Post"
+        for header in ("Content-Type", "ETag", "Last-Modified"):
+            assert hit.headers[header] == res.headers[header]
+        hit = await client.get(
+            f"/posts/{post_id}", headers={"If-None-Match": res.headers["ETag"]}
+        )
+        assert hit.status_code == 304
+
+        # Writes invalidate the responses tagged with what they changed
+        res = await client.get("/posts", params={"username": "test"})
+        assert len(res.json()["items"]) == 1
+        await client.post("/posts", json={"content": "Other post"})
+        res = await client.get("/posts", params={"username": "test"})
+        assert len(res.json()["items"]) == 2
+
+        assert (await client.delete(f"/posts/{post_id}")).status_code == 204
+        assert (await client.get(f"/posts/{post_id}")).status_code == 404
+        # Errors are not cached
+        assert not await redis.exists(f"{RESPONSE_KEY_PREFIX}/posts/{post_id}")
+
+
+@pytest.mark.asyncio
+async def test_cached_response(redis: Redis, redis_cache: Callable[..., RedisCache]) -> None:
+    cache = redis_cache()
+    options = ResponseCacheOptions(expiration=30, tags=("tag:{id}",))
+    calls = 0
+
+    async def call_next(request: Request) -> Response:
+        nonlocal calls
+        calls += 1
+        status_code = 404 if request.url.path == "/missing" else 200
+        return Response(b"body", status_code, headers={"X-Custom": "value"})
+
+    request = build_request("/found")
+    request.scope["path_params"] = {"id": "1"}
+    for _ in range(2):
+        response = await cache.cached_response(request, options, call_next, "gzip")
+        assert (response.status_code, response.body) == (200, b"body")
+        assert response.headers["X-Custom"] == "value"
+    assert calls == 1
+    assert 0 < await redis.ttl(f"{RESPONSE_KEY_PREFIX}/found:gzip") <= 30
+    # Responses are cached per encoding
+    await cache.cached_response(request, options, call_next)
+    assert calls == 2
+
+    for _ in range(2):
+        response = await cache.cached_response(build_request("/missing"), options, call_next)
+        assert response.status_code == 404
+    assert calls == 4
+
+    await cache.invalidate_tags("tag:1")
+    assert await redis.keys("*") == []
+    await cache.cached_response(request, options, call_next, "gzip")
+    assert calls == 5
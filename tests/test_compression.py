@@ -0,0 +1,58 @@
+import gzip
+
+import pytest
+from aster.api import create_app, lifespan
+from aster.auth.schemas import UserCreate
+from aster.auth.services import create_user
+from aster.compression import get_response_compressor, negotiate_encoding
+from aster.posts.schemas import PostCreate
+from aster.posts.services import create_posts
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+def test_negotiate_encoding() -> None:
+    encodings = ["zstd", "br", "gzip"]
+    assert negotiate_encoding("gzip, deflate, br", encodings) == "br"
+    assert negotiate_encoding("gzip;q=1.0, br;q=0.5", encodings) == "gzip"
+    assert negotiate_encoding("br;q=0, *", encodings) == "zstd"
+    assert negotiate_encoding("deflate", encodings) is None
+    assert negotiate_encoding("identity, gzip;q=0", encodings) is None
+
+
+@pytest.mark.asyncio
+async def test_compressed_response(client: AsyncClient, session: AsyncSession) -> None:
+    user = await create_user(
+        session, data_in=UserCreate(username="compressed", password="password")
+    )
+    await create_posts(
+        session, data_in=[PostCreate(content="Post " * 50) for _ in range(10)], user=user
+    )
+    await session.commit()
+
+    async with client.stream(
+        "GET", "/posts", params={"username": "compressed"}, headers={"Accept-Encoding": "gzip"}
+    ) as res:
+        raw = b"".join([chunk async for chunk in res.aiter_raw()])
+    assert res.headers["Content-Encoding"] == "gzip"
+    assert res.headers["Vary"] == "Accept-Encoding"
+    assert int(res.headers["Content-Length"]) == len(raw) < 1000
+    assert len(gzip.decompress(raw)) > 2500
+
+    res = await client.get(
+        "/posts", params={"username": "compressed"}, headers={"Accept-Encoding": "identity"}
+    )
+    assert "Content-Encoding" not in res.headers
+    assert len(res.content) > 2500
+
+
+@pytest.mark.asyncio
+async def test_lifespan_closes_executor() -> None:
+    compressor = get_response_compressor()
+    assert compressor is not None
+    async with lifespan(create_app()):
+        pass
+    with pytest.raises(RuntimeError):
+        compressor.executor.submit(print)
+    # A later application gets a new executor
+    assert get_response_compressor() is not compressor
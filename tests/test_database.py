@@ -0,0 +1,130 @@
+import asyncio
+from collections.abc import Callable
+from typing import Any
+
+import pytest
+from aster import database
+from aster.api import create_app
+from aster.auth.dependencies import get_token_subject
+from aster.auth.schemas import UserCreate
+from aster.auth.services import create_user
+from aster.cache import RedisCache
+from aster.config import get_settings
+from aster.database import ReplicaSelector, WriteTracker, get_read_session, get_session
+from fastapi import Request
+from httpx import AsyncClient
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from starlette.types import Receive, Scope, Send
+
+
+def identify_user(request: Request) -> str | None:
+    return request.headers.get("X-User")
+
+
+def build_request(host: str = "127.0.0.1", user: str | None = None, **state: Any) -> Request:
+    headers = [(b"x-user", user.encode())] if user else []
+    state = {"identify_user": identify_user, **state}
+    return Request({"type": "http", "headers": headers, "client": (host, 1234), "state": state})
+
+
+@pytest.mark.asyncio
+async def test_replica_selector() -> None:
+    engines = [create_async_engine(str(get_settings().sqlalchemy_database_url)) for _ in range(2)]
+    try:
+        assert ReplicaSelector([]).select() is None
+        selector = ReplicaSelector(engines)
+        assert [selector.select() for _ in range(3)] == [engines[0], engines[1], engines[0]]
+
+        selector = ReplicaSelector(engines, "least_connections")
+        async with engines[0].connect():
+            assert selector.select() is engines[1]
+        async with engines[1].connect():
+            assert selector.select() is engines[0]
+    finally:
+        for engine in engines:
+            await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_write_tracker(redis_cache: Callable[..., RedisCache]) -> None:
+    write_tracker = WriteTracker(window=60)
+
+    # Writes are remembered for the user, whatever the credentials or the address
+    await write_tracker.mark(build_request(user="1"))
+    assert await write_tracker.wrote_recently(build_request("10.0.0.1", user="1"))
+    assert not await write_tracker.wrote_recently(build_request(user="2"))
+    assert not await write_tracker.wrote_recently(build_request())
+    # Anonymous clients are identified by their address
+    await write_tracker.mark(build_request())
+    assert await write_tracker.wrote_recently(build_request())
+    assert not await write_tracker.wrote_recently(build_request("10.0.0.1"))
+
+    # Writes are shared with the other instances through the cache
+    cache = redis_cache()
+    await write_tracker.mark(build_request(cache=cache, user="3"))
+    assert await WriteTracker(window=60).wrote_recently(build_request(cache=cache, user="3"))
+
+    write_tracker = WriteTracker(window=0.01)
+    await write_tracker.mark(build_request(user="1"))
+    await asyncio.sleep(0.02)
+    assert not await write_tracker.wrote_recently(build_request(user="1"))
+
+
+@pytest.mark.asyncio
+async def test_read_session(monkeypatch: pytest.MonkeyPatch) -> None:
+    replica = create_async_engine(str(get_settings().sqlalchemy_database_url))
+    monkeypatch.setattr(database, "replica_engines", [replica])
+    monkeypatch.setattr(database, "replica_selector", ReplicaSelector([replica]))
+    monkeypatch.setattr(database, "write_tracker", WriteTracker(window=60))
+
+    async def get_read_session_bind(request: Request) -> Any:
+        async for session in get_read_session(request):
+            bind = session.bind
+        return bind
+
+    try:
+        assert await get_read_session_bind(build_request(user="1")) is replica
+
+        # Sessions which only read do not make the client sticky
+        async for session in get_session(build_request(user="1")):
+            await session.execute(select(1))
+        assert await get_read_session_bind(build_request(user="1")) is replica
+
+        async for session in get_session(build_request(user="1")):
+            await create_user(session, data_in=UserCreate(username="test", password="password"))
+        assert await get_read_session_bind(build_request("10.0.0.1", user="1")) is not replica
+        assert await get_read_session_bind(build_request(user="2")) is replica
+    finally:
+        await replica.dispose()
+
+
+@pytest.mark.asyncio
+async def test_read_your_writes(session: AsyncSession, monkeypatch: pytest.MonkeyPatch) -> None:
+    # Sees the committed rows only, unlike the test session: rows of the test lag behind
+    replica = create_async_engine(str(get_settings().sqlalchemy_database_url))
+    monkeypatch.setattr(database, "replica_engines", [replica])
+    monkeypatch.setattr(database, "replica_selector", ReplicaSelector([replica]))
+    monkeypatch.setattr(database, "write_tracker", WriteTracker(window=60))
+    app = create_app()
+
+    async def app_with_identify_user(scope: Scope, receive: Receive, send: Send) -> None:
+        scope["state"] = {"identify_user": get_token_subject}
+        await app(scope, receive, send)
+
+    await create_user(session, data_in=UserCreate(username="test", password="password"))
+    await session.commit()
+    try:
+        async with AsyncClient(app=app_with_identify_user, base_url="http://testserver") as client:
+            res = await client.post("/login", data={"username": "test", "password": "password"})
+            headers = {"Authorization": f"Bearer {res.json()['access_token']}"}
+            res = await client.post("/posts", json={"content": "Post"}, headers=headers)
+            assert res.status_code == 201
+
+            # Endpoints which do not authenticate read the writes of the token user too
+            res = await client.get("/posts", params={"username": "test"}, headers=headers)
+            assert len(res.json()["items"]) == 1
+            res = await client.get("/posts", params={"username": "test"})
+            assert res.json()["items"] == []
+    finally:
+        await replica.dispose()
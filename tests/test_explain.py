@@ -0,0 +1,10 @@
+import pytest
+from aster.explain import explain_services, missing_scenarios
+
+
+@pytest.mark.asyncio
+async def test_services_query_plans() -> None:
+    assert missing_scenarios() == []
+    plans = await explain_services()
+    assert plans
+    assert {plan.service: plan.seq_scans for plan in plans if plan.seq_scans} == {}
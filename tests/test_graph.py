@@ -0,0 +1,186 @@
+import hashlib
+from collections.abc import Callable
+
+import orjson
+import pytest
+import strawberry
+from aster.api import create_app
+from aster.auth.schemas import UserCreate
+from aster.auth.services import create_user
+from aster.cache import RedisCache
+from aster.graph_cache import (
+    PERSISTED_QUERY_KEY_PREFIX,
+    RESULT_KEY_PREFIX,
+    cache_ttl,
+    get_result_ttl,
+    sha256,
+)
+from aster.posts.schemas import PostCreate
+from aster.posts.services import create_post
+from aster.profiler import query_budget
+from graphql import parse
+from httpx import AsyncClient
+from redis.asyncio import Redis
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+POSTS_QUERY = """
+query Posts($username: String!, $after: String) {
+  posts(username: $username, first: 2, after: $after) {
+    items {
+      content
+      user {
+        username
+        posts(first: 1) { content user { username } }
+      }
+    }
+    nextCursor
+  }
+}
+"""
+
+
+def create_app_with_cache(cache: RedisCache) -> ASGIApp:
+    app = create_app()
+
+    async def app_with_cache(scope: Scope, receive: Receive, send: Send) -> None:
+        scope["state"] = {"cache": cache}
+        await app(scope, receive, send)
+
+    return app_with_cache
+
+
+@pytest.mark.asyncio
+async def test_posts_batched(client: AsyncClient, session: AsyncSession) -> None:
+    users = [
+        await create_user(session, data_in=UserCreate(username=f"graph{i}", password="password"))
+        for i in range(2)
+    ]
+    for i in range(3):
+        for user in users:
+            await create_post(session, data_in=PostCreate(content=f"Post {i}"), user=user)
+    await session.commit()
+
+    with query_budget(2):
+        res = await client.post(
+            "/graphql", json={"query": POSTS_QUERY, "variables": {"username": "graph0"}}
+        )
+    data = res.json()["data"]["posts"]
+    assert [item["content"] for item in data["items"]] == ["Post 2", "Post 1"]
+    assert data["items"][0]["user"] == {
+        "username": "graph0",
+        "posts": [{"content": "Post 2", "user": {"username": "graph0"}}],
+    }
+
+    res = await client.post(
+        "/graphql",
+        json={
+            "query": POSTS_QUERY,
+            "variables": {"username": "graph0", "after": data["nextCursor"]},
+        },
+    )
+    data = res.json()["data"]["posts"]
+    assert [item["content"] for item in data["items"]] == ["Post 0"]
+    assert data["nextCursor"] is None
+
+
+@pytest.mark.asyncio
+async def test_persisted_queries(client: AsyncClient, session: AsyncSession) -> None:
+    await create_user(session, data_in=UserCreate(username="graph", password="password"))
+    await session.commit()
+    query = 'query { user(username: "graph") { username } }'
+    extensions = {
+        "persistedQuery": {"version": 1, "sha256Hash": hashlib.sha256(query.encode()).hexdigest()}
+    }
+
+    res = await client.post("/graphql", json={"extensions": extensions})
+    assert res.json()["errors"][0]["message"] == "PersistedQueryNotFound"
+
+    res = await client.post("/graphql", json={"query": query, "extensions": extensions})
+    assert res.json() == {"data": {"user": {"username": "graph"}}}
+
+    res = await client.post("/graphql", json={"extensions": extensions})
+    assert res.json() == {"data": {"user": {"username": "graph"}}}
+
+    res = await client.get("/graphql", params={"extensions": orjson.dumps(extensions).decode()})
+    assert res.json() == {"data": {"user": {"username": "graph"}}}
+
+    res = await client.post("/graphql", json={"query": "{ __typename }", "extensions": extensions})
+    assert res.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_cached_results(
+    session: AsyncSession, redis: Redis, redis_cache: Callable[..., RedisCache]
+) -> None:
+    await create_user(session, data_in=UserCreate(username="graph", password="password"))
+    await session.commit()
+    app = create_app_with_cache(redis_cache())
+    async with AsyncClient(app=app, base_url="http://testserver") as client:
+        variables = {"username": "graph"}
+        res = await client.post("/graphql", json={"query": POSTS_QUERY, "variables": variables})
+        assert res.json()["data"]["posts"] == {"items": [], "nextCursor": None}
+        with query_budget(0):
+            hit = await client.post("/graphql", json={"query": POSTS_QUERY, "variables": variables})
+        assert hit.json() == res.json()
+        # Results expire with the smallest TTL of their fields
+        (key,) = await redis.keys(f"{RESULT_KEY_PREFIX}*")
+        assert 0 < await redis.ttl(key) <= 10
+
+        # Results are cached per variables
+        res = await client.post(
+            "/graphql", json={"query": POSTS_QUERY, "variables": {"username": "other"}}
+        )
+        assert len(await redis.keys(f"{RESULT_KEY_PREFIX}*")) == 2
+
+        # Mutations are never cached
+        mutation = 'mutation { login(username: "graph", password: "password") { __typename } }'
+        for _ in range(2):
+            res = await client.post("/graphql", json={"query": mutation})
+            assert res.json() == {"data": {"login": {"__typename": "LoginSuccess"}}}
+        assert len(await redis.keys(f"{RESULT_KEY_PREFIX}*")) == 2
+
+
+def test_result_ttl() -> None:
+    @strawberry.type
+    class Query:
+        @strawberry.field(metadata=cache_ttl(30))
+        def cached(self) -> int:
+            return 1
+
+        @strawberry.field(metadata=cache_ttl(10))
+        def shorter(self) -> int:
+            return 1
+
+        @strawberry.field
+        def uncached(self) -> int:
+            return 1
+
+    schema = strawberry.Schema(Query)._schema
+    assert get_result_ttl(schema, parse("{ cached }")) == 30
+    assert get_result_ttl(schema, parse("{ cached shorter }")) == 10
+    # Every root field must declare a TTL
+    assert get_result_ttl(schema, parse("{ cached uncached }")) is None
+    assert get_result_ttl(schema, parse("{ __typename }")) is None
+
+
+@pytest.mark.asyncio
+async def test_persisted_queries_shared(
+    session: AsyncSession, redis: Redis, redis_cache: Callable[..., RedisCache]
+) -> None:
+    user = await create_user(session, data_in=UserCreate(username="graph", password="password"))
+    await session.commit()
+    query = 'query { user(username: "graph") { id } }'
+    extensions = {"persistedQuery": {"version": 1, "sha256Hash": sha256(query)}}
+
+    # Queries registered on an instance are run by the others
+    async with (
+        AsyncClient(app=create_app_with_cache(redis_cache()), base_url="http://testserver") as a,
+        AsyncClient(app=create_app_with_cache(redis_cache()), base_url="http://testserver") as b,
+    ):
+        res = await a.post("/graphql", json={"query": query, "extensions": extensions})
+        assert res.json() == {"data": {"user": {"id": str(user.id)}}}
+        assert await redis.exists(PERSISTED_QUERY_KEY_PREFIX + sha256(query))
+
+        res = await b.post("/graphql", json={"extensions": extensions})
+        assert res.json() == {"data": {"user": {"id": str(user.id)}}}
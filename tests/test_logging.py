@@ -0,0 +1,107 @@
+import io
+import threading
+
+import pytest
+from aster.logging import LogBuffer
+from prometheus_client import REGISTRY
+
+
+def get_dropped(policy: str) -> float:
+    value = REGISTRY.get_sample_value("aster_log_records_dropped_total", {"policy": policy})
+    return value or 0.0
+
+
+def test_log_buffer_batches() -> None:
+    output = io.BytesIO()
+    buffer = LogBuffer(output, capacity=10, batch_size=2, flush_interval=0.01)
+    buffer.start()
+    for i in range(5):
+        buffer.put(b"%d" % i)
+    buffer.close()
+    assert output.getvalue() == b"0\n1\n2\n3\n4\n"
+
+
+def test_log_buffer_drop_oldest() -> None:
+    output = io.BytesIO()
+    buffer = LogBuffer(output, capacity=3, overflow="drop_oldest")
+    for i in range(5):
+        buffer.put(b"%d" % i)
+    buffer.flush()
+    assert output.getvalue() == b"2\n3\n4\n"
+    assert buffer.dropped == 2
+
+
+def test_log_buffer_sample() -> None:
+    buffer = LogBuffer(io.BytesIO(), capacity=100, overflow="sample")
+    for i in range(1000):
+        buffer.put(b"%d" % i)
+    assert 50 <= len(buffer) <= 100
+    assert buffer.dropped == 1000 - len(buffer)
+
+
+class SlowOutput(io.BytesIO):
+    def __init__(self) -> None:
+        super().__init__()
+        self.writable_event = threading.Event()
+
+    def write(self, data: bytes) -> int:  # type: ignore[override]
+        self.writable_event.wait()
+        return super().write(data)
+
+
+def test_log_buffer_block() -> None:
+    output = SlowOutput()
+    buffer = LogBuffer(output, capacity=2, batch_size=1, overflow="block", block_timeout=10)
+    buffer.start()
+
+    def produce() -> None:
+        for i in range(6):
+            buffer.put(b"%d" % i)
+
+    producer = threading.Thread(target=produce)
+    producer.start()
+    producer.join(0.1)
+    assert producer.is_alive()
+    output.writable_event.set()
+    producer.join()
+    buffer.close()
+    assert output.getvalue() == b"0\n1\n2\n3\n4\n5\n"
+    assert buffer.dropped == 0
+
+
+def test_log_buffer_block_timeout() -> None:
+    dropped = get_dropped("drop_oldest"), get_dropped("block")
+    output = SlowOutput()
+    buffer = LogBuffer(output, capacity=2, batch_size=1, overflow="block", block_timeout=0.01)
+    buffer.start()
+
+    # Records are dropped once the writer did not make room in time
+    for i in range(6):
+        buffer.put(b"%d" % i)
+    assert buffer.dropped > 0
+    output.writable_event.set()
+    buffer.close()
+    assert output.getvalue().endswith(b"4\n5\n")
+    assert (get_dropped("drop_oldest"), get_dropped("block")) == (
+        dropped[0] + buffer.dropped,
+        dropped[1],
+    )
+
+    # Without a writer the records would never make room
+    buffer = LogBuffer(io.BytesIO(), capacity=2, overflow="block", block_timeout=10)
+    for i in range(4):
+        buffer.put(b"%d" % i)
+    assert buffer.dropped == 2
+
+
+@pytest.mark.asyncio
+async def test_log_buffer_block_event_loop() -> None:
+    output = SlowOutput()
+    buffer = LogBuffer(output, capacity=2, batch_size=1, overflow="block", block_timeout=10)
+    buffer.start()
+    # The event loop never waits for the writer
+    for i in range(6):
+        buffer.put(b"%d" % i)
+    assert buffer.dropped > 0
+    output.writable_event.set()
+    buffer.close()
@@ -0,0 +1,47 @@
+import pytest
+import structlog
+from asgiref.typing import ASGIReceiveCallable, ASGISendCallable, Scope
+from aster.middlewares import ObservabilityMiddleware
+from httpx import AsyncClient
+from structlog.testing import capture_logs
+
+
+async def app(scope: Scope, receive: ASGIReceiveCallable, send: ASGISendCallable) -> None:
+    await send({"type": "http.response.start", "status": 204, "headers": [], "trailers": False})
+    await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+@pytest.mark.asyncio
+async def test_observability_middleware() -> None:
+    middleware = ObservabilityMiddleware(app, logger=structlog.get_logger())
+    with capture_logs() as logs:
+        async with AsyncClient(app=middleware, base_url="http://testserver") as client:
+            res = await client.get("/")
+    assert res.status_code == 204
+    assert len(res.headers["X-Request-ID"]) == 32
+    assert logs == [
+        {
+            "event": "HTTP Request",
+            "log_level": "info",
+            "status": 204,
+            "process_time": pytest.approx(0, abs=1),
+            "sql_queries_count": 0,
+            "sql_queries_time_spent": 0,
+        }
+    ]
+
+
+@pytest.mark.asyncio
+async def test_observability_middleware_disabled() -> None:
+    middleware = ObservabilityMiddleware(
+        app,
+        logger=structlog.get_logger(),
+        correlation_id_header=None,
+        timing=False,
+        access_log=False,
+    )
+    with capture_logs() as logs:
+        async with AsyncClient(app=middleware, base_url="http://testserver") as client:
+            res = await client.get("/")
+    assert "X-Request-ID" not in res.headers
+    assert logs == []
@@ -0,0 +1,98 @@
+import pytest
+import structlog
+from aster import profiler
+from aster.api import create_app
+from aster.auth.schemas import UserCreate
+from aster.auth.services import create_user
+from aster.config import get_settings
+from aster.middlewares import ObservabilityMiddleware
+from aster.profiler import (
+    OTHER_FINGERPRINTS,
+    QueryBudgetExceeded,
+    collect_queries,
+    fingerprint,
+    fingerprint_label,
+    normalize_statement,
+    query_budget,
+)
+from httpx import AsyncClient
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from structlog.testing import capture_logs
+
+
+def test_normalize_statement() -> None:
+    assert (
+        normalize_statement(
+            "SELECT user_.id FROM user_\n"
+            " WHERE user_.id IN (%(id_1_1)s::INTEGER, %(id_1_2)s::INTEGER)"
+            " AND user_.username = 'it''s' LIMIT 10"
+        )
+        == "SELECT user_.id FROM user_ WHERE user_.id IN (?) AND user_.username = ? LIMIT ?"
+    )
+    assert fingerprint("SELECT 1 WHERE id IN (%s)") == fingerprint("SELECT 2 WHERE id IN (%s, %s)")
+
+
+
+def test_fingerprint_label(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(profiler, "_labelled_fingerprints", set())
+    monkeypatch.setattr(get_settings(), "database_query_fingerprint_labels", 1)
+    assert fingerprint_label("a") == "a"
+    assert fingerprint_label("b") == OTHER_FINGERPRINTS
+    assert fingerprint_label("a") == "a"
+
+
+@pytest.mark.asyncio
+async def test_collect_queries(session: AsyncSession) -> None:
+    with collect_queries("/test") as stats:
+        for i in range(3):
+            await session.execute(text("SELECT :value"), {"value": i})
+    assert stats.count == 3
+    assert list(stats.fingerprints.values()) == [3]
+    # Statements are only kept when asked, e.g. by budgets
+    assert stats.statements == []
+    with collect_queries(keep_statements=True) as stats:
+        await session.execute(text("SELECT 1"))
+    assert stats.statements == ["SELECT 1"]
+
+
+@pytest.mark.asyncio
+async def test_query_budget(client: AsyncClient, session: AsyncSession) -> None:
+    await create_user(session, data_in=UserCreate(username="budget", password="password"))
+    await session.commit()
+
+    with query_budget(1):
+        res = await client.get("/users/budget")
+    assert res.status_code == 200
+
+    with pytest.raises(QueryBudgetExceeded), query_budget(0):
+        await client.get("/users/budget")
+
+
+@pytest.mark.asyncio
+async def test_request_queries_logged() -> None:
+    # GraphQL is served by its own routes, statements are collected around every request
+    app = ObservabilityMiddleware(create_app(), logger=structlog.get_logger())
+    with capture_logs() as logs:
+        async with AsyncClient(app=app, base_url="http://testserver") as client:
+            res = await client.post(
+                "/graphql", json={"query": '{ posts(username: "test") { items { id } } }'}
+            )
+    assert res.status_code == 200
+    assert logs[-1]["sql_queries_count"] >= 1
+
+
+@pytest.mark.asyncio
+async def test_query_logs_route(
+    client: AsyncClient, session: AsyncSession, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    await create_user(session, data_in=UserCreate(username="route", password="password"))
+    await session.commit()
+    monkeypatch.setattr(get_settings(), "database_slow_query_threshold", 0.0)
+    with capture_logs() as logs:
+        res = await client.get("/users/route")
+    assert res.status_code == 200
+    # Statements are logged with the template of the route rather than the path
+    slow_queries = [log for log in logs if log["event"] == "Slow query"]
+    assert slow_queries
+    assert {log["route"] for log in slow_queries} == {"/users/{username}"}
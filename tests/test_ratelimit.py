@@ -0,0 +1,90 @@
+from datetime import datetime, timedelta
+
+import pytest
+from aster.api import create_app
+from aster.auth.dependencies import get_token_subject
+from aster.config import get_settings
+from aster.ratelimit import RateLimit, RateLimiter
+from fastapi import Request
+from httpx import AsyncClient
+from jose import jwt
+from starlette.types import Receive, Scope, Send
+
+
+def build_request(token: str | None = None, host: str = "127.0.0.1") -> Request:
+    headers = [(b"authorization", f"Bearer {token}".encode())] if token else []
+    return Request({"type": "http", "headers": headers, "client": (host, 1234)})
+
+
+def create_token(sub: str, secret_key: str | None = None, **claims: datetime) -> str:
+    settings = get_settings()
+    claims.setdefault("exp", datetime.utcnow() + timedelta(minutes=1))
+    return jwt.encode(
+        {"sub": sub, **claims},
+        secret_key or settings.secret_key,
+        algorithm=settings.algorithm,
+    )
+
+
+@pytest.mark.asyncio
+async def test_rate_limiter() -> None:
+    limiter = RateLimiter()
+    rate_limit = RateLimit(3, 60)
+    results = [await limiter.hit("test", rate_limit) for _ in range(4)]
+    assert [result.allowed for result in results] == [True, True, True, False]
+    assert [result.remaining for result in results] == [2, 1, 0, 0]
+    assert results[-1].headers == {
+        "RateLimit-Limit": "3",
+        "RateLimit-Remaining": "0",
+        "RateLimit-Reset": "60",
+        "RateLimit-Policy": "3;w=60",
+        "Retry-After": "20",
+    }
+    assert (await limiter.hit("other", rate_limit)).allowed
+
+
+
+def test_rate_limit_key() -> None:
+    limiter = RateLimiter(identify_user=get_token_subject)
+    rate_limit = RateLimit(3, 60, key="user")
+
+    # Every token of a user shares its limit, whatever the address
+    key = limiter.build_key(build_request(create_token("test")), rate_limit, "scope")
+    assert key == "scope:user:test"
+    other_token = create_token("test", iat=datetime.utcnow() - timedelta(seconds=1))
+    assert limiter.build_key(build_request(other_token, "10.0.0.1"), rate_limit, "scope") == key
+
+    # Tokens which do not verify are counted by address
+    for token in (
+        create_token("other", secret_key="forged"),
+        create_token("test", exp=datetime.utcnow() - timedelta(minutes=1)),
+        "invalid",
+        None,
+    ):
+        assert limiter.build_key(build_request(token), rate_limit, "scope") == "scope:ip:127.0.0.1"
+    assert limiter.build_key(
+        build_request(create_token("test")), RateLimit(3, 60, scope="shared"), "scope"
+    ) == "shared:ip:127.0.0.1"
+
+
+@pytest.mark.asyncio
+async def test_rate_limited_endpoint() -> None:
+    app = create_app()
+    limiter = RateLimiter()
+
+    async def app_with_limiter(scope: Scope, receive: Receive, send: Send) -> None:
+        scope["state"] = {"rate_limiter": limiter}
+        await app(scope, receive, send)
+
+    async with AsyncClient(app=app_with_limiter, base_url="http://testserver") as client:
+        for i in range(5):
+            res = await client.post(
+                "/users/register", json={"username": f"limited{i}", "password": "password"}
+            )
+            assert res.status_code == 201
+            assert res.headers["RateLimit-Remaining"] == str(4 - i)
+        res = await client.post(
+            "/users/register", json={"username": "limited", "password": "password"}
+        )
+    assert res.status_code == 429
+    assert 0 < int(res.headers["Retry-After"]) <= 12
@@ -0,0 +1,45 @@
+from aster.config import get_settings
+from aster.routes import REDACTED, capture_body
+from fastapi import Request
+from starlette.datastructures import FormData
+
+
+def make_request(body: bytes, content_type: str, method: str = "POST") -> Request:
+    request = Request(
+        {
+            "type": "http",
+            "method": method,
+            "path": "/",
+            "headers": [
+                (b"content-type", content_type.encode()),
+                (b"content-length", str(len(body)).encode()),
+            ],
+        }
+    )
+    request._body = body
+    return request
+
+
+def test_capture_body() -> None:
+    settings = get_settings().model_copy()
+    request = make_request(b'{"username": "test", "password": "secret"}', "application/json")
+    assert capture_body(request, settings) == {"username": "test", "password": REDACTED}
+
+    request = make_request(b"username=test&password=secret", "application/x-www-form-urlencoded")
+    request._form = FormData([("username", "test"), ("password", "secret")])
+    assert capture_body(request, settings) == {"username": "test", "password": REDACTED}
+
+    assert capture_body(make_request(b"{}", "application/json", method="GET"), settings) is None
+    assert capture_body(make_request(b"data", "multipart/form-data; boundary=x"), settings) is None
+
+
+def test_capture_body_skipped() -> None:
+    settings = get_settings().model_copy(update={"log_body_max_bytes": 8})
+    assert capture_body(make_request(b'{"content": "long"}', "application/json"), settings) is None
+
+    settings = get_settings().model_copy(update={"log_body_sample_rate": 0.0})
+    assert capture_body(make_request(b"{}", "application/json"), settings) is None
+
+    # Bodies the endpoint did not read are not read for the logs
+    request = Request({"type": "http", "method": "POST", "path": "/", "headers": []})
+    assert capture_body(request, get_settings()) is None
@@ -0,0 +1,35 @@
+from datetime import datetime
+
+from aster.auth.schemas import UserRecord, UserView
+from aster.posts.schemas import ListPostView, PostRecord
+from aster.schemas import dump_page
+
+
+def test_dump_page() -> None:
+    user = UserRecord("test", 1, datetime(2024, 1, 1), datetime(2024, 1, 2, 3, 4, 5, 6))
+    posts = [PostRecord("Post", 2, datetime(2024, 1, 3, 0, 0, 0, 123), user)]
+    view = ListPostView.model_validate(
+        {
+            "items": [
+                {
+                    "content": "Post",
+                    "id": 2,
+                    "created_at": posts[0].created_at,
+                    "user": UserView.model_validate(user),
+                }
+            ],
+            "next_cursor": "cursor",
+        }
+    )
+    assert dump_page(posts, "cursor") == view.model_dump_json().encode()
+
+
+def test_serializable_dict() -> None:
+    user = UserView(
+        username="test", id=1, created_at=datetime(2024, 1, 1), updated_at=datetime(2024, 1, 2)
+    )
+    assert user.serializable_dict(exclude={"id"}) == {
+        "username": "test",
+        "created_at": "2024-01-01T00:00:00",
+        "updated_at": "2024-01-02T00:00:00",
+    }
@@ -0,0 +1,148 @@
+import asyncio
+import time
+
+import pytest
+from arq import ArqRedis, Retry
+from arq.jobs import Job
+from aster.tasks import Queue, batch_task, task
+from aster.worker import (
+    METRICS_PORT_OFFSETS,
+    HighPriorityWorkerSettings,
+    LowPriorityWorkerSettings,
+    WorkerSettings,
+    sample_queue_depth,
+)
+from prometheus_client import REGISTRY
+
+failures = 0
+batches: list[tuple[int, list[int]]] = []
+
+
+@task(max_tries=2, backoff=10.0)
+async def flaky_task(ctx: dict[str, int], value: int) -> int:
+    global failures
+    failures += 1
+    if failures <= 2:
+        raise RuntimeError("Failure")
+    return value
+
+
+@task(coalesce=lambda user_id: str(user_id))
+async def coalesced_task(ctx: dict[str, int], user_id: int) -> None:
+    pass
+
+
+@batch_task(max_tries=2, backoff=0.01)
+async def collect_batch(ctx: dict[str, int], key: int, items: list[int]) -> int:
+    if -1 in items:
+        raise RuntimeError("Failure")
+    if -2 in items:
+        await asyncio.sleep(10)
+    batches.append((key, items))
+    return len(items)
+
+
+def get_job_ctx(redis: ArqRedis, job: Job, job_try: int = 1) -> dict:
+    return {
+        "redis": redis,
+        "job_id": job.job_id,
+        "job_try": job_try,
+        "score": int(time.time() * 1000),
+    }
+
+
+def test_worker_settings() -> None:
+    def names(settings: dict) -> set[str]:
+        return {function.name for function in settings["functions"]} | {
+            cron_job.name for cron_job in settings["cron_jobs"]
+        }
+
+    assert WorkerSettings["queue_name"] == Queue.DEFAULT
+    assert {"backfill_timeline"} <= names(WorkerSettings)
+    assert names(HighPriorityWorkerSettings) == {"fanout_posts"}
+    assert names(LowPriorityWorkerSettings) == {"flush_user_stats", "reconcile_user_stats"}
+    assert WorkerSettings["keep_result"] == 0
+    assert sorted(METRICS_PORT_OFFSETS.values()) == list(range(len(Queue)))
+
+
+@pytest.mark.asyncio
+async def test_task_retry() -> None:
+    ctx = {"score": int(time.time() * 1000)}
+    with pytest.raises(Retry) as exc_info:
+        await flaky_task.execute({**ctx, "job_try": 1}, 42)
+    assert 5.0 <= exc_info.value.defer_score / 1000 <= 10.0  # type: ignore[operator]
+    with pytest.raises(RuntimeError):
+        await flaky_task.execute({**ctx, "job_try": 2}, 42)
+    assert await flaky_task.execute({**ctx, "job_try": 1}, 42) == 42
+    assert flaky_task.get_backoff(20) <= flaky_task.max_backoff
+
+
+@pytest.mark.asyncio
+async def test_task_coalesce(redis: ArqRedis) -> None:
+    job = await coalesced_task.enqueue(redis, 1)
+    assert job is not None
+    assert job.job_id == "coalesced_task:1"
+    assert await coalesced_task.enqueue(redis, 1) is None
+    assert await coalesced_task.enqueue(redis, 2) is not None
+    assert await redis.zcard(Queue.DEFAULT) == 2
+
+
+@pytest.mark.asyncio
+async def test_batch_task(redis: ArqRedis) -> None:
+    batches.clear()
+    job = await collect_batch.enqueue(redis, 1, 1, 2)
+    assert job is not None
+    assert await collect_batch.enqueue(redis, 1, 3) is None
+    assert await collect_batch.enqueue(redis, 2, 4) is not None
+    assert await collect_batch.execute(get_job_ctx(redis, job), 1) == 3
+    assert batches == [(1, [1, 2, 3])]
+    assert await redis.keys("aster:batch:collect_batch:1*") == []
+    # Items added after the batch was taken start a new one
+    assert await collect_batch.enqueue(redis, 1, 5) is not None
+
+
+@pytest.mark.asyncio
+async def test_batch_task_retry(redis: ArqRedis) -> None:
+    batches.clear()
+    job = await collect_batch.enqueue(redis, 1, 1, -1)
+    assert job is not None
+    with pytest.raises(Retry):
+        await collect_batch.execute(get_job_ctx(redis, job), 1)
+    next_job = await collect_batch.enqueue(redis, 1, 2)
+    assert next_job is not None
+    # The retry resumes the batch it took, without the items added since
+    with pytest.raises(RuntimeError):
+        await collect_batch.execute(get_job_ctx(redis, job, job_try=2), 1)
+    assert await redis.keys("aster:batch:collect_batch:1:processing:*") == []
+    assert await collect_batch.execute(get_job_ctx(redis, next_job), 1) == 1
+    assert batches == [(1, [2])]
+
+
+@pytest.mark.asyncio
+async def test_batch_task_cancelled(redis: ArqRedis) -> None:
+    batches.clear()
+    job = await collect_batch.enqueue(redis, 1, 1, -2)
+    assert job is not None
+    with pytest.raises(asyncio.TimeoutError):
+        await asyncio.wait_for(collect_batch.execute(get_job_ctx(redis, job), 1), 0.1)
+    assert await collect_batch.enqueue(redis, 1, 2) is None
+    assert await redis.lrange("aster:batch:collect_batch:1", 0, -1) == [b"1", b"-2", b"2"]
+    # A new job was scheduled for the items put back
+    job_ids = await redis.zrange(Queue.DEFAULT, 0, -1)
+    assert len(job_ids) == 2
+    await redis.lrem("aster:batch:collect_batch:1", 0, b"-2")
+    next_job = Job(job_ids[-1].decode(), redis)
+    assert await collect_batch.execute(get_job_ctx(redis, next_job), 1) == 2
+    assert batches == [(1, [1, 2])]
+
+
+@pytest.mark.asyncio
+async def test_sample_queue_depth(redis: ArqRedis) -> None:
+    sampler = asyncio.create_task(sample_queue_depth(redis, Queue.LOW, 0.01))
+    try:
+        await redis.enqueue_job("collect_batch", 1, _queue_name=Queue.LOW)
+        await asyncio.sleep(0.05)
+        assert REGISTRY.get_sample_value("aster_queue_depth", {"queue": Queue.LOW}) == 1
+    finally:
+        sampler.cancel()
+